@@ -5,25 +5,57 @@ Each user gets their own personal RSS feed of YouTube videos
 """
 
 import os
-from datetime import datetime, timezone
+from datetime import datetime, timedelta, timezone
 from pathlib import Path
-from flask import Flask, render_template, request, redirect, url_for, flash, jsonify, send_from_directory
+from flask import Flask, render_template, request, redirect, url_for, flash, jsonify, send_from_directory, stream_with_context
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import bindparam
+from sqlalchemy.exc import IntegrityError
 from flask_login import LoginManager, UserMixin, login_user, login_required, logout_user, current_user
-from werkzeug.security import generate_password_hash, check_password_hash
+from werkzeug.security import generate_password_hash, check_password_hash, safe_join
 from werkzeug.utils import secure_filename
 from flask_wtf.csrf import CSRFProtect
 import json
 import hashlib
-from urllib.parse import urljoin
+import time
+import click
+from urllib.parse import urljoin, quote, urlparse
 
 # Import your existing YT2Podcast functionality
-from yt2podcast import YT2Podcast
+from yt2podcast import (DownloadEngine, DownloadFailed, SingleFlight, PipelineMetrics, video_key_from_url,
+                        legacy_video_hash, AUDIO_MODES, audio_mime_type, is_collection_url, list_collection)
+from jobs import DownloadQueue, job_to_dict, QUEUED, RUNNING, INTERACTIVE, MANUAL, BULK
+from scheduler import SubscriptionScheduler, entries_since
+from feed_cache import make_feed_cache, make_entry, negotiate
+from feed_writer import FeedWriter, render_item, feed_history_links, compress_feed, COMPRESSED_SUFFIXES
+from metrics import MetricsRegistry
+from audio_store import AudioStore, file_sha256
+from retention import RetentionPolicy, AccessTracker, lru_victims
+from info_cache import InfoCache
+from publisher import SiteFile, StaticPublisher
+import config
 
 app = Flask(__name__)
 app.config['SECRET_KEY'] = os.environ.get('SECRET_KEY', 'dev-secret-key-change-in-production')
-app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///podcast_users.db'
+app.config['SQLALCHEMY_DATABASE_URI'] = config.DATABASE_URI
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+app.config['EPISODE_SERVE_MODE'] = config.EPISODE_SERVE_MODE
+app.config['EPISODE_ACCEL_PREFIX'] = config.EPISODE_ACCEL_PREFIX
+app.config['DASHBOARD_PAGE_SIZE'] = config.DASHBOARD_PAGE_SIZE
+app.config['FEED_ITEM_LIMIT'] = config.FEED_ITEM_LIMIT
+app.config['FEED_ARCHIVE_PAGE_SIZE'] = config.FEED_ARCHIVE_PAGE_SIZE
+app.config['USER_QUOTA_MB'] = config.USER_QUOTA_MB
+app.config['GLOBAL_QUOTA_MB'] = config.GLOBAL_QUOTA_MB
+app.config['RETENTION_KEEP_NEWEST'] = config.RETENTION_KEEP_NEWEST
+app.config['RETENTION_IDLE_DAYS'] = config.RETENTION_IDLE_DAYS
+app.config['REFETCH_WAIT_SECONDS'] = config.REFETCH_WAIT_SECONDS
+app.config['MAX_DOWNLOAD_BYTES'] = config.MAX_CONTENT_LENGTH
+app.config['SUBSCRIPTION_POLL_MINUTES'] = config.SUBSCRIPTION_POLL_MINUTES
+app.config['SUBSCRIPTION_MIN_POLL_MINUTES'] = config.SUBSCRIPTION_MIN_POLL_MINUTES
+app.config['SUBSCRIPTION_POLL_WINDOW'] = config.SUBSCRIPTION_POLL_WINDOW
+app.config['SUBSCRIPTION_INITIAL_EPISODES'] = config.SUBSCRIPTION_INITIAL_EPISODES
+app.config['PUBLISH_DIR'] = config.PUBLISH_DIR
+app.config['PUBLISH_BASE_URL'] = config.PUBLISH_BASE_URL
 
 # Setup database
 db = SQLAlchemy(app)
@@ -36,9 +68,38 @@ login_manager.login_view = 'login'
 # Setup CSRF protection
 csrf = CSRFProtect(app)
 
+# Rendered feeds, thrown away whenever a user's episodes change
+feed_cache = make_feed_cache(
+    config.FEED_CACHE_BACKEND,
+    max_entries=config.FEED_CACHE_SIZE,
+    cache_dir=config.FEED_CACHE_DIR,
+)
+
+# Process-wide metrics, served at /metrics. Downloads record into the same
+# registry through YT2Podcast's own instrumentation
+metrics_registry = MetricsRegistry()
+pipeline_metrics = PipelineMetrics(metrics_registry)
+feed_cache_lookups = metrics_registry.counter(
+    'yt2podcast_feed_cache_total', 'Feed cache lookups by result', ['result'])
+not_modified_responses = metrics_registry.counter(
+    'yt2podcast_not_modified_total', '304 Not Modified responses by route', ['route'])
+user_disk_bytes = metrics_registry.gauge(
+    'yt2podcast_user_disk_bytes', 'Size of each user\'s episodes', ['user'])
+audio_store_bytes = metrics_registry.gauge(
+    'yt2podcast_audio_store_bytes', 'Size of the shared audio store (each file counted once)')
+evictions = metrics_registry.counter(
+    'yt2podcast_evictions_total', 'Episodes whose audio was removed to save space, by rule', ['rule'])
+refetches = metrics_registry.counter(
+    'yt2podcast_refetches_total', 'Removed episodes downloaded again because somebody played them')
+feed_encodings = metrics_registry.counter(
+    'yt2podcast_feed_responses_total', 'Cached feed responses by Content-Encoding', ['encoding'])
+
 # Create uploads directory
-UPLOAD_FOLDER = Path('user_episodes')
-UPLOAD_FOLDER.mkdir(exist_ok=True)
+UPLOAD_FOLDER = config.UPLOAD_FOLDER
+UPLOAD_FOLDER.mkdir(parents=True, exist_ok=True)
+
+# Every video is downloaded once, users get hardlinks into their own folder
+audio_store = AudioStore(UPLOAD_FOLDER / '_audio')
 
 # Database Models
 class User(UserMixin, db.Model):
@@ -47,6 +108,8 @@ class User(UserMixin, db.Model):
     email = db.Column(db.String(120), unique=True, nullable=False)
     password_hash = db.Column(db.String(120), nullable=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    audio_mode = db.Column(db.String(10), default=config.DEFAULT_AUDIO_MODE)  # 'mp3' or 'remux'
+    download_weight = db.Column(db.Float, default=1.0)  # share of the download workers, 2.0 gets twice the turns
     episodes = db.relationship('Episode', backref='user', lazy=True)
     
     def set_password(self, password):
@@ -56,6 +119,11 @@ class User(UserMixin, db.Model):
         return check_password_hash(self.password_hash, password)
 
 class Episode(db.Model):
+    __table_args__ = (
+        # dashboard/feed listing (newest first) and per-user duplicate checks
+        db.Index('ix_episode_user_download', 'user_id', 'download_date'),
+        db.Index('ix_episode_user_video', 'user_id', 'video_hash'),
+    )
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     title = db.Column(db.String(200), nullable=False)
@@ -68,7 +136,61 @@ class Episode(db.Model):
     download_date = db.Column(db.DateTime, default=datetime.utcnow)
     video_url = db.Column(db.String(500))
     audio_url = db.Column(db.String(500))
-    video_hash = db.Column(db.String(16), unique=True)  # MD5 hash of video URL
+    video_hash = db.Column(db.String(64))  # canonical video ID (MD5 of the URL for older episodes)
+    blob_id = db.Column(db.Integer, db.ForeignKey('audio_blob.id'))  # shared audio file
+    mime_type = db.Column(db.String(50))  # enclosure type, older episodes are all MP3
+    last_played_at = db.Column(db.DateTime)  # last /episode/ hit, written in batches
+    evicted_at = db.Column(db.DateTime)  # audio removed to save space, downloaded again when played
+
+class AudioBlob(db.Model):
+    """One downloaded audio file, shared by every episode that points at it"""
+    __table_args__ = (db.UniqueConstraint('video_id', 'audio_mode'),)
+    id = db.Column(db.Integer, primary_key=True)
+    video_id = db.Column(db.String(64), nullable=False)  # extractor's video ID
+    audio_mode = db.Column(db.String(10), nullable=False, default='mp3')
+    path = db.Column(db.String(500), nullable=False)
+    file_size = db.Column(db.Integer)
+    refcount = db.Column(db.Integer, nullable=False, default=0)
+    content_hash = db.Column(db.String(64))  # sha256 of the file, used as its ETag
+    info = db.Column(db.Text)  # episode data from YT2Podcast as JSON
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+class DownloadJob(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False, index=True)
+    video_url = db.Column(db.String(500), nullable=False)
+    video_hash = db.Column(db.String(64))
+    base_url = db.Column(db.String(200))  # host the episode URLs should point at
+    audio_mode = db.Column(db.String(10), default='mp3')
+    status = db.Column(db.String(10), nullable=False, default=QUEUED, index=True)
+    error = db.Column(db.String(500))
+    episode_id = db.Column(db.Integer, db.ForeignKey('episode.id'))
+    subscription_id = db.Column(db.Integer, db.ForeignKey('subscription.id'))  # queued by a subscription poll
+    priority = db.Column(db.Integer, default=MANUAL)  # lane, see jobs.py
+    virtual_finish = db.Column(db.Float)  # fair queuing order within the lane
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    worker = db.Column(db.String(100))  # host:pid of the process running it
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    started_at = db.Column(db.DateTime)
+    heartbeat_at = db.Column(db.DateTime)
+    finished_at = db.Column(db.DateTime)
+
+class Subscription(db.Model):
+    """A channel or playlist whose new videos are added to a user's podcast"""
+    __table_args__ = (db.UniqueConstraint('user_id', 'source_url'),)
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False, index=True)
+    source_url = db.Column(db.String(500), nullable=False)
+    base_url = db.Column(db.String(200))  # host the episode URLs should point at
+    poll_interval = db.Column(db.Integer, nullable=False)  # seconds
+    next_poll_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, index=True)
+    last_polled_at = db.Column(db.DateTime)
+    # High-water mark: newest video seen so far, polls stop reading there
+    last_seen_video_id = db.Column(db.String(64))
+    last_seen_at = db.Column(db.DateTime)
+    failures = db.Column(db.Integer, nullable=False, default=0)  # failed polls in a row, for backoff
+    last_error = db.Column(db.String(500))
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
 @login_manager.user_loader
 def load_user(user_id):
@@ -88,6 +210,10 @@ def register():
         email = request.form['email']
         password = request.form['password']
         
+        if not _is_folder_safe(username):
+            flash('Usernames can\'t contain slashes or start with a dot')
+            return redirect(url_for('register'))
+        
         if User.query.filter_by(username=username).first():
             flash('Username already exists')
             return redirect(url_for('register'))
@@ -106,6 +232,10 @@ def register():
     
     return render_template('register.html')
 
+def _is_folder_safe(username):
+    """Usernames are a folder in feed URLs and published sites, so one path segment that isn't hidden"""
+    return bool(username) and not username.startswith('.') and '/' not in username and '\\' not in username
+
 @app.route('/login', methods=['GET', 'POST'])
 def login():
     if request.method == 'POST':
@@ -130,8 +260,50 @@ def logout():
 @app.route('/dashboard')
 @login_required
 def dashboard():
-    episodes = Episode.query.filter_by(user_id=current_user.id).order_by(Episode.download_date.desc()).all()
-    return render_template('dashboard.html', episodes=episodes)
+    # Keyset pagination: each page starts after the last episode of the previous
+    # one, so page 100 costs the same as page 1
+    query = Episode.query.filter_by(user_id=current_user.id)
+    cursor = _parse_episode_cursor(request.args.get('before'))
+    if cursor:
+        before_date, before_id = cursor
+        query = query.filter(db.or_(
+            Episode.download_date < before_date,
+            db.and_(Episode.download_date == before_date, Episode.id < before_id),
+        ))
+    
+    page_size = app.config['DASHBOARD_PAGE_SIZE']
+    episodes = query.order_by(Episode.download_date.desc(), Episode.id.desc()).limit(page_size + 1).all()
+    next_cursor = None
+    if len(episodes) > page_size:
+        episodes = episodes[:page_size]
+        next_cursor = _episode_cursor(episodes[-1])
+    
+    total = db.session.query(db.func.count(Episode.id)).filter(Episode.user_id == current_user.id).scalar()
+    # The same jobs the dashboard's /jobs?active=1 polling gets back, oldest first
+    jobs = list(reversed(_user_jobs(current_user.id, active=True)))
+    active_jobs = DownloadJob.query.filter(
+        DownloadJob.user_id == current_user.id,
+        DownloadJob.status.in_([QUEUED, RUNNING]),
+    ).count()
+    queue_positions = download_queue.queue_positions(jobs)
+    subscriptions = Subscription.query.filter_by(user_id=current_user.id).order_by(Subscription.created_at).all()
+    return render_template('dashboard.html', episodes=episodes, jobs=jobs, total=total,
+                           active_jobs=active_jobs, subscriptions=subscriptions, queue_positions=queue_positions,
+                           next_cursor=next_cursor, paged=cursor is not None)
+
+def _episode_cursor(episode):
+    """Opaque-ish position of an episode in the dashboard listing"""
+    return f"{episode.download_date.isoformat()}_{episode.id}"
+
+def _parse_episode_cursor(value):
+    """Turn a ?before= cursor back into (download_date, id), None if missing or bad"""
+    if not value:
+        return None
+    try:
+        download_date, episode_id = value.rsplit('_', 1)
+        return datetime.fromisoformat(download_date), int(episode_id)
+    except ValueError:
+        return None
 
 @app.route('/add_video', methods=['POST'])
 @login_required
@@ -142,150 +314,711 @@ def add_video():
         flash('Please provide a valid URL')
         return redirect(url_for('dashboard'))
     
-    # Check if video already exists for this user
-    video_hash = hashlib.md5(video_url.encode()).hexdigest()[:8]
-    existing_episode = Episode.query.filter_by(video_hash=video_hash, user_id=current_user.id).first()
-    
-    if existing_episode:
+    status = _video_status(current_user.id, video_url)
+    if status == 'episode':
         flash('This video is already in your podcast!')
         return redirect(url_for('dashboard'))
+    if status == 'job':
+        flash('This video is already being processed!')
+        return redirect(url_for('dashboard'))
     
+    # Hand the slow yt-dlp/FFmpeg work to the background workers
+    job = _enqueue_video(current_user, video_url, request.host_url.rstrip('/'))
+    download_queue.start()
+    print(f"Queued download job {job.id} for user {current_user.username}: {video_url}")
+    
+    flash('Video queued - it will show up in your podcast once it has been converted')
+    return redirect(url_for('dashboard'))
+
+def _video_status(user_id, video_url):
+    """'episode' or 'job' if the user already has (or is getting) this video, else None"""
+    # Whichever URL it came from
+    video_hash = video_key_from_url(video_url)
+    existing_episode = Episode.query.filter(
+        Episode.user_id == user_id,
+        Episode.video_hash.in_([video_hash, legacy_video_hash(video_url)]),
+    ).first()
+    if existing_episode:
+        return 'episode'
+    
+    pending_job = DownloadJob.query.filter(
+        DownloadJob.user_id == user_id,
+        DownloadJob.video_hash == video_hash,
+        DownloadJob.status.in_([QUEUED, RUNNING]),
+    ).first()
+    if pending_job:
+        return 'job'
+    return None
+
+def _enqueue_video(user, video_url, base_url, priority=MANUAL, **fields):
+    """Queue a download job for one of the user's videos"""
+    return download_queue.enqueue(
+        priority=priority,
+        user_id=user.id,
+        video_url=video_url,
+        video_hash=video_key_from_url(video_url),
+        base_url=base_url,
+        audio_mode=user.audio_mode or config.DEFAULT_AUDIO_MODE,
+        **fields,
+    )
+
+def _process_download_job(job):
+    """Add a queued video to the user's podcast (runs on a worker thread)"""
+    if job.episode_id is not None:
+        # An episode whose audio was removed, somebody wants to play it
+        return _restore_episode_audio(job)
+    
+    user = db.session.get(User, job.user_id)
+    print(f"Starting download for user {user.username}: {job.video_url}")
+    
+    # Jobs for the same video running at the same time share one download
+    blob_id = download_flights.do((job.video_hash, job.audio_mode), _ensure_blob, job)
+    blob = db.session.get(AudioBlob, blob_id)
+    
+    episode_data = json.loads(blob.info)
+    user_episodes_dir = UPLOAD_FOLDER / str(user.id)
+    filename = audio_store.link(blob.path, user_episodes_dir, episode_data['filename'])
+    AudioBlob.query.filter_by(id=blob.id).update({'refcount': AudioBlob.refcount + 1})
+    
+    # Save episode to database
+    base_url = job.base_url
+    episode = Episode(
+        user_id=user.id,
+        title=episode_data['title'],
+        description=episode_data['description'],
+        duration=episode_data['duration'],
+        upload_date=episode_data['upload_date'],
+        uploader=episode_data['uploader'],
+        filename=filename,
+        file_size=blob.file_size,
+        video_url=job.video_url,
+        audio_url=f"{base_url}/episode/{user.id}/{filename}",
+        video_hash=job.video_hash,
+        blob_id=blob.id,
+        mime_type=audio_mime_type(filename)
+    )
+    
+    db.session.add(episode)
+    db.session.flush()
+    job.episode_id = episode.id
+    db.session.commit()
+    
+    # only after the commit, otherwise a poll could re-cache the old feed
+    feed_cache.invalidate(user.id)
+    print(f"Episode saved to database with ID: {episode.id}")
+    
+    # New audio may have pushed somebody over the disk budget
     try:
-        print(f"Starting download for user {current_user.username}: {video_url}")
-        
-        # Create user-specific episodes directory
-        user_episodes_dir = UPLOAD_FOLDER / str(current_user.id)
-        user_episodes_dir.mkdir(exist_ok=True)
-        print(f"Created user directory: {user_episodes_dir}")
+        enforce_retention()
+    except Exception as e:
+        print(f"Retention check failed: {e}")
+    return episode
+
+def _restore_episode_audio(job):
+    """Download an evicted episode's audio again and put it back under its old name"""
+    episode = db.session.get(Episode, job.episode_id)
+    if episode is None:
+        return None
+    user_episodes_dir = UPLOAD_FOLDER / str(episode.user_id)
+    if episode.evicted_at is None and (user_episodes_dir / episode.filename).exists():
+        return episode
+    
+    blob_id = download_flights.do((job.video_hash, job.audio_mode), _ensure_blob, job)
+    blob = db.session.get(AudioBlob, blob_id)
+    filename = audio_store.link(blob.path, user_episodes_dir, episode.filename)
+    AudioBlob.query.filter_by(id=blob.id).update({'refcount': AudioBlob.refcount + 1})
+    
+    episode.blob_id = blob.id
+    episode.evicted_at = None
+    # Counts as played, so it isn't the first thing evicted again
+    episode.last_played_at = datetime.utcnow()
+    if filename != episode.filename:
+        # Another file took the name in the meantime
+        episode.filename = filename
+        episode.audio_url = f"{episode.audio_url.rsplit('/', 1)[0]}/{filename}"
+        feed_cache.invalidate(episode.user_id)
+    db.session.commit()
+    print(f"Restored audio for episode {episode.id}: {episode.title}")
+    return episode
+
+def _ensure_blob(job):
+    """ID of the stored audio for a job's video, downloading it if needed"""
+    # Somebody may already have this video, then there's nothing to download
+    blob = _find_shared_blob(job.video_hash, job.audio_mode)
+    if blob is not None:
+        print(f"Reusing stored audio for {job.video_url}")
+        return blob.id
+    return _download_blob(job).id
+
+def _find_shared_blob(video_id, audio_mode):
+    """Stored audio for a video, if it's still on disk"""
+    blob = AudioBlob.query.filter_by(video_id=video_id, audio_mode=audio_mode).first()
+    if blob is None or not Path(blob.path).exists():
+        return None
+    return blob
+
+def _download_blob(job):
+    """Download and convert a video straight into the shared audio store"""
+    # Named after the job, so if this worker dies the requeued job resumes its .part files
+    staging_dir = audio_store.staging_dir(_staging_name(job))
+    try:
+        # Only the job's scratch folder is written to - no shared metadata
+        # file and nothing relative to the working directory
+        engine = DownloadEngine(
+            staging_dir,
+            audio_mode=job.audio_mode,
+            metrics=metrics_registry,
+            max_filesize=app.config['MAX_DOWNLOAD_BYTES'],
+            info_cache=info_cache,
+        )
+        try:
+            result = engine.fetch(job.video_url, job.video_hash)
+        except DownloadFailed as error:
+            if error.transient:
+                raise RuntimeError(f'Failed to download video after {error.attempts} attempts, please try again later ({error})')
+            raise RuntimeError('Failed to download video - please check the URL and try again')
+        episode_data = result.episode_data(job.base_url)
+        print(f"Download successful: {episode_data['title']}")
         
-        # Download video using your existing YT2Podcast class
-        base_url = request.host_url.rstrip('/')
-        yt2podcast = YT2Podcast(base_url=base_url)
-        yt2podcast.episodes_dir = user_episodes_dir
+        video_id = episode_data.get('video_id') or job.video_hash
+        blob = AudioBlob.query.filter_by(video_id=video_id, audio_mode=job.audio_mode).first()
+        if blob is not None and Path(blob.path).exists():
+            # same video, different URL
+            return blob
         
-        print(f"Starting YT2Podcast download...")
-        episode_data = yt2podcast.download_video(video_url)
+        # both modes can end up as .mp3, keep their files apart
+        store_key = video_id if job.audio_mode == 'mp3' else f"{video_id}.{job.audio_mode}"
+        path = audio_store.add(store_key, staging_dir / episode_data['filename'])
+        info = {key: episode_data[key] for key in ('title', 'description', 'duration', 'upload_date', 'uploader', 'filename')}
+        if blob is None:
+            blob = AudioBlob(video_id=video_id, audio_mode=job.audio_mode, refcount=0)
+            db.session.add(blob)
+        blob.path = str(path)
+        blob.file_size = path.stat().st_size
+        blob.content_hash = file_sha256(path)
+        blob.info = json.dumps(info)
         
-        if episode_data:
-            print(f"Download successful: {episode_data['title']}")
-            
-            # Save episode to database
-            episode = Episode(
-                user_id=current_user.id,
-                title=episode_data['title'],
-                description=episode_data['description'],
-                duration=episode_data['duration'],
-                upload_date=episode_data['upload_date'],
-                uploader=episode_data['uploader'],
-                filename=episode_data['filename'],
-                file_size=episode_data['file_size'],
-                video_url=video_url,
-                audio_url=f"{base_url}/episode/{current_user.id}/{episode_data['filename']}",
-                video_hash=video_hash
-            )
-            
-            db.session.add(episode)
+        try:
             db.session.commit()
-            
-            flash(f'Successfully added: {episode_data["title"]}')
-            print(f"Episode saved to database with ID: {episode.id}")
-        else:
-            print("Download failed - no episode data returned")
-            flash('Failed to download video - please check the URL and try again')
-            
-    except Exception as e:
-        print(f"Error during video processing: {str(e)}")
-        import traceback
-        traceback.print_exc()
-        flash(f'Error processing video: {str(e)}')
+        except IntegrityError:
+            # another worker stored the same video at the same moment
+            db.session.rollback()
+            blob = AudioBlob.query.filter_by(video_id=video_id, audio_mode=job.audio_mode).one()
+        return blob
+    finally:
+        audio_store.discard_staging(staging_dir)
+
+def _staging_name(job):
+    return f"job{job.id}"
+
+def sweep_staging():
+    """Remove scratch folders of downloads that crashed, unless their job will run again"""
+    live = DownloadJob.query.filter(DownloadJob.status.in_([QUEUED, RUNNING])).all()
+    for path in audio_store.sweep_staging(keep={_staging_name(job) for job in live}):
+        print(f"Removed leftover download folder {path.name}")
+
+# Downloads in progress in this process, keyed by video ID
+download_flights = SingleFlight()
+
+# yt-dlp extractor results, shared by every download (and worker process)
+info_cache = InfoCache(config.INFO_CACHE_FILE, ttl=config.INFO_CACHE_TTL, max_entries=config.INFO_CACHE_MAX_ENTRIES)
+
+download_queue = DownloadQueue(
+    app, db, DownloadJob, _process_download_job,
+    workers=config.DOWNLOAD_WORKERS,
+    heartbeat_interval=config.JOB_HEARTBEAT_SECONDS,
+    stale_after=config.JOB_STALE_SECONDS,
+    max_attempts=config.JOB_MAX_ATTEMPTS,
+    max_running=config.DOWNLOAD_MAX_RUNNING or None,
+    max_per_user=config.DOWNLOAD_MAX_PER_USER,
+    weight=lambda user_id: _download_weight(user_id),
+)
+
+def _download_weight(user_id):
+    """A user's share of the download workers (None counts as 1.0)"""
+    return db.session.query(User.download_weight).filter_by(id=user_id).scalar()
+
+# Jobs listed by /jobs and on the dashboard
+JOB_LIST_LIMIT = 50
+
+@app.route('/jobs')
+@login_required
+def job_status_list():
+    """JSON status of the user's download jobs, polled by the dashboard"""
+    jobs = _user_jobs(current_user.id, active=bool(request.args.get('active')))
+    positions = download_queue.queue_positions(jobs)
+    return jsonify(jobs=[job_to_dict(job, positions[job.id]) for job in jobs])
+
+def _user_jobs(user_id, active=False):
+    """The user's newest JOB_LIST_LIMIT download jobs, newest first"""
+    query = DownloadJob.query.filter_by(user_id=user_id)
+    if active:
+        query = query.filter(DownloadJob.status.in_([QUEUED, RUNNING]))
+    return query.order_by(DownloadJob.created_at.desc(), DownloadJob.id.desc()).limit(JOB_LIST_LIMIT).all()
+
+@app.route('/jobs/<int:job_id>')
+@login_required
+def job_status(job_id):
+    """JSON status of a single download job"""
+    job = DownloadJob.query.get_or_404(job_id)
+    if job.user_id != current_user.id:
+        return jsonify(error='Unauthorized'), 403
+    return jsonify(job_to_dict(job, download_queue.queue_position(job)))
+
+@app.route('/settings/audio_mode', methods=['POST'])
+@login_required
+def set_audio_mode():
+    """Choose between MP3 (plays everywhere) and remux (original AAC/Opus, no transcoding)"""
+    audio_mode = request.form.get('audio_mode')
+    if audio_mode not in AUDIO_MODES:
+        flash('Unknown audio format')
+        return redirect(url_for('dashboard'))
     
+    current_user.audio_mode = audio_mode
+    db.session.commit()
+    flash('Audio format saved - it applies to videos you add from now on')
     return redirect(url_for('dashboard'))
 
+@app.route('/subscriptions')
+@login_required
+def subscription_list():
+    """JSON list of the user's channel/playlist subscriptions"""
+    subscriptions = Subscription.query.filter_by(user_id=current_user.id).order_by(Subscription.created_at).all()
+    return jsonify(subscriptions=[_subscription_to_dict(subscription) for subscription in subscriptions])
+
+@app.route('/subscriptions', methods=['POST'])
+@login_required
+def add_subscription():
+    """Follow a channel or playlist - new uploads are added to the podcast automatically"""
+    source_url = request.form.get('source_url', '').strip()
+    if not source_url.startswith(('http://', 'https://')) or not is_collection_url(source_url):
+        flash('Please provide a YouTube channel or playlist URL')
+        return redirect(url_for('dashboard'))
+    
+    if Subscription.query.filter_by(user_id=current_user.id, source_url=source_url).first():
+        flash('You are already subscribed to this channel or playlist')
+        return redirect(url_for('dashboard'))
+    
+    # Users can poll less often than the default, never more often than the minimum
+    minutes = app.config['SUBSCRIPTION_POLL_MINUTES']
+    try:
+        minutes = int(request.form.get('poll_minutes') or minutes)
+    except ValueError:
+        pass
+    minutes = max(minutes, app.config['SUBSCRIPTION_MIN_POLL_MINUTES'])
+    
+    subscription = Subscription(
+        user_id=current_user.id,
+        source_url=source_url,
+        base_url=request.host_url.rstrip('/'),
+        poll_interval=minutes * 60,
+    )
+    db.session.add(subscription)
+    db.session.commit()
+    
+    # First poll right away so the latest videos show up without waiting an interval
+    subscription_scheduler.start()
+    subscription_scheduler.notify()
+    flash('Subscribed - the latest videos are being added to your podcast')
+    return redirect(url_for('dashboard'))
+
+@app.route('/subscriptions/<int:subscription_id>/delete', methods=['POST'])
+@login_required
+def delete_subscription(subscription_id):
+    """Stop following a channel or playlist, episodes already added stay"""
+    subscription = Subscription.query.get_or_404(subscription_id)
+    if subscription.user_id != current_user.id:
+        flash('Unauthorized')
+        return redirect(url_for('dashboard'))
+    
+    DownloadJob.query.filter_by(subscription_id=subscription.id).update({'subscription_id': None})
+    db.session.delete(subscription)
+    db.session.commit()
+    flash('Subscription removed')
+    return redirect(url_for('dashboard'))
+
+def _subscription_to_dict(subscription):
+    return {
+        'id': subscription.id,
+        'source_url': subscription.source_url,
+        'poll_interval': subscription.poll_interval,
+        'next_poll_at': subscription.next_poll_at.isoformat() if subscription.next_poll_at else None,
+        'last_polled_at': subscription.last_polled_at.isoformat() if subscription.last_polled_at else None,
+        'last_seen_video_id': subscription.last_seen_video_id,
+        'failures': subscription.failures or 0,
+        'last_error': subscription.last_error,
+    }
+
+def _is_playlist_url(url):
+    parsed = urlparse(url)
+    return parsed.path.rstrip('/') == '/playlist'
+
+def _poll_subscription(subscription):
+    """Queue the videos uploaded since the last poll, returns how many were queued"""
+    url = subscription.source_url
+    if _is_playlist_url(url):
+        # Playlists grow at the end, so the whole (flat, cheap) listing is needed
+        entries = list(reversed(list_collection(url)))
+    else:
+        # Channel tabs list newest first, one page is plenty between polls
+        entries = list_collection(url, limit=app.config['SUBSCRIPTION_POLL_WINDOW'])
+    if not entries:
+        return 0
+    
+    new_entries = entries_since(entries, subscription.last_seen_video_id)
+    if subscription.last_seen_video_id is None:
+        # Don't backfill a whole channel on the first poll
+        new_entries = new_entries[:app.config['SUBSCRIPTION_INITIAL_EPISODES']]
+    
+    user = db.session.get(User, subscription.user_id)
+    queued = 0
+    # Oldest first, so the episodes end up in upload order
+    for entry in reversed(new_entries):
+        if _video_status(user.id, entry['url']):
+            continue
+        _enqueue_video(user, entry['url'], subscription.base_url, priority=BULK, subscription_id=subscription.id)
+        queued += 1
+    
+    subscription.last_seen_video_id = entries[0]['id']
+    subscription.last_seen_at = datetime.utcnow()
+    db.session.commit()
+    if queued:
+        download_queue.start()
+    return queued
+
+subscription_scheduler = SubscriptionScheduler(
+    app, db, Subscription, _poll_subscription,
+    polls_per_minute=config.SUBSCRIPTION_POLLS_PER_MINUTE,
+)
+
 @app.route('/episode/<int:user_id>/<filename>')
 def serve_episode(user_id, filename):
     """Serve audio files for podcast apps (no authentication required)"""
     user_episodes_dir = UPLOAD_FOLDER / str(user_id)
-    audio_file = user_episodes_dir / filename
-    
-    if not audio_file.exists():
+    # The offload modes hand this path to the proxy, so it gets the same
+    # checks send_from_directory does: inside the folder and a regular file
+    joined = safe_join(str(user_episodes_dir), filename)
+    if joined is None:
         return "File not found", 404
+    audio_file = Path(joined)
+    
+    # Shared audio knows its content hash, which makes a proper strong ETag
+    episode_id, evicted_at, content_hash = db.session.query(
+        Episode.id, Episode.evicted_at, AudioBlob.content_hash
+    ).outerjoin(
+        AudioBlob, Episode.blob_id == AudioBlob.id
+    ).filter(Episode.user_id == user_id, Episode.filename == filename).first() or (None, None, None)
+    
+    if not audio_file.is_file():
+        if evicted_at is None or not _wait_for_restore(episode_id):
+            if evicted_at is None:
+                return "File not found", 404
+            response = app.response_class("This episode is being downloaded again, try again shortly", 503)
+            response.headers['Retry-After'] = '30'
+            return response
+        content_hash = db.session.query(AudioBlob.content_hash).join(
+            Episode, Episode.blob_id == AudioBlob.id
+        ).filter(Episode.id == episode_id).scalar()
+    
+    if episode_id is not None:
+        # Kept in memory, written out in batches for the retention rules.
+        # A failed write keeps the times for the next flush and must never
+        # stop the episode from playing.
+        try:
+            play_times.touch(episode_id)
+        except Exception as e:
+            db.session.rollback()
+            print(f"Could not save play times: {e}")
+    
+    serve_mode = app.config['EPISODE_SERVE_MODE']
+    if serve_mode in ('x-accel', 'x-sendfile'):
+        response = _offloaded_episode_response(audio_file, user_id, filename, content_hash, serve_mode)
+    else:
+        # send_file handles Range/If-Range/206 and uses the server's
+        # wsgi.file_wrapper (kernel sendfile under gunicorn) when it can
+        response = send_from_directory(
+            user_episodes_dir, filename,
+            mimetype=audio_mime_type(filename),
+            etag=content_hash or True,
+        )
     
     # Set proper headers for podcast apps
-    response = send_from_directory(user_episodes_dir, filename)
-    response.headers['Content-Type'] = 'audio/mpeg'
+    response.headers['Content-Type'] = audio_mime_type(filename)
     response.headers['Accept-Ranges'] = 'bytes'
     response.headers['Cache-Control'] = 'public, max-age=31536000'  # Cache for 1 year
     
+    return _count_not_modified(response, 'episode')
+
+def _wait_for_restore(episode_id):
+    """Queue a download of an evicted episode and wait a little for it
+    
+    Returns True if the audio is back in time, otherwise the caller answers
+    503 and the download carries on in the background.
+    """
+    job = DownloadJob.query.filter(
+        DownloadJob.episode_id == episode_id,
+        DownloadJob.status.in_([QUEUED, RUNNING]),
+    ).first()
+    if job is None:
+        episode = db.session.get(Episode, episode_id)
+        job = download_queue.enqueue(
+            # Someone's podcast app is waiting for this one
+            priority=INTERACTIVE,
+            user_id=episode.user_id,
+            video_url=episode.video_url,
+            video_hash=episode.video_hash,
+            base_url=request.host_url.rstrip('/'),
+            # Same format as before, so the file keeps its name and type
+            audio_mode='mp3' if episode.filename.lower().endswith('.mp3') else 'remux',
+            episode_id=episode.id,
+        )
+        refetches.inc()
+        print(f"Downloading evicted episode {episode.id} again: {episode.video_url}")
+    job_id = job.id
+    download_queue.start()
+    
+    deadline = time.monotonic() + app.config['REFETCH_WAIT_SECONDS']
+    while time.monotonic() < deadline:
+        time.sleep(0.5)
+        db.session.rollback()  # see the worker's commits
+        status = db.session.query(DownloadJob.status).filter_by(id=job_id).scalar()
+        if status not in (QUEUED, RUNNING):
+            break
+    
+    db.session.rollback()
+    return db.session.query(Episode.evicted_at).filter_by(id=episode_id).scalar() is None
+
+def _offloaded_episode_response(audio_file, user_id, filename, content_hash, serve_mode):
+    """Empty response telling the front proxy to send the file itself
+    
+    The proxy does the byte ranges, we still answer If-None-Match and
+    If-Modified-Since here so unchanged files never reach it.
+    """
+    response = app.response_class(mimetype=audio_mime_type(filename))
+    if serve_mode == 'x-accel':
+        # nginx: an internal location that maps onto UPLOAD_FOLDER
+        prefix = app.config['EPISODE_ACCEL_PREFIX'].rstrip('/')
+        response.headers['X-Accel-Redirect'] = f"{prefix}/{user_id}/{quote(filename)}"
+    else:
+        # apache mod_xsendfile / lighttpd
+        response.headers['X-Sendfile'] = str(audio_file.resolve())
+    
+    stat = audio_file.stat()
+    response.set_etag(content_hash or f"{stat.st_mtime_ns:x}-{stat.st_size:x}")
+    response.last_modified = int(stat.st_mtime)
+    response = response.make_conditional(request)
+    if response.status_code == 304:
+        # The proxy acts on these whatever the status and would send the file anyway
+        response.headers.pop('X-Accel-Redirect', None)
+        response.headers.pop('X-Sendfile', None)
     return response
 
 @app.route('/feed/<username>')
 def user_feed(username):
-    """Generate personal RSS feed for a user (public access)"""
+    """Serve personal RSS feed for a user (public access)"""
     user = User.query.filter_by(username=username).first()
     if not user:
         return "User not found", 404
     
-    episodes = Episode.query.filter_by(user_id=user.id).order_by(Episode.download_date.desc()).all()
+    if not feed_cache.enabled:
+        # Nothing to keep the result in, so send the feed as it's rendered
+        # instead of building it all in memory first
+        chunks = _user_feed_chunks(user, request.base_url)
+        response = app.response_class(stream_with_context(chunks), mimetype='application/rss+xml')
+        response.cache_control.no_cache = True
+        return response
     
-    # Generate RSS feed using your existing code
-    from feedgen.feed import FeedGenerator
+    # Podcast apps poll this constantly, so render once and reuse it until
+    # the user's episodes change
+    variant = request.base_url
+    generation = feed_cache.generation(user.id)
+    cached = feed_cache.get(user.id, variant)
+    feed_cache_lookups.inc(result='miss' if cached is None else 'hit')
+    if cached is None:
+        with pipeline_metrics.feed_render_seconds.time(source='web'):
+            cached = make_entry(_render_user_feed(user, variant))
+        feed_cache.set(user.id, variant, cached, generation)
     
-    fg = FeedGenerator()
-    fg.load_extension('podcast')
+    response = _feed_response(cached)
+    response.cache_control.no_cache = True  # always revalidate, it's cheap
+    return _count_not_modified(response.make_conditional(request), 'feed')
+
+def _render_user_feed(user, feed_url):
+    """Build the RSS XML for a user's main feed"""
+    return b''.join(_user_feed_chunks(user, feed_url))
+
+def _user_feed_chunks(user, feed_url):
+    """Stream the RSS XML for a user's main feed (the newest FEED_ITEM_LIMIT episodes)
     
-    # Basic podcast info
-    fg.title(f'{username}\'s Personal Podcast')
-    fg.description(f'A personal podcast feed for {username}')
-    fg.link(href=request.url, rel='self')
-    fg.language('en')
-    fg.author(name=username)
-    fg.subtitle(f'YouTube videos curated by {username}')
+    Items come out oldest first, the same order the feedgen version used
+    """
+    limit = app.config['FEED_ITEM_LIMIT']
+    query = Episode.query.filter_by(user_id=user.id)
+    history = b''
+    if limit:
+        newest = query.order_by(Episode.download_date.desc(), Episode.id.desc()).limit(limit).all()
+        episodes = reversed(newest)
+        archive_pages = _archive_page_count(user.id)
+        if archive_pages:
+            history = feed_history_links(prev_archive=_archive_url(user, archive_pages))
+    else:
+        # Rows are fetched in batches as the response goes out
+        episodes = query.order_by(Episode.download_date, Episode.id).yield_per(200)
     
-    # Add podcast-specific metadata
-    fg.category({'term': 'Personal', 'scheme': 'https://itunes.apple.com/us/genre/podcasts-personal/id1305'})
-    # fg.podcast.itunes_explicit(False)  # Commented out due to validation issues
+    writer = _feed_writer(user, feed_url, extra=history)
+    return writer.stream(_episode_item(episode) for episode in episodes)
+
+@app.route('/feed/<username>/archive/<int:page>')
+def user_feed_archive(username, page):
+    """Serve one RFC 5005 archive page of a user's feed, page 1 is the oldest"""
+    user = User.query.filter_by(username=username).first()
+    if not user:
+        return "User not found", 404
     
-    # Add each episode
-    for episode in episodes:
-        fe = fg.add_entry()
-        fe.title(episode.title)
-        fe.description(episode.description)
-        fe.link(href=episode.audio_url)
-        
-        # Set publication date
-        if episode.upload_date:
-            try:
-                upload_date = datetime.strptime(episode.upload_date, '%Y%m%d')
-                upload_date = upload_date.replace(tzinfo=timezone.utc)
-                fe.published(upload_date)
-            except ValueError:
-                # Ensure download_date has timezone info
-                if episode.download_date.tzinfo is None:
-                    download_date = episode.download_date.replace(tzinfo=timezone.utc)
-                else:
-                    download_date = episode.download_date
-                fe.published(download_date)
-        else:
-            # Ensure download_date has timezone info
-            if episode.download_date.tzinfo is None:
-                download_date = episode.download_date.replace(tzinfo=timezone.utc)
-            else:
-                download_date = episode.download_date
-            fe.published(download_date)
-        
-        # Podcast metadata
-        fe.podcast.itunes_author(episode.uploader or 'Unknown')
-        fe.podcast.itunes_duration(_format_duration(episode.duration))
-        # fe.podcast.itunes_explicit('false')  # Commented out due to validation issues
-        fe.podcast.itunes_summary(episode.description)
-        
-        # Audio file enclosure
-        fe.enclosure(episode.audio_url, str(episode.file_size), 'audio/mpeg')
+    archive_pages = _archive_page_count(user.id)
+    if not 1 <= page <= archive_pages:
+        return "Archive page not found", 404
+    
+    episode_ids = _archive_page_ids(user.id, page)
+    version = _archive_version(episode_ids)
+    variant = f"{request.base_url}?v={version}"
+    generation = feed_cache.generation(user.id)
+    cached = feed_cache.get(user.id, variant)
+    feed_cache_lookups.inc(result='miss' if cached is None else 'hit')
+    if cached is None:
+        render_started = time.perf_counter()
+        episodes = Episode.query.filter(Episode.id.in_(episode_ids)).order_by(
+            Episode.download_date, Episode.id).all()
+        history = feed_history_links(
+            current=url_for('user_feed', username=user.username, _external=True),
+            prev_archive=_archive_url(user, page - 1) if page > 1 else None,
+            next_archive=_archive_url(user, page + 1) if page < archive_pages else None,
+            archive=True,
+        )
+        newest = max(episode.download_date for episode in episodes)
+        writer = _feed_writer(user, _archive_url(user, page), build_date=newest, extra=history)
+        body = writer.render(_episode_item(episode) for episode in episodes)
+        cached = make_entry(body, last_modified=newest.replace(tzinfo=timezone.utc).timestamp())
+        pipeline_metrics.feed_render_seconds.observe(time.perf_counter() - render_started, source='web')
+        feed_cache.set(user.id, variant, cached, generation)
+    
+    response = _feed_response(cached)
+    if request.args.get('v') == version:
+        # The version in the URL changes with the page's contents, so this
+        # exact URL never needs to be fetched again
+        response.cache_control.public = True
+        response.cache_control.max_age = 365 * 24 * 3600
+        response.cache_control.immutable = True
+    else:
+        response.cache_control.no_cache = True
+    return _count_not_modified(response.make_conditional(request), 'archive')
+
+def _feed_response(cached):
+    """A cached feed in the best encoding the client accepts
     
-    # Return RSS as XML
-    response = app.response_class(fg.rss_str(), mimetype='application/rss+xml')
+    The gzip/brotli copies were made when the feed was cached, so this is
+    just picking one. Caches in between are told the body depends on
+    Accept-Encoding.
+    """
+    body, encoding, etag = negotiate(cached, request.accept_encodings)
+    response = app.response_class(body, mimetype='application/rss+xml')
+    if encoding:
+        response.content_encoding = encoding
+    response.vary.add('Accept-Encoding')
+    response.set_etag(etag)
+    response.last_modified = cached.last_modified
+    feed_encodings.inc(encoding=encoding or 'identity')
+    return response
+
+def _count_not_modified(response, route):
+    if response.status_code == 304:
+        not_modified_responses.inc(route=route)
     return response
 
+@app.route('/metrics')
+def metrics():
+    """Prometheus scrape endpoint, numbers are for this worker process"""
+    # Disk usage is cheap to work out from the database, so do it at scrape time.
+    # Evicted episodes keep their file_size but nothing is on disk for them.
+    user_disk_bytes.clear()
+    rows = db.session.query(User.username, db.func.sum(Episode.file_size)).join(
+        Episode, Episode.user_id == User.id).filter(Episode.evicted_at.is_(None)).group_by(User.username).all()
+    for username, total in rows:
+        user_disk_bytes.set(total or 0, user=username)
+    audio_store_bytes.set(db.session.query(db.func.coalesce(db.func.sum(AudioBlob.file_size), 0)).scalar())
+    
+    return app.response_class(metrics_registry.render(), mimetype='text/plain; version=0.0.4')
+
+def _archived_count(user_id):
+    """How many episodes are too old for the main feed"""
+    limit = app.config['FEED_ITEM_LIMIT']
+    if not limit:
+        return 0
+    total = db.session.query(db.func.count(Episode.id)).filter(Episode.user_id == user_id).scalar()
+    return max(0, total - limit)
+
+def _archive_page_count(user_id):
+    """How many archive pages sit behind the main feed"""
+    page_size = app.config['FEED_ARCHIVE_PAGE_SIZE']
+    return (_archived_count(user_id) + page_size - 1) // page_size
+
+def _archive_page_ids(user_id, page):
+    """Episode IDs on an archive page, counted from the oldest episode
+    
+    Counting from the oldest end means a full page keeps the same episodes
+    as new ones arrive, only the newest archive page fills up over time
+    """
+    page_size = app.config['FEED_ARCHIVE_PAGE_SIZE']
+    archived = _archived_count(user_id)
+    offset = (page - 1) * page_size
+    rows = db.session.query(Episode.id).filter(Episode.user_id == user_id).order_by(
+        Episode.download_date, Episode.id).offset(offset).limit(min(page_size, archived - offset)).all()
+    return [row.id for row in rows]
+
+def _archive_version(episode_ids):
+    """Short fingerprint of an archive page's episodes, used in its URL"""
+    return hashlib.sha256(','.join(map(str, episode_ids)).encode()).hexdigest()[:12]
+
+def _archive_url(user, page):
+    version = _archive_version(_archive_page_ids(user.id, page))
+    return url_for('user_feed_archive', username=user.username, page=page, v=version, _external=True)
+
+def _feed_writer(user, feed_url, build_date=None, extra=b''):
+    """Channel info for a user's feed, ready to stream episodes into"""
+    username = user.username
+    return FeedWriter(
+        title=f'{username}\'s Personal Podcast',
+        description=f'YouTube videos curated by {username}',
+        self_url=feed_url,
+        language='en',
+        category='Personal',
+        category_domain='https://itunes.apple.com/us/genre/podcasts-personal/id1305',
+        build_date=build_date,
+        extra=extra,
+    )
+
+def _episode_item(episode, audio_url=None):
+    """Render one episode's <item>, audio_url replaces the stored enclosure URL"""
+    published = episode.download_date
+    if episode.upload_date:
+        try:
+            published = datetime.strptime(episode.upload_date, '%Y%m%d')
+        except ValueError:
+            pass
+    
+    return render_item(
+        title=episode.title,
+        link=audio_url or episode.audio_url,
+        description=episode.description,
+        enclosure_url=audio_url or episode.audio_url,
+        length=episode.file_size,
+        mime_type=episode.mime_type or 'audio/mpeg',
+        published=published,
+        author=episode.uploader or 'Unknown',
+        duration=_format_duration(episode.duration),
+        summary=episode.description,
+    )
+
 def _format_duration(seconds):
     """Format duration in HH:MM:SS format"""
     if not seconds:
@@ -310,22 +1043,319 @@ def delete_episode(episode_id):
         flash('Unauthorized')
         return redirect(url_for('dashboard'))
     
-    # Delete audio file
+    # Delete the user's copy of the audio file
     user_episodes_dir = UPLOAD_FOLDER / str(current_user.id)
     audio_file = user_episodes_dir / episode.filename
     if audio_file.exists():
         audio_file.unlink()
     
     # Delete from database
+    blob_id = episode.blob_id
     db.session.delete(episode)
+    if blob_id:
+        AudioBlob.query.filter_by(id=blob_id).update({'refcount': AudioBlob.refcount - 1})
     db.session.commit()
+    feed_cache.invalidate(current_user.id)
+    
+    # The shared file goes once nobody points at it anymore
+    if blob_id:
+        _release_blob(blob_id)
     
     flash('Episode deleted successfully')
     return redirect(url_for('dashboard'))
 
-if __name__ == '__main__':
+def _release_blob(blob_id):
+    """Remove a shared audio file if its last reference just went away"""
+    blob = db.session.get(AudioBlob, blob_id)
+    if blob is None:
+        return
+    path = blob.path
+    # the refcount check in the WHERE keeps us from racing a new reference
+    deleted = AudioBlob.query.filter_by(id=blob_id, refcount=0).delete()
+    db.session.commit()
+    if deleted:
+        audio_store.remove(path)
+
+def _save_play_times(times):
+    """Write a batch of episode play times in one statement"""
+    table = Episode.__table__
+    db.session.execute(
+        table.update().where(table.c.id == bindparam('episode_id')).values(last_played_at=bindparam('played_at')),
+        [{'episode_id': episode_id, 'played_at': played_at} for episode_id, played_at in times.items()],
+    )
+    db.session.commit()
+
+# Last play of each episode, flushed to the database every ACCESS_FLUSH_SECONDS
+play_times = AccessTracker(_save_play_times, interval=config.ACCESS_FLUSH_SECONDS)
+
+def evict_episode_audio(episodes, rule):
+    """Remove the audio of some episodes to save space
+    
+    The episodes stay in the feed with their old URLs, playing one
+    downloads it again (see serve_episode). Shared files go once nothing
+    points at them.
+    """
+    released = set()
+    for episode in episodes:
+        (UPLOAD_FOLDER / str(episode.user_id) / episode.filename).unlink(missing_ok=True)
+        if episode.blob_id:
+            AudioBlob.query.filter_by(id=episode.blob_id).update({'refcount': AudioBlob.refcount - 1})
+            released.add(episode.blob_id)
+        episode.blob_id = None
+        episode.evicted_at = datetime.utcnow()
+        evictions.inc(rule=rule)
+        print(f"Evicted audio of episode {episode.id} ({rule}): {episode.title}")
+    db.session.commit()
+    
+    for blob_id in released:
+        _release_blob(blob_id)
+    return len(episodes)
+
+def enforce_retention():
+    """Apply the RETENTION_* rules and quotas, returns how many episodes lost their audio"""
+    policy = RetentionPolicy.from_config(app.config)
+    if not policy.enabled:
+        return 0
+    
+    # Eviction goes by play times, so get the batched ones in first
+    play_times.flush()
+    stored = Episode.query.filter(Episode.evicted_at.is_(None))
+    last_used = db.func.coalesce(Episode.last_played_at, Episode.download_date)
+    evicted = 0
+    
+    if policy.keep_newest:
+        ranked = db.session.query(
+            Episode.id,
+            db.func.row_number().over(
+                partition_by=Episode.user_id,
+                order_by=(Episode.download_date.desc(), Episode.id.desc()),
+            ).label('position'),
+        ).filter(Episode.evicted_at.is_(None)).subquery()
+        old_ids = db.session.query(ranked.c.id).filter(ranked.c.position > policy.keep_newest)
+        evicted += evict_episode_audio(stored.filter(Episode.id.in_(old_ids)).all(), 'keep_newest')
+    
+    if policy.idle_days:
+        cutoff = datetime.utcnow() - timedelta(days=policy.idle_days)
+        evicted += evict_episode_audio(stored.filter(last_used < cutoff).all(), 'idle')
+    
+    if policy.user_quota_bytes:
+        over_quota = db.session.query(Episode.user_id).filter(Episode.evicted_at.is_(None)).group_by(
+            Episode.user_id
+        ).having(db.func.sum(Episode.file_size) > policy.user_quota_bytes)
+        for (user_id,) in over_quota.all():
+            rows = db.session.query(Episode.id, Episode.file_size, last_used).filter(
+                Episode.user_id == user_id, Episode.evicted_at.is_(None)
+            ).all()
+            victims = lru_victims(rows, sum(size or 0 for _, size, _ in rows), policy.user_quota_bytes)
+            evicted += evict_episode_audio(stored.filter(Episode.id.in_(victims)).all(), 'user_quota')
+    
+    if policy.global_quota_bytes:
+        evicted += _enforce_global_quota(policy.global_quota_bytes, last_used)
+    
+    return evicted
+
+def _enforce_global_quota(quota_bytes, last_used):
+    """Evict least recently played audio until everything stored fits the global quota"""
+    # Shared files count once and only free space when all their episodes go
+    blobs = db.session.query(
+        Episode.blob_id, AudioBlob.file_size, db.func.max(last_used)
+    ).join(AudioBlob, Episode.blob_id == AudioBlob.id).filter(
+        Episode.evicted_at.is_(None)
+    ).group_by(Episode.blob_id, AudioBlob.file_size).all()
+    # Older episodes kept their own copy before the shared store existed
+    unshared = db.session.query(Episode.id, Episode.file_size, last_used).filter(
+        Episode.evicted_at.is_(None), Episode.blob_id.is_(None)
+    ).all()
+    
+    items = [(('blob', blob_id), size, used) for blob_id, size, used in blobs]
+    items += [(('episode', episode_id), size, used) for episode_id, size, used in unshared]
+    victims = lru_victims(items, sum(size or 0 for _, size, _ in items), quota_bytes)
+    if not victims:
+        return 0
+    
+    blob_ids = [key for kind, key in victims if kind == 'blob']
+    episode_ids = [key for kind, key in victims if kind == 'episode']
+    episodes = Episode.query.filter(
+        Episode.evicted_at.is_(None),
+        db.or_(Episode.blob_id.in_(blob_ids), Episode.id.in_(episode_ids)),
+    ).all()
+    return evict_episode_audio(episodes, 'global_quota')
+
+@app.cli.command('enforce-retention')
+def enforce_retention_command():
+    """Remove episode audio that's over the disk budget."""
+    print(f"Evicted audio of {enforce_retention()} episodes")
+
+def static_site_files(base_url):
+    """Every user's feed and stored audio, laid out for a static host under base_url
+    
+    feed/<username>/rss.xml (plus rss-archive-<n>.xml pages past
+    FEED_ITEM_LIMIT, oldest first, all with .gz/.br copies) and
+    episode/<user_id>/<filename>, the same audio paths the app serves. A
+    static host can't download removed audio again, so those episodes are
+    left out, and so are users whose name can't be a folder.
+    """
+    base_url = base_url.rstrip('/')
+    for user in User.query.order_by(User.id).all():
+        if not _is_folder_safe(user.username):
+            # Registered before usernames were checked
+            print(f"Username {user.username!r} can't be a folder name, user {user.id} not published")
+            continue
+        rows = db.session.query(Episode, AudioBlob.content_hash).outerjoin(
+            AudioBlob, Episode.blob_id == AudioBlob.id
+        ).filter(Episode.user_id == user.id, Episode.evicted_at.is_(None)).order_by(
+            Episode.download_date, Episode.id).all()
+        
+        audio_urls = {}
+        for episode, content_hash in rows:
+            audio_file = UPLOAD_FOLDER / str(user.id) / episode.filename
+            if not audio_file.exists():
+                print(f"Missing audio for episode {episode.id}, not published")
+                continue
+            path = f"episode/{user.id}/{episode.filename}"
+            audio_urls[episode.id] = f"{base_url}/{quote(path)}"
+            # Shared audio already knows its hash, no need to read the file
+            yield SiteFile(path, audio_file, content_hash)
+        episodes = [episode for episode, _ in rows if episode.id in audio_urls]
+        
+        yield from _static_feed_files(user, episodes, audio_urls, f"{base_url}/feed/{quote(user.username)}")
+
+def _static_feed_files(user, episodes, audio_urls, feed_base):
+    """A user's feed and archive pages as SiteFiles, episodes oldest first
+    
+    Build dates come from the episodes, so an unchanged feed renders to the
+    same bytes and isn't published again
+    """
+    limit = app.config['FEED_ITEM_LIMIT']
+    page_size = app.config['FEED_ARCHIVE_PAGE_SIZE']
+    head, archived = (episodes[-limit:], episodes[:-limit]) if limit and len(episodes) > limit else (episodes, [])
+    pages = [archived[i:i + page_size] for i in range(0, len(archived), page_size)]
+    feed_dir = f"feed/{user.username}"
+    
+    def page_url(page):
+        return f"{feed_base}/rss-archive-{page}.xml"
+    
+    def items(page_episodes):
+        return [_episode_item(episode, audio_urls[episode.id]) for episode in page_episodes]
+    
+    for page, page_episodes in enumerate(pages, start=1):
+        history = feed_history_links(
+            current=f"{feed_base}/rss.xml",
+            prev_archive=page_url(page - 1) if page > 1 else None,
+            next_archive=page_url(page + 1) if page < len(pages) else None,
+            archive=True,
+        )
+        newest = max(episode.download_date for episode in page_episodes)
+        writer = _feed_writer(user, page_url(page), build_date=newest, extra=history)
+        yield from _feed_site_files(f"{feed_dir}/rss-archive-{page}.xml", writer.render(items(page_episodes)))
+    
+    history = feed_history_links(prev_archive=page_url(len(pages))) if pages else b''
+    build_date = max((episode.download_date for episode in episodes), default=user.created_at)
+    writer = _feed_writer(user, f"{feed_base}/rss.xml", build_date=build_date, extra=history)
+    yield from _feed_site_files(f"{feed_dir}/rss.xml", writer.render(items(reversed(head))))
+
+def _feed_site_files(path, body):
+    """A feed file and its .gz/.br copies for the front proxy"""
+    yield SiteFile(path, body)
+    for encoding, data in compress_feed(body).items():
+        yield SiteFile(path + COMPRESSED_SUFFIXES[encoding], data)
+
+@app.cli.command('publish')
+@click.argument('output_dir', required=False)
+@click.option('--base-url', help='Public URL of the output folder (default: PUBLISH_BASE_URL).')
+@click.option('--deletions', type=click.Path(dir_okay=False), help='Write the paths to remove from the host to this file.')
+def publish_command(output_dir, base_url, deletions):
+    """Copy feeds and audio into a folder for a static host, only what changed."""
+    output_dir = output_dir or app.config['PUBLISH_DIR']
+    base_url = base_url or app.config['PUBLISH_BASE_URL']
+    if not base_url:
+        raise click.UsageError('Set --base-url or PUBLISH_BASE_URL to where the folder will be served from')
+    
+    result = StaticPublisher(output_dir).publish(static_site_files(base_url))
+    print(f"Published to {output_dir}: {len(result.changed)} changed, "
+          f"{result.unchanged} unchanged, {len(result.deleted)} deleted")
+    for path in result.deleted:
+        print(f"Deleted: {path}")
+    if deletions:
+        Path(deletions).write_text(''.join(f"{path}\n" for path in result.deleted), encoding='utf-8')
+
+def init_db():
+    """Create tables and bring databases from older versions up to date"""
+    db.create_all()
+    _upgrade_schema()
+
+def _upgrade_schema():
+    """Add columns introduced after a database was created"""
+    inspector = db.inspect(db.engine)
+    connection = db.session.connection()
+    
+    for table in db.metadata.sorted_tables:
+        existing = {column['name'] for column in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name not in existing:
+                column_type = column.type.compile(db.engine.dialect)
+                connection.exec_driver_sql(f'ALTER TABLE "{table.name}" ADD COLUMN "{column.name}" {column_type}')
+    
+    # episode.video_hash used to be unique across all users, which stops two
+    # users from having the same video
+    unique_hash = any(
+        constraint['column_names'] == ['video_hash']
+        for constraint in inspector.get_unique_constraints('episode')
+    )
+    if unique_hash and db.engine.dialect.name == 'sqlite':
+        _rebuild_sqlite_table(connection, Episode.__table__)
+    
+    # create_all() only adds indexes along with new tables
+    for table in db.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(connection, checkfirst=True)
+    
+    db.session.commit()
+
+def _rebuild_sqlite_table(connection, table):
+    """SQLite can't drop a constraint, so copy the table into a fresh one"""
+    old_name = f"_{table.name}_old"
+    columns = ', '.join(f'"{column.name}"' for column in table.columns)
+    
+    # legacy mode stops SQLite from pointing other tables' foreign keys at the old copy
+    connection.exec_driver_sql('PRAGMA legacy_alter_table=ON')
+    connection.exec_driver_sql(f'ALTER TABLE "{table.name}" RENAME TO "{old_name}"')
+    connection.exec_driver_sql('PRAGMA legacy_alter_table=OFF')
+    for index in db.inspect(connection).get_indexes(old_name):
+        connection.exec_driver_sql(f'DROP INDEX "{index["name"]}"')
+    table.create(connection)
+    connection.exec_driver_sql(f'INSERT INTO "{table.name}" ({columns}) SELECT {columns} FROM "{old_name}"')
+    connection.exec_driver_sql(f'DROP TABLE "{old_name}"')
+
+def prepare_app():
+    """One-off startup work: tables, leftovers from a crashed run, the disk budget
+    
+    Run once before any worker serves requests (gunicorn.conf.py does it in the
+    master process).
+    """
     with app.app_context():
-        db.create_all()
+        init_db()
+        sweep_staging()
+        enforce_retention()
+        # Workers forked after this open their own database connections
+        db.engine.dispose()
+
+def start_background_workers():
+    """Download workers and the subscription poller, once in every process that serves requests"""
+    # Picks up anything left in the queue from the last run too
+    download_queue.start()
+    subscription_scheduler.start()
+
+def stop_background_workers(timeout=30):
+    """Let running downloads finish and write out play times that are still in memory"""
+    subscription_scheduler.stop(timeout)
+    download_queue.stop(timeout)
+    with app.app_context():
+        play_times.flush()
+
+if __name__ == '__main__':
+    prepare_app()
+    start_background_workers()
     
     # Get port from environment variable (for production) or use 5000 for local development
     port = int(os.environ.get('PORT', 5000))
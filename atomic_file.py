@@ -0,0 +1,49 @@
+#!/usr/bin/env python3
+"""
+Atomic file writes
+
+Everything that's read while it may be rewritten (feeds served by a static
+host or another worker, the metadata file, the feed cache, a published
+site) goes through atomic_write: the data lands in a temp file next to the
+target and is renamed over it, so readers see the old file or the new one
+and a crash never leaves a truncated file behind.
+
+    atomic_write('rss.xml', b'<rss>...</rss>')
+    atomic_write('rss.xml', writer.stream(items))   # or chunks as they come
+"""
+
+import os
+import stat
+import tempfile
+from pathlib import Path
+
+# read once at import, changing it to look is process wide and not thread safe
+_UMASK = os.umask(0)
+os.umask(_UMASK)
+
+
+def atomic_write(path, data):
+    """write bytes, or an iterable of bytes chunks, to path through a temp file next to it"""
+    path = Path(path)
+    if isinstance(data, (bytes, bytearray)):
+        data = [data]
+    # same folder, so the rename never crosses filesystems
+    fd, tmp_path = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}.")
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            for chunk in data:
+                f.write(chunk)
+        # mkstemp makes the file 0600, which a web server running as another
+        # user can't read: keep the old file's mode, or what open() would give
+        os.chmod(tmp_path, _file_mode(path))
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+
+def _file_mode(path):
+    try:
+        return stat.S_IMODE(os.stat(path).st_mode)
+    except FileNotFoundError:
+        return 0o666 & ~_UMASK
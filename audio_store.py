@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+"""
+Shared audio store for the web app
+
+Every video is downloaded and converted once into <root>/<video id>.<ext>.
+Users get a hardlink to that blob in their own episodes folder, so the
+existing /episode/<user_id>/<filename> URLs keep working while the bytes
+sit on disk only once. Reference counts live in the database (AudioBlob).
+"""
+
+import hashlib
+import os
+import re
+import shutil
+import tempfile
+from pathlib import Path
+
+STAGING_PREFIX = '.staging-'
+
+
+class AudioStore:
+    """files keyed by canonical video id, handed out to users as hardlinks"""
+
+    def __init__(self, root):
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+
+    def blob_path(self, video_id, ext):
+        return self.root / f"{_safe_key(video_id)}{ext}"
+
+    def staging_dir(self, name=None):
+        """scratch folder for a download, on the same filesystem as the store
+
+        with a name the same folder comes back every time, so a retried job
+        finds the .part files of the attempt that crashed and carries on
+        """
+        if name is None:
+            return Path(tempfile.mkdtemp(dir=self.root, prefix=STAGING_PREFIX))
+        path = self.root / f"{STAGING_PREFIX}{_safe_key(name)}"
+        path.mkdir(exist_ok=True)
+        return path
+
+    def add(self, video_id, source):
+        """move a freshly downloaded file into the store, returns the blob path"""
+        source = Path(source)
+        blob = self.blob_path(video_id, source.suffix)
+        os.replace(source, blob)
+        return blob
+
+    def link(self, blob, dest_dir, filename):
+        """give a user their own name for a blob, returns the filename used
+
+        hardlinks cost nothing; if the filesystem can't do them we fall
+        back to a copy (still no yt-dlp/FFmpeg work)
+        """
+        dest_dir = Path(dest_dir)
+        dest_dir.mkdir(parents=True, exist_ok=True)
+        dest = dest_dir / filename
+
+        if dest.exists():
+            if os.path.samefile(dest, blob):
+                return dest.name
+            # different video with the same title, keep both
+            dest = dest_dir / f"{dest.stem} [{Path(blob).stem}]{dest.suffix}"
+            if dest.exists():
+                return dest.name
+
+        try:
+            os.link(blob, dest)
+        except OSError:
+            shutil.copy2(blob, dest)
+        return dest.name
+
+    def remove(self, blob):
+        Path(blob).unlink(missing_ok=True)
+
+    def discard_staging(self, staging_dir):
+        shutil.rmtree(staging_dir, ignore_errors=True)
+
+    def sweep_staging(self, keep=()):
+        """remove staging folders left by crashed downloads, except the named ones
+
+        returns the folders removed
+        """
+        keep = {self.root / f"{STAGING_PREFIX}{_safe_key(name)}" for name in keep}
+        removed = []
+        for path in self.root.glob(f"{STAGING_PREFIX}*"):
+            if path.is_dir() and path not in keep:
+                self.discard_staging(path)
+                removed.append(path)
+        return removed
+
+
+def file_sha256(path, chunk_size=1024 * 1024):
+    """hex sha256 of a file, read in chunks so big episodes don't fill memory"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _safe_key(video_id):
+    """video ids go into file names, keep them boring"""
+    return re.sub(r'[^A-Za-z0-9_.-]', '_', video_id)
@@ -0,0 +1,300 @@
+#!/usr/bin/env python3
+"""
+Benchmarks for feed generation and metadata I/O
+
+Builds synthetic libraries (100 / 10k / 100k episodes by default) as an
+episodes_metadata.json file, an SQLite metadata store and Episode rows, then
+times the CLI's metadata load/save and generate_rss_feed plus the web app's
+/feed/<username> and /dashboard through Flask's test client. Everything runs
+in a scratch folder and yt-dlp is stubbed out, so no network is needed.
+
+Usage:
+    python benchmark.py --output bench.json
+    python benchmark.py --sizes 100 1000 --baseline bench.json --threshold 1.25
+
+With --baseline, any benchmark whose median is more than --threshold times
+the baseline median fails the run (exit code 1).
+"""
+
+import argparse
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import types
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+DEFAULT_SIZES = (100, 10_000, 100_000)
+
+
+class OfflineYoutubeDL:
+    """stands in for yt_dlp.YoutubeDL, benchmarks must never hit the network"""
+
+    def __init__(self, opts=None):
+        self.opts = opts or {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def extract_info(self, url, download=True, **kwargs):
+        raise RuntimeError(f"benchmark tried to reach the network for {url}")
+
+
+def stub_yt_dlp():
+    """make sure nothing can call out to YouTube, even if yt-dlp isn't installed"""
+    try:
+        import yt_dlp
+    except ImportError:
+        yt_dlp = types.ModuleType('yt_dlp')
+        yt_dlp.utils = types.SimpleNamespace(DownloadError=type('DownloadError', (Exception,), {}))
+        sys.modules['yt_dlp'] = yt_dlp
+    yt_dlp.YoutubeDL = OfflineYoutubeDL
+
+
+def synthetic_episodes(count, seed=0):
+    """deterministic episode metadata, keyed like the real store (video id -> data)"""
+    rng = random.Random(seed)
+    start = datetime(2020, 1, 1, tzinfo=timezone.utc)
+    episodes = {}
+    for n in range(count):
+        video_id = f"vid{n:08d}"
+        downloaded = start + timedelta(minutes=n)
+        title = f"Episode {n} - {rng.choice(['Talk', 'Interview', 'Q&A', 'Live <set>'])}"
+        episodes[video_id] = {
+            'title': title,
+            'description': ' '.join(rng.choice(['lorem', 'ipsum', 'dolor', '&', 'sit', 'amet'])
+                                    for _ in range(rng.randint(20, 80))),
+            'duration': rng.randint(60, 3 * 3600),
+            'upload_date': (downloaded - timedelta(days=rng.randint(0, 30))).strftime('%Y%m%d'),
+            'uploader': f"Channel {rng.randint(1, 50)}",
+            'filename': f"{title}.mp3",
+            'file_size': rng.randint(1_000_000, 200_000_000),
+            'download_date': downloaded.isoformat(),
+            'video_url': f"https://www.youtube.com/watch?v={video_id}",
+            'audio_url': f"https://example.com/episodes/{video_id}.mp3",
+            'video_id': video_id,
+            'mime_type': 'audio/mpeg',
+        }
+    return episodes
+
+
+def timed(func, repeat):
+    """run func repeat times, returns the timings in seconds"""
+    runs = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        runs.append(time.perf_counter() - started)
+    return runs
+
+
+def summarize(runs):
+    return {'min': min(runs), 'median': statistics.median(runs), 'runs': runs}
+
+
+def bench_cli(size, workdir, repeat):
+    """metadata load/save and RSS generation for the command line tool"""
+    from metadata_store import SQLiteMetadataStore
+    from yt2podcast import YT2Podcast
+
+    results = {}
+    episodes = synthetic_episodes(size)
+    workdir = Path(workdir)
+    workdir.mkdir(parents=True, exist_ok=True)
+    cwd = os.getcwd()
+    os.chdir(workdir)
+    try:
+        with open('episodes_metadata.json', 'w', encoding='utf-8') as f:
+            json.dump(episodes, f, indent=2, ensure_ascii=False)
+        sqlite_store = SQLiteMetadataStore('episodes.db')
+        sqlite_store.upsert_many(episodes.items())
+        sqlite_store.close()
+
+        for name, metadata_file in (('json', 'episodes_metadata.json'), ('sqlite', 'episodes.db')):
+            podcast = YT2Podcast(base_url='https://example.com', metadata_file=metadata_file)
+
+            def load():
+                store = podcast._load_metadata()
+                dict(store.items())
+                store.close()
+            results[f"metadata_load_{name}"] = summarize(timed(load, repeat))
+            results[f"metadata_save_{name}"] = summarize(timed(podcast._save_metadata, repeat))
+            podcast.metadata.close()
+
+        podcast = YT2Podcast(base_url='https://example.com')
+        results['rss_full'] = summarize(timed(lambda: podcast.generate_rss_feed(incremental=False), repeat))
+
+        # the common case: every item already rendered, one new episode
+        extra = iter(synthetic_episodes(size + repeat, seed=1).items())
+
+        def add_one():
+            video_id, episode_data = next(extra)
+            podcast.metadata[f"new-{video_id}"] = episode_data
+            podcast.generate_rss_feed()
+        results['rss_incremental'] = summarize(timed(add_one, repeat))
+        podcast.metadata.close()
+    finally:
+        os.chdir(cwd)
+    return results
+
+
+def bench_web(web, size, repeat):
+    """feed and dashboard requests against web, an imported app module"""
+    results = {}
+    flask_app = web.app
+    flask_app.config['TESTING'] = True
+    flask_app.config['WTF_CSRF_ENABLED'] = False
+
+    client = flask_app.test_client()
+    username = f"bench{size}"
+    client.post('/register', data={'username': username, 'email': f"{username}@example.com", 'password': 'pw'})
+    client.post('/login', data={'username': username, 'password': 'pw'})
+
+    with flask_app.app_context():
+        user = web.User.query.filter_by(username=username).one()
+        user_id = user.id
+        rows = [
+            {
+                'user_id': user_id, 'title': data['title'], 'description': data['description'],
+                'duration': data['duration'], 'upload_date': data['upload_date'], 'uploader': data['uploader'],
+                'filename': data['filename'], 'file_size': data['file_size'],
+                'download_date': datetime.fromisoformat(data['download_date']).replace(tzinfo=None),
+                'video_url': data['video_url'], 'audio_url': data['audio_url'], 'video_hash': video_id,
+                'mime_type': data['mime_type'],
+            }
+            for video_id, data in synthetic_episodes(size).items()
+        ]
+        web.db.session.execute(web.db.insert(web.Episode), rows)
+        web.db.session.commit()
+
+    def get(url):
+        response = client.get(url)
+        if response.status_code != 200:
+            raise RuntimeError(f"GET {url} returned {response.status_code}")
+        return response
+
+    def cold_feed():
+        web.feed_cache.invalidate(user_id)
+        get(f"/feed/{username}")
+
+    results['web_feed_cold'] = summarize(timed(cold_feed, repeat))
+    results['web_feed_warm'] = summarize(timed(lambda: get(f"/feed/{username}"), repeat))
+
+    limit = flask_app.config['FEED_ITEM_LIMIT']
+    flask_app.config['FEED_ITEM_LIMIT'] = 0
+    try:
+        results['web_feed_cold_unlimited'] = summarize(timed(cold_feed, repeat))
+    finally:
+        flask_app.config['FEED_ITEM_LIMIT'] = limit
+        web.feed_cache.invalidate(user_id)
+
+    results['web_dashboard'] = summarize(timed(lambda: get('/dashboard'), repeat))
+    return results
+
+
+def import_web_app(workdir):
+    """import app.py against a scratch database and episodes folder"""
+    workdir = Path(workdir)
+    workdir.mkdir(parents=True, exist_ok=True)
+    os.environ['DATABASE_URI'] = f"sqlite:///{workdir / 'bench.db'}"
+    os.environ['INFO_CACHE_FILE'] = str(workdir / 'info_cache.db')
+    os.environ['UPLOAD_FOLDER'] = str(workdir / 'user_episodes')
+    os.environ.setdefault('FEED_CACHE_BACKEND', 'memory')
+    import app as web
+
+    with web.app.app_context():
+        web.init_db()
+    return web
+
+
+def run_suite(sizes=DEFAULT_SIZES, repeat=3, workdir=None, web=None):
+    """run every benchmark for every library size, returns the results dict"""
+    workdir = Path(workdir or tempfile.mkdtemp(prefix='yt2podcast-bench-'))
+    if web is None:
+        web = import_web_app(workdir / 'web')
+
+    results = {}
+    for size in sizes:
+        print(f"Benchmarking {size} episodes...")
+        timings = bench_cli(size, workdir / f"cli-{size}", repeat)
+        timings.update(bench_web(web, size, repeat))
+        for name, timing in timings.items():
+            results[f"{name}/{size}"] = timing
+            print(f"  {name:<28} median {timing['median'] * 1000:9.1f} ms")
+
+    return {
+        'meta': {
+            'created': datetime.now(timezone.utc).isoformat(),
+            'commit': _git_commit(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'sizes': list(sizes),
+            'repeat': repeat,
+        },
+        'results': results,
+    }
+
+
+def compare(current, baseline, threshold):
+    """benchmarks that got slower than threshold x the baseline median
+
+    returns a list of (name, baseline median, current median)
+    """
+    regressions = []
+    for name, timing in current['results'].items():
+        before = baseline['results'].get(name)
+        if before and timing['median'] > before['median'] * threshold:
+            regressions.append((name, before['median'], timing['median']))
+    return regressions
+
+
+def _git_commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True,
+            cwd=Path(__file__).parent,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description='benchmark feed generation and metadata I/O')
+    parser.add_argument('--sizes', type=int, nargs='+', default=list(DEFAULT_SIZES),
+                        help='library sizes to test (default: 100 10000 100000)')
+    parser.add_argument('--repeat', type=int, default=3, help='runs per benchmark, the median is compared (default: 3)')
+    parser.add_argument('--output', help='write results as JSON to this file')
+    parser.add_argument('--baseline', help='results JSON from an earlier run to compare against')
+    parser.add_argument('--threshold', type=float, default=1.25,
+                        help='fail if a median is more than this many times the baseline (default: 1.25)')
+    parser.add_argument('--workdir', help='scratch folder (default: a new temp folder)')
+    args = parser.parse_args()
+
+    stub_yt_dlp()
+    current = run_suite(sizes=args.sizes, repeat=args.repeat, workdir=args.workdir)
+
+    if args.output:
+        Path(args.output).write_text(json.dumps(current, indent=2) + '\n', encoding='utf-8')
+        print(f"Results written to {args.output}")
+
+    if args.baseline:
+        baseline = json.loads(Path(args.baseline).read_text(encoding='utf-8'))
+        regressions = compare(current, baseline, args.threshold)
+        for name, before, after in regressions:
+            print(f"REGRESSION {name}: {before * 1000:.1f} ms -> {after * 1000:.1f} ms ({after / before:.2f}x)")
+        if regressions:
+            sys.exit(1)
+        print(f"No regressions over {args.threshold}x against {args.baseline}")
+
+
+if __name__ == '__main__':
+    main()
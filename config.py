@@ -17,8 +17,8 @@ DEBUG = os.environ.get('FLASK_DEBUG', 'True').lower() == 'true'
 DATABASE_URI = os.environ.get('DATABASE_URI', 'sqlite:///podcast_users.db')
 
 # File storage
-UPLOAD_FOLDER = BASE_DIR / 'user_episodes'
-MAX_CONTENT_LENGTH = 500 * 1024 * 1024  # 500MB max file size
+UPLOAD_FOLDER = Path(os.environ.get('UPLOAD_FOLDER', BASE_DIR / 'user_episodes'))
+MAX_CONTENT_LENGTH = 500 * 1024 * 1024  # 500MB max file size, bigger downloads are skipped
 
 # YouTube download settings
 YT_DLP_OPTIONS = {
@@ -32,6 +32,82 @@ YT_DLP_OPTIONS = {
     'no_warnings': False,
 }
 
+# Background download queue
+DOWNLOAD_WORKERS = int(os.environ.get('DOWNLOAD_WORKERS', '2'))
+JOB_HEARTBEAT_SECONDS = 30  # how often a running job checks in
+JOB_STALE_SECONDS = 180  # running jobs silent for this long get re-queued
+JOB_MAX_ATTEMPTS = 3
+# Running downloads across all workers (0 for one per CPU core, each
+# FFmpeg conversion keeps a core busy) and per user, so one user queueing
+# hundreds of videos can't hold up everybody else
+DOWNLOAD_MAX_RUNNING = int(os.environ.get('DOWNLOAD_MAX_RUNNING', '0'))
+DOWNLOAD_MAX_PER_USER = int(os.environ.get('DOWNLOAD_MAX_PER_USER', '2'))
+
+# Rendered feed cache: 'memory' (per worker LRU), 'file' (shared between
+# workers on one box) or 'none'. A memory cache only hears about changes
+# made through its own worker, so with several worker processes (gunicorn
+# sets WEB_CONCURRENCY) the default is the shared file cache
+WEB_CONCURRENCY = int(os.environ.get('WEB_CONCURRENCY', '1'))
+FEED_CACHE_BACKEND = os.environ.get('FEED_CACHE_BACKEND', 'file' if WEB_CONCURRENCY > 1 else 'memory')
+FEED_CACHE_SIZE = 1024  # feeds kept by the memory backend
+FEED_CACHE_DIR = Path(os.environ.get('FEED_CACHE_DIR', BASE_DIR / 'feed_cache'))
+
+# yt-dlp video info cache (SQLite), so retries, re-downloads of removed
+# audio and the same video for another user skip the extract step. Entries
+# last INFO_CACHE_TTL seconds or until their stream URLs expire
+INFO_CACHE_FILE = Path(os.environ.get('INFO_CACHE_FILE', BASE_DIR / 'instance' / 'info_cache.db'))
+INFO_CACHE_TTL = 6 * 3600
+INFO_CACHE_MAX_ENTRIES = 500
+
+# Feed paging (RFC 5005): the main feed only lists the newest FEED_ITEM_LIMIT
+# episodes (0 = all of them), older ones are in archive pages of
+# FEED_ARCHIVE_PAGE_SIZE that podcast apps can walk back through
+FEED_ITEM_LIMIT = int(os.environ.get('FEED_ITEM_LIMIT', '100'))
+FEED_ARCHIVE_PAGE_SIZE = 100
+
+# How /episode/ files are sent:
+#   'stream'     - Flask sends the file itself (uses the WSGI server's sendfile
+#                  support when it has one)
+#   'x-accel'    - nginx sends it, via X-Accel-Redirect to EPISODE_ACCEL_PREFIX,
+#                  which must be an `internal` location aliased to UPLOAD_FOLDER
+#   'x-sendfile' - Apache mod_xsendfile / lighttpd send it, via X-Sendfile
+EPISODE_SERVE_MODE = os.environ.get('EPISODE_SERVE_MODE', 'stream')
+EPISODE_ACCEL_PREFIX = os.environ.get('EPISODE_ACCEL_PREFIX', '/_episodes/')
+
+# Default audio format for new users: 'mp3' re-encodes so every podcast app
+# can play it, 'remux' keeps YouTube's AAC/Opus audio (no transcoding, much
+# cheaper on CPU, but Opus won't play in every app)
+DEFAULT_AUDIO_MODE = os.environ.get('DEFAULT_AUDIO_MODE', 'mp3')
+
+# Channel/playlist subscriptions. Each one is polled every
+# SUBSCRIPTION_POLL_MINUTES (users can pick longer, never shorter than the
+# minimum), +/- 10% so they spread out, and at most
+# SUBSCRIPTION_POLLS_PER_MINUTE listings are fetched per process
+SUBSCRIPTION_POLL_MINUTES = int(os.environ.get('SUBSCRIPTION_POLL_MINUTES', '60'))
+SUBSCRIPTION_MIN_POLL_MINUTES = 15
+SUBSCRIPTION_POLLS_PER_MINUTE = int(os.environ.get('SUBSCRIPTION_POLLS_PER_MINUTE', '30'))
+SUBSCRIPTION_POLL_WINDOW = 30  # newest uploads listed per channel poll
+SUBSCRIPTION_INITIAL_EPISODES = 3  # a new subscription starts with this many of the latest videos
+
+# Disk budget for episode audio, 0 switches a limit off. Going over removes
+# the audio of the least recently played episodes; they stay in the feed and
+# are downloaded again the next time somebody plays them
+USER_QUOTA_MB = int(os.environ.get('USER_QUOTA_MB', '0'))  # per user
+GLOBAL_QUOTA_MB = int(os.environ.get('GLOBAL_QUOTA_MB', '0'))  # whole audio store
+RETENTION_KEEP_NEWEST = int(os.environ.get('RETENTION_KEEP_NEWEST', '0'))  # audio kept for each user's newest N episodes
+RETENTION_IDLE_DAYS = int(os.environ.get('RETENTION_IDLE_DAYS', '0'))  # audio not played for this long goes
+ACCESS_FLUSH_SECONDS = 60  # play times are written to the database in batches this often
+REFETCH_WAIT_SECONDS = 20  # how long a play of removed audio waits for the download before a 503
+
+# `flask publish` copies every user's feed and audio into PUBLISH_DIR for a
+# static host (only files that changed since the last run), with enclosure
+# links under PUBLISH_BASE_URL
+PUBLISH_DIR = os.environ.get('PUBLISH_DIR', 'site')
+PUBLISH_BASE_URL = os.environ.get('PUBLISH_BASE_URL', '')
+
+# Episodes shown per dashboard page
+DASHBOARD_PAGE_SIZE = 25
+
 # Podcast feed settings
 PODCAST_CATEGORY = 'Personal'
 PODCAST_LANGUAGE = 'en'
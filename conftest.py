@@ -0,0 +1,119 @@
+"""
+Shared pytest setup - points the web app at a throwaway database and
+episodes folder so tests never touch instance/podcast_users.db
+"""
+
+import os
+import tempfile
+import uuid
+from datetime import datetime, timedelta
+from pathlib import Path
+from urllib.parse import parse_qs, urlsplit
+
+import pytest
+
+_TEST_DIR = Path(tempfile.mkdtemp(prefix='yt2podcast-tests-'))
+os.environ.setdefault('DATABASE_URI', f"sqlite:///{_TEST_DIR / 'test.db'}")
+os.environ.setdefault('INFO_CACHE_FILE', str(_TEST_DIR / 'info_cache.db'))
+
+
+@pytest.fixture
+def web_app(tmp_path, monkeypatch):
+    import app as web
+
+    web.app.config['TESTING'] = True
+    web.app.config['WTF_CSRF_ENABLED'] = False
+    monkeypatch.setattr(web, 'UPLOAD_FOLDER', tmp_path / 'user_episodes')
+    web.UPLOAD_FOLDER.mkdir()
+    monkeypatch.setattr(web, 'audio_store', web.AudioStore(web.UPLOAD_FOLDER / '_audio'))
+
+    # every test starts from an empty database and cache
+    with web.app.app_context():
+        web.db.drop_all()
+        web.init_db()
+    web.feed_cache.clear()
+    web.info_cache.clear()
+    return web
+
+
+@pytest.fixture
+def client(web_app):
+    """test client logged in as a fresh user"""
+    client = web_app.app.test_client()
+    username = f"user{uuid.uuid4().hex[:8]}"
+    client.post('/register', data={'username': username, 'email': f"{username}@example.com", 'password': 'pw'})
+    client.post('/login', data={'username': username, 'password': 'pw'})
+    client.username = username
+    return client
+
+
+@pytest.fixture
+def fake_download(web_app, monkeypatch):
+    """downloads skip yt-dlp and write a 1000 byte mp3 named after the video id
+
+    The queue only runs when a test calls run_pending() (or add_videos).
+    Returns the list of URLs that were fetched.
+    """
+    from yt2podcast import DownloadResult
+
+    downloads = []
+
+    def fake_fetch(self, url, video_key=None):
+        downloads.append(url)
+        parts = urlsplit(url)
+        name = parse_qs(parts.query).get('v', [parts.path.rsplit('/', 1)[-1]])[0]
+        path = self.output_dir / f"{name}.mp3"
+        path.write_bytes((b'ID3' + name.encode() * 1000)[:1000])
+        return DownloadResult(path, url, name, name, 1000, duration=60, upload_date='20240101', uploader='Tester')
+
+    monkeypatch.setattr(web_app.DownloadEngine, 'fetch', fake_fetch)
+    monkeypatch.setattr(web_app.download_queue, 'start', lambda: None)
+    return downloads
+
+
+@pytest.fixture
+def add_videos(web_app, fake_download):
+    """add_videos(client, *video_ids) adds each video through the web app and downloads it"""
+    def add(client, *names):
+        for name in names:
+            client.post('/add_video', data={'video_url': f"https://www.youtube.com/watch?v={name}"})
+            with web_app.app.app_context():
+                web_app.download_queue.run_pending()
+    return add
+
+
+@pytest.fixture
+def add_episodes(web_app):
+    """add_episodes(username, count) puts episodes straight into the database, returns their ids
+
+    Titles come from title.format(n=...), download dates are interval apart
+    starting 2024-01-01 and any other Episode column can be passed in.
+    """
+    def add(username, count=1, start=0, title='Episode {n}', interval=timedelta(minutes=1), **fields):
+        with web_app.app.app_context():
+            user = web_app.User.query.filter_by(username=username).one()
+            episodes = []
+            for n in range(start, start + count):
+                name = title.format(n=n)
+                columns = dict(
+                    user_id=user.id, title=name, description='', file_size=1024,
+                    download_date=datetime(2024, 1, 1) + n * interval, filename=f"episode{n}.mp3",
+                    audio_url=f"http://localhost/episode/{user.id}/episode{n}.mp3",
+                )
+                columns.update(fields)
+                episodes.append(web_app.Episode(**columns))
+            web_app.db.session.add_all(episodes)
+            web_app.db.session.commit()
+            # written behind the app's back, so the cached feed doesn't know
+            web_app.feed_cache.invalidate(user.id)
+            return [episode.id for episode in episodes]
+    return add
+
+
+def pytest_terminal_summary(terminalreporter, config):
+    """print the startup report if test_startup produced one"""
+    report = getattr(config, 'startup_report', None)
+    if report:
+        from startup_report import format_report
+        terminalreporter.write_sep('-', 'web app startup')
+        terminalreporter.write_line(format_report(report))
@@ -0,0 +1,219 @@
+#!/usr/bin/env python3
+"""
+Rendered RSS feed cache for the web app
+
+Feeds only change when an episode is added or deleted, so the rendered XML
+is kept per user and thrown away on those two events. Each cached feed
+carries a strong ETag and a Last-Modified time for conditional GETs, plus
+gzip/brotli copies compressed once when it's cached, for clients that
+send Accept-Encoding.
+
+Two backends:
+    memory - in-process LRU, fine for a single worker
+    file   - a directory shared by every worker on the box
+"""
+
+import hashlib
+import json
+import shutil
+import tempfile
+import threading
+import time
+import uuid
+from collections import OrderedDict, namedtuple
+from pathlib import Path
+
+from atomic_file import atomic_write
+from feed_writer import COMPRESSED_SUFFIXES, compress_feed
+
+# encoded maps a Content-Encoding to the compressed body
+CachedFeed = namedtuple('CachedFeed', ['body', 'etag', 'last_modified', 'encoded'], defaults=(None,))
+
+
+def make_entry(body, last_modified=None, compress=True):
+    """wrap rendered feed bytes with their validators and compressed copies"""
+    etag = _digest(body)
+    encoded = compress_feed(body) if compress else {}
+    return CachedFeed(body, etag, int(last_modified if last_modified is not None else time.time()), encoded)
+
+
+def negotiate(entry, accept_encodings):
+    """(body, content encoding or None, etag) to send for a request's Accept-Encoding
+
+    accept_encodings is werkzeug's parsed header (request.accept_encodings).
+    Every encoding gets its own ETag, they're different bytes
+    """
+    available = [encoding for encoding in COMPRESSED_SUFFIXES if encoding in (entry.encoded or {})]
+    encoding = accept_encodings.best_match(available) if available else None
+    if encoding is None:
+        return entry.body, None, entry.etag
+    return entry.encoded[encoding], encoding, f"{entry.etag}-{encoding}"
+
+
+class LRUFeedCache:
+    """in-process LRU keyed by (user_id, variant)
+
+    variant covers anything that changes the rendered bytes for the same
+    user, like the host name the feed was requested on
+    """
+
+    enabled = True
+
+    def __init__(self, max_entries=1024):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._generations = {}
+        self._lock = threading.Lock()
+
+    def generation(self, user_id):
+        """token that changes every time the user's feed is invalidated
+
+        grab it before rendering and hand it to set(), so a render that
+        raced with an invalidation never gets cached
+        """
+        with self._lock:
+            return self._generations.get(user_id, 0)
+
+    def get(self, user_id, variant=''):
+        with self._lock:
+            entry = self._entries.get((user_id, variant))
+            if entry is not None:
+                self._entries.move_to_end((user_id, variant))
+            return entry
+
+    def set(self, user_id, variant, entry, generation):
+        with self._lock:
+            if self._generations.get(user_id, 0) != generation:
+                return False
+            self._entries[(user_id, variant)] = entry
+            self._entries.move_to_end((user_id, variant))
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+            return True
+
+    def invalidate(self, user_id):
+        with self._lock:
+            self._generations[user_id] = self._generations.get(user_id, 0) + 1
+            for key in [key for key in self._entries if key[0] == user_id]:
+                del self._entries[key]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._generations.clear()
+
+
+class FileFeedCache:
+    """feeds stored as files under cache_dir/<user_id>/, shared by all workers
+
+    every write goes through a temp file + rename so readers never see a
+    half-written feed
+    """
+
+    enabled = True
+
+    def __init__(self, cache_dir):
+        self.cache_dir = Path(cache_dir)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+
+    def _user_dir(self, user_id):
+        return self.cache_dir / str(user_id)
+
+    def _variant_name(self, variant):
+        return hashlib.md5(variant.encode()).hexdigest()[:16]
+
+    def generation(self, user_id):
+        try:
+            return (self._user_dir(user_id) / 'generation').read_text()
+        except FileNotFoundError:
+            return ''
+
+    def get(self, user_id, variant=''):
+        base = self._user_dir(user_id) / self._variant_name(variant)
+        try:
+            meta = json.loads(base.with_suffix('.json').read_text())
+            body = base.with_suffix('.xml').read_bytes()
+        except (FileNotFoundError, ValueError):
+            return None
+
+        # the body and its metadata are written separately, make sure they match
+        if meta.get('generation') != self.generation(user_id):
+            return None
+        if _digest(body) != meta['etag']:
+            return None
+        encoded = {}
+        for encoding, digest in meta.get('encodings', {}).items():
+            try:
+                data = base.with_suffix('.xml' + COMPRESSED_SUFFIXES[encoding]).read_bytes()
+            except (FileNotFoundError, KeyError):
+                continue
+            # a copy from another worker's render of the same feed is skipped,
+            # the feed itself is still good uncompressed
+            if _digest(data) == digest:
+                encoded[encoding] = data
+        return CachedFeed(body, meta['etag'], meta['last_modified'], encoded)
+
+    def set(self, user_id, variant, entry, generation):
+        if self.generation(user_id) != generation:
+            return False
+
+        user_dir = self._user_dir(user_id)
+        user_dir.mkdir(parents=True, exist_ok=True)
+        base = user_dir / self._variant_name(variant)
+        encoded = entry.encoded or {}
+        meta = {'etag': entry.etag, 'last_modified': entry.last_modified, 'generation': generation,
+                'encodings': {encoding: _digest(data) for encoding, data in encoded.items()}}
+        atomic_write(base.with_suffix('.xml'), entry.body)
+        for encoding, data in encoded.items():
+            atomic_write(base.with_suffix('.xml' + COMPRESSED_SUFFIXES[encoding]), data)
+        atomic_write(base.with_suffix('.json'), json.dumps(meta).encode())
+        return True
+
+    def invalidate(self, user_id):
+        user_dir = self._user_dir(user_id)
+        user_dir.mkdir(parents=True, exist_ok=True)
+        # bump the generation first so nobody re-caches what we're deleting
+        atomic_write(user_dir / 'generation', uuid.uuid4().hex.encode())
+        for path in user_dir.iterdir():
+            if path.name != 'generation':
+                path.unlink(missing_ok=True)
+
+    def clear(self):
+        shutil.rmtree(self.cache_dir, ignore_errors=True)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+
+
+class NullFeedCache:
+    """caching turned off, every request renders the feed"""
+
+    enabled = False
+
+    def generation(self, user_id):
+        return 0
+
+    def get(self, user_id, variant=''):
+        return None
+
+    def set(self, user_id, variant, entry, generation):
+        return False
+
+    def invalidate(self, user_id):
+        pass
+
+    def clear(self):
+        pass
+
+
+def make_feed_cache(backend='memory', max_entries=1024, cache_dir=None):
+    """build the cache backend named in config.FEED_CACHE_BACKEND"""
+    if backend == 'memory':
+        return LRUFeedCache(max_entries=max_entries)
+    if backend == 'file':
+        return FileFeedCache(cache_dir or Path(tempfile.gettempdir()) / 'yt2podcast-feeds')
+    if backend in ('none', '', None):
+        return NullFeedCache()
+    raise ValueError(f"Unknown feed cache backend: {backend}")
+
+
+def _digest(data):
+    return hashlib.sha256(data).hexdigest()[:32]
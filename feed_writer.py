@@ -0,0 +1,212 @@
+#!/usr/bin/env python3
+"""
+Streaming RSS + iTunes writer for YT2Podcast
+
+Produces the same XML feedgen did (byte for byte, apart from lastBuildDate)
+without building an lxml tree first: the channel header, then one small
+<item> string per episode, then the closing tags. Feeds can be streamed
+straight from database rows or the metadata store, so memory use doesn't
+grow with the number of episodes.
+
+    writer = FeedWriter(title='My Podcast', description='...', self_url=url)
+    for chunk in writer.stream(render_item(...) for episode in episodes):
+        ...
+    writer.write('rss.xml', items)
+
+Feeds compress very well, compress_feed() makes the gzip (and, with the
+optional brotli package, br) variants served to clients that accept them,
+and write_compressed_siblings() puts them next to a feed file as
+rss.xml.gz / rss.xml.br for a front proxy to serve as they are.
+"""
+
+import gzip
+from datetime import datetime, timezone
+from pathlib import Path
+
+from atomic_file import atomic_write
+
+ATOM_NS = 'http://www.w3.org/2005/Atom'
+ITUNES_NS = 'http://www.itunes.com/dtds/podcast-1.0.dtd'
+CONTENT_NS = 'http://purl.org/rss/1.0/modules/content/'
+FEED_HISTORY_NS = 'http://purl.org/syndication/history/1.0'
+
+try:
+    import brotli
+except ImportError:  # optional, feeds just don't get a br variant
+    brotli = None
+
+RSS_DATE_FORMAT = '%a, %d %b %Y %H:%M:%S %z'
+
+# Content-Encoding -> suffix of the file next to the feed, best first
+COMPRESSED_SUFFIXES = {'br': '.br', 'gzip': '.gz'}
+# below this a compressed copy saves less than its headers cost
+MIN_COMPRESS_SIZE = 256
+
+_XML_DECLARATION = "<?xml version='1.0' encoding='UTF-8'?>\n"
+_RSS_OPEN = (f'<rss xmlns:itunes="{ITUNES_NS}" xmlns:atom="{ATOM_NS}" '
+             f'xmlns:content="{CONTENT_NS}" version="2.0">')
+
+
+class FeedWriter:
+    """channel settings for one feed, turns rendered items into RSS chunks
+
+    extra is raw markup that goes at the end of the channel, like the RFC
+    5005 links from feed_history_links()
+    """
+
+    def __init__(self, title, description, self_url, language='en', category=None,
+                 category_domain=None, logo=None, owner_name=None, owner_email=None,
+                 build_date=None, extra=b''):
+        self.title = title
+        self.description = description
+        self.self_url = self_url
+        self.language = language
+        self.category = category
+        self.category_domain = category_domain
+        self.logo = logo
+        self.owner_name = owner_name
+        self.owner_email = owner_email
+        self.build_date = build_date
+        self.extra = extra
+
+    def head(self):
+        """everything before the first <item>"""
+        parts = [
+            _XML_DECLARATION, _RSS_OPEN, '<channel>',
+            f'<title>{xml_text(self.title)}</title>',
+            f'<link>{xml_text(self.self_url)}</link>',
+            f'<description>{xml_text(self.description)}</description>',
+            f'<atom:link href="{xml_attr(self.self_url)}" rel="self"/>',
+        ]
+        if self.category:
+            domain = f' domain="{xml_attr(self.category_domain)}"' if self.category_domain else ''
+            parts.append(f'<category{domain}>{xml_text(self.category)}</category>')
+        # same docs/generator elements feedgen wrote, so existing feeds don't change
+        parts.append('<docs>http://www.rssboard.org/rss-specification</docs>')
+        parts.append('<generator>python-feedgen</generator>')
+        if self.logo:
+            parts.append(
+                f'<image><url>{xml_text(self.logo)}</url><title>{xml_text(self.title)}</title>'
+                f'<link>{xml_text(self.self_url)}</link></image>'
+            )
+        if self.language:
+            parts.append(f'<language>{xml_text(self.language)}</language>')
+        build_date = self.build_date or datetime.now(timezone.utc)
+        parts.append(f'<lastBuildDate>{format_rss_date(build_date)}</lastBuildDate>')
+        if self.owner_name or self.owner_email:
+            parts.append('<itunes:owner>')
+            if self.owner_name:
+                parts.append(f'<itunes:name>{xml_text(self.owner_name)}</itunes:name>')
+            if self.owner_email:
+                parts.append(f'<itunes:email>{xml_text(self.owner_email)}</itunes:email>')
+            parts.append('</itunes:owner>')
+        return ''.join(parts).encode('utf-8')
+
+    def tail(self):
+        """everything after the last <item>"""
+        return self.extra + b'</channel></rss>'
+
+    def stream(self, items):
+        """yield the feed as bytes chunks, items are rendered <item> strings (or bytes)"""
+        yield self.head()
+        for item in items:
+            yield item.encode('utf-8') if isinstance(item, str) else item
+        yield self.tail()
+
+    def render(self, items):
+        return b''.join(self.stream(items))
+
+    def write(self, path, items):
+        """stream the feed into a temp file next to path, then rename it into place"""
+        atomic_write(path, self.stream(items))
+
+
+def render_item(title, link, description, enclosure_url, length, mime_type, published,
+                author=None, duration='00:00:00', summary=None):
+    """one <item>, in the element order feedgen used"""
+    parts = ['<item>']
+    if title:
+        parts.append(f"<title>{xml_text(title)}</title>")
+    parts.append(f"<link>{xml_text(link)}</link>")
+    if description:
+        parts.append(f"<description>{xml_text(description)}</description>")
+    parts.append(
+        f'<enclosure url="{xml_attr(enclosure_url)}" '
+        f'length="{xml_attr(str(length))}" type="{xml_attr(mime_type)}"/>'
+    )
+    parts.append(f"<pubDate>{format_rss_date(published)}</pubDate>")
+    if author:
+        parts.append(f"<itunes:author>{xml_text(author)}</itunes:author>")
+    parts.append(f"<itunes:duration>{xml_text(duration)}</itunes:duration>")
+    if summary:
+        parts.append(f"<itunes:summary>{xml_text(summary)}</itunes:summary>")
+    parts.append('</item>')
+    return ''.join(parts)
+
+
+def feed_history_links(current=None, prev_archive=None, next_archive=None, archive=False):
+    """RFC 5005 paging markup (atom links + fh:archive) for FeedWriter's extra"""
+    parts = []
+    if archive:
+        parts.append(f'<fh:archive xmlns:fh="{FEED_HISTORY_NS}"/>')
+    for rel, href in (('current', current), ('prev-archive', prev_archive), ('next-archive', next_archive)):
+        if href:
+            parts.append(f'<atom:link href="{xml_attr(href)}" rel="{rel}"/>')
+    return ''.join(parts).encode('utf-8')
+
+
+def format_rss_date(value):
+    """RFC 822 date, naive datetimes are taken as UTC"""
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value.strftime(RSS_DATE_FORMAT)
+
+
+def xml_text(value):
+    """escape text content the same way lxml does"""
+    return (str(value).replace('&', '&amp;').replace('<', '&lt;')
+            .replace('>', '&gt;').replace('\r', '&#13;'))
+
+
+def xml_attr(value):
+    """escape an attribute value the same way lxml does"""
+    return (xml_text(value).replace('"', '&quot;').replace('\n', '&#10;')
+            .replace('\t', '&#9;'))
+
+
+def compress_feed(body):
+    """{content encoding: bytes} for a rendered feed, only the variants that came out smaller
+
+    done once when a feed changes, so both use their best settings. gzip
+    gets no timestamp, the same feed always compresses to the same bytes
+    """
+    if len(body) < MIN_COMPRESS_SIZE:
+        return {}
+    variants = {}
+    if brotli is not None:
+        variants['br'] = brotli.compress(body, mode=brotli.MODE_TEXT, quality=11)
+    variants['gzip'] = gzip.compress(body, compresslevel=9, mtime=0)
+    return {encoding: data for encoding, data in variants.items() if len(data) < len(body)}
+
+
+def compressed_siblings(path):
+    """path.br and path.gz, where write_compressed_siblings() puts them"""
+    path = Path(path)
+    return [path.with_name(path.name + suffix) for suffix in COMPRESSED_SUFFIXES.values()]
+
+
+def write_compressed_siblings(path, body=None):
+    """write the compressed variants of a feed file next to it, for nginx's gzip_static/brotli_static
+
+    siblings that aren't produced any more (brotli uninstalled, feed got
+    tiny) are removed, so a proxy never serves an old version. body saves
+    reading the file back if the caller still has it
+    """
+    path = Path(path)
+    variants = compress_feed(path.read_bytes() if body is None else body)
+    for encoding, sibling in zip(COMPRESSED_SUFFIXES, compressed_siblings(path)):
+        if encoding in variants:
+            atomic_write(sibling, variants[encoding])
+        else:
+            sibling.unlink(missing_ok=True)
+    return variants
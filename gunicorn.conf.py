@@ -0,0 +1,44 @@
+"""
+Gunicorn settings for the web app (the Procfile runs `gunicorn app:app`
+with these)
+
+Several worker processes with a few threads each. Downloads run on each
+worker's background threads and are handed out through the database, so
+any number of workers can share the queue. The one-off startup work
+(creating tables, clearing out a crashed run's scratch folders, the disk
+budget) happens once in the master before any worker is forked.
+
+Every setting can be overridden with the usual GUNICORN_CMD_ARGS or the
+environment variables below.
+"""
+
+import os
+
+bind = f"0.0.0.0:{os.environ.get('PORT', '5000')}"
+workers = int(os.environ.get('WEB_CONCURRENCY', '2'))
+# config.py picks a feed cache every worker shares when this is over 1
+os.environ['WEB_CONCURRENCY'] = str(workers)
+threads = int(os.environ.get('WEB_THREADS', '4'))
+worker_class = 'gthread'
+# episode downloads can be slow to start streaming, and refetching an
+# evicted episode waits up to REFETCH_WAIT_SECONDS
+timeout = 120
+graceful_timeout = 60
+# import app.py once in the master, workers start without importing it again
+preload_app = True
+accesslog = '-'
+
+
+def when_ready(server):
+    import app
+    app.prepare_app()
+
+
+def post_worker_init(worker):
+    import app
+    app.start_background_workers()
+
+
+def worker_exit(server, worker):
+    import app
+    app.stop_background_workers(timeout=graceful_timeout / 2)
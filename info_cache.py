@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+"""
+Cache of yt-dlp info dicts for YT2Podcast
+
+yt-dlp's extract step (the watch page, player JS, format lists) is a network
+round trip of its own, paid again on every retry and every time a video is
+downloaded anew. InfoCache keeps the raw extractor result per canonical
+video ID in a small SQLite file, so a second run only has to fetch the media.
+
+    cache = InfoCache('info_cache.db', ttl=6 * 3600, max_entries=500)
+    info = cache.get(video_id)          # None if missing or expired
+    cache.put(video_id, info)
+    cache.invalidate(video_id)          # stream URLs stopped working
+
+Entries expire after ttl seconds, or earlier if the stream URLs in them say
+they expire sooner (YouTube's carry an expire= timestamp). Past max_entries
+the least recently used ones are dropped.
+"""
+
+import json
+import os
+import sqlite3
+import threading
+import time
+import zlib
+from pathlib import Path
+from urllib.parse import urlparse, parse_qs
+
+# big and never needed to download the audio
+_DROPPED_KEYS = ('automatic_captions', 'subtitles', 'heatmap', 'thumbnails')
+
+# stop using stream URLs this long before they say they expire, a download
+# can take a while
+EXPIRY_MARGIN = 30 * 60
+
+
+class InfoCache:
+    """info dicts in SQLite, safe for several threads and processes"""
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS info_cache (
+            video_id TEXT PRIMARY KEY,
+            expires_at REAL NOT NULL,
+            last_used REAL NOT NULL,
+            data BLOB NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS ix_info_cache_last_used ON info_cache (last_used);
+    """
+
+    def __init__(self, path, ttl=6 * 3600, max_entries=500, timeout=30):
+        self.path = Path(path)
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.timeout = timeout
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.RLock()
+        self._conn = None
+        self._pid = None
+        self._connect()
+
+    def _connect(self):
+        """this process's connection, one opened before a fork (gunicorn) isn't reused"""
+        if self._conn is None or self._pid != os.getpid():
+            self._conn = sqlite3.connect(str(self.path), timeout=self.timeout, check_same_thread=False)
+            self._pid = os.getpid()
+            self._conn.execute('PRAGMA journal_mode=WAL')
+            self._conn.execute('PRAGMA synchronous=NORMAL')
+            with self._conn:
+                self._conn.executescript(self.SCHEMA)
+        return self._conn
+
+    def get(self, video_id):
+        """the cached info dict (a fresh copy), None if there isn't a usable one"""
+        if not video_id:
+            return None
+        now = time.time()
+        with self._lock, self._connect() as conn:
+            row = conn.execute(
+                'SELECT expires_at, data FROM info_cache WHERE video_id = ?', (video_id,)
+            ).fetchone()
+            if row is None:
+                return None
+            expires_at, data = row
+            if expires_at <= now:
+                conn.execute('DELETE FROM info_cache WHERE video_id = ?', (video_id,))
+                return None
+            conn.execute('UPDATE info_cache SET last_used = ? WHERE video_id = ?', (now, video_id))
+        return json.loads(zlib.decompress(data))
+
+    def put(self, video_id, info):
+        """store an extractor result, returns False if there was nothing worth keeping"""
+        if not video_id or not info:
+            return False
+        now = time.time()
+        expires_at = now + self.ttl
+        url_expiry = stream_url_expiry(info)
+        if url_expiry is not None:
+            expires_at = min(expires_at, url_expiry - EXPIRY_MARGIN)
+        if expires_at <= now:
+            return False
+
+        slim = {key: value for key, value in info.items() if key not in _DROPPED_KEYS}
+        data = zlib.compress(json.dumps(slim, ensure_ascii=False, default=str).encode('utf-8'))
+        with self._lock, self._connect() as conn:
+            conn.execute(
+                'INSERT OR REPLACE INTO info_cache (video_id, expires_at, last_used, data) VALUES (?, ?, ?, ?)',
+                (video_id, expires_at, now, data),
+            )
+            self._evict(conn, now)
+        return True
+
+    def invalidate(self, video_id):
+        """forget a video, e.g. after its stream URLs came back 403/410. True if it was cached"""
+        with self._lock, self._connect() as conn:
+            cursor = conn.execute('DELETE FROM info_cache WHERE video_id = ?', (video_id,))
+        return cursor.rowcount > 0
+
+    def clear(self):
+        with self._lock, self._connect() as conn:
+            conn.execute('DELETE FROM info_cache')
+
+    def __len__(self):
+        with self._lock:
+            return self._connect().execute('SELECT COUNT(*) FROM info_cache').fetchone()[0]
+
+    def __contains__(self, video_id):
+        with self._lock:
+            return self._connect().execute(
+                'SELECT 1 FROM info_cache WHERE video_id = ? AND expires_at > ?', (video_id, time.time())
+            ).fetchone() is not None
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+    def _evict(self, conn, now):
+        """drop expired entries, then the least recently used ones past max_entries"""
+        conn.execute('DELETE FROM info_cache WHERE expires_at <= ?', (now,))
+        if self.max_entries:
+            conn.execute(
+                """DELETE FROM info_cache WHERE video_id IN (
+                       SELECT video_id FROM info_cache ORDER BY last_used DESC LIMIT -1 OFFSET ?
+                   )""",
+                (self.max_entries,),
+            )
+
+
+def stream_url_expiry(info):
+    """earliest expire= timestamp in the info dict's stream URLs, None if they don't say"""
+    expiries = []
+    for fmt in [info] + list(info.get('formats') or []):
+        url = fmt.get('url') if isinstance(fmt, dict) else None
+        if not url or 'expire' not in url:
+            continue
+        value = parse_qs(urlparse(url).query).get('expire', [''])[0]
+        if not value:
+            # googlevideo sometimes puts its parameters in the path
+            parts = urlparse(url).path.split('/')
+            if 'expire' in parts[:-1]:
+                value = parts[parts.index('expire') + 1]
+        if value.isdigit():
+            expiries.append(int(value))
+    return min(expiries) if expiries else None
@@ -0,0 +1,341 @@
+#!/usr/bin/env python3
+"""
+Background download queue for the web app
+
+Jobs are rows in the database so they survive restarts. A small pool of
+worker threads claims queued jobs one at a time, and every running job
+sends a heartbeat so a job whose worker died gets picked up again.
+
+Which job runs next is decided in the database as well, so the rules hold
+across every worker process:
+- lanes: a job in a lower lane always goes before the ones in higher lanes
+- weighted fair queuing within a lane: every job gets a virtual finish time
+  when it's queued, 1/weight after the user's previous job (or after where
+  the queue currently is), so a user who queued hundreds of videos gets
+  their turn as often as one who queued a single video instead of first
+- caps: at most max_per_user jobs of one user and max_running jobs in total
+  (by default one per CPU core, FFmpeg keeps a core busy) run at once. The
+  interactive lane isn't held to the per-user cap, somebody waiting to
+  play an episode shouldn't wait for their own backfill to finish
+"""
+
+import os
+import socket
+import threading
+import traceback
+from datetime import datetime, timedelta
+
+from sqlalchemy import func, or_, select
+from sqlalchemy.orm import aliased
+
+QUEUED = 'queued'
+RUNNING = 'running'
+DONE = 'done'
+FAILED = 'failed'
+
+# Lanes, lower runs first: somebody waiting on an episode that's being
+# downloaded again, then videos added by hand, then subscription backfills
+INTERACTIVE = 0
+MANUAL = 1
+BULK = 2
+LANES = {INTERACTIVE: 'interactive', MANUAL: 'manual', BULK: 'bulk'}
+
+
+def available_cores():
+    """CPUs this process may use (the affinity mask, which containers limit), at least 1"""
+    try:
+        return max(1, len(os.sched_getaffinity(0)))
+    except AttributeError:  # not available on macOS/Windows
+        return os.cpu_count() or 1
+
+
+class DownloadQueue:
+    """Bounded pool of worker threads pulling download jobs from the database"""
+
+    def __init__(self, app, db, job_model, handler, workers=2,
+                 poll_interval=5.0, heartbeat_interval=30, stale_after=180,
+                 max_attempts=3, max_running=None, max_per_user=2, weight=None):
+        self.app = app
+        self.db = db
+        self.job_model = job_model
+        self.handler = handler
+        self.workers = max(1, workers)
+        self.poll_interval = poll_interval
+        self.heartbeat_interval = heartbeat_interval
+        self.stale_after = stale_after
+        self.max_attempts = max_attempts
+        # running jobs across every process, None for one per core
+        self.max_running = max_running or available_cores()
+        # running jobs of a single user, 0 for no limit
+        self.max_per_user = max_per_user
+        # user_id -> share of the downloads (default 1.0), 2.0 gets twice as many turns
+        self.weight = weight
+
+        # identifies this process in the job table
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}"
+
+        self._threads = []
+        self._active = set()
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopping = threading.Event()
+
+    @property
+    def running(self):
+        return any(t.is_alive() for t in self._threads)
+
+    def start(self):
+        """spin up the worker threads (safe to call more than once)"""
+        with self._lock:
+            if self.running:
+                return
+            self._stopping.clear()
+
+            with self.app.app_context():
+                self.requeue_stale()
+
+            self._threads = [
+                threading.Thread(target=self._worker_loop, name=f"download-worker-{i}", daemon=True)
+                for i in range(self.workers)
+            ]
+            self._threads.append(
+                threading.Thread(target=self._heartbeat_loop, name="download-heartbeat", daemon=True)
+            )
+            for thread in self._threads:
+                thread.start()
+
+    def stop(self, timeout=None):
+        """ask the workers to finish their current job and exit"""
+        self._stopping.set()
+        self._wakeup.set()
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+
+    def enqueue(self, priority=MANUAL, **fields):
+        """add a job to the queue and wake up a worker, returns the job"""
+        virtual_finish = self._virtual_finish(fields['user_id'], priority)
+        job = self.job_model(status=QUEUED, priority=priority, virtual_finish=virtual_finish, **fields)
+        self.db.session.add(job)
+        self.db.session.commit()
+        self.notify()
+        return job
+
+    def notify(self):
+        self._wakeup.set()
+
+    def queue_position(self, job):
+        """1 for the job that runs next, None if it isn't queued"""
+        return self.queue_positions([job])[job.id]
+
+    def queue_positions(self, jobs):
+        """job id -> place in the queue for a list of jobs, None for the ones that aren't queued
+
+        One query ranks the queued jobs in claiming order, however many
+        jobs are asked about. A job of a user who's at their cap can be
+        passed by the ones behind it, so this is where it stands, not a
+        promise.
+        """
+        positions = {job.id: None for job in jobs}
+        queued = [job.id for job in jobs if job.status == QUEUED]
+        if not queued:
+            return positions
+        Job = self.job_model
+        ranked = self.db.session.query(
+            Job.id.label('id'), func.row_number().over(order_by=self._order()).label('position')
+        ).filter(Job.status == QUEUED).subquery()
+        positions.update(self.db.session.query(ranked.c.id, ranked.c.position).filter(ranked.c.id.in_(queued)))
+        return positions
+
+    def _order(self):
+        """claiming order: lane, then virtual finish time (rows from before lanes existed have neither)"""
+        Job = self.job_model
+        return func.coalesce(Job.priority, MANUAL), func.coalesce(Job.virtual_finish, 0.0), Job.id
+
+    def _virtual_finish(self, user_id, priority):
+        """where a new job of this user goes in its lane
+
+        1/weight after the user's last queued or running job in the lane,
+        or after the lane's current virtual time if they have none: the
+        newest running job, or the start of the next queued one. Starting
+        from there rather than zero means being idle for a while doesn't
+        save up turns to jump the whole queue with later.
+        """
+        Job = self.job_model
+        session = self.db.session
+        in_lane = func.coalesce(Job.priority, MANUAL) == priority
+        running = session.query(func.max(Job.virtual_finish)).filter(in_lane, Job.status == RUNNING).scalar()
+        front = session.query(func.min(Job.virtual_finish)).filter(in_lane, Job.status == QUEUED).scalar()
+        now = max(running or 0.0, (front or 0.0) - 1.0, 0.0)
+        last = session.query(func.max(Job.virtual_finish)).filter(
+            in_lane, Job.user_id == user_id, Job.status.in_([QUEUED, RUNNING])
+        ).scalar()
+        weight = (self.weight(user_id) if self.weight else None) or 1.0
+        return max(now, last or 0.0) + 1.0 / max(weight, 0.01)
+
+    def requeue_stale(self):
+        """put running jobs with a dead worker back in the queue
+
+        A job counts as dead when its heartbeat is older than stale_after.
+        Jobs that already used up their attempts are marked failed instead.
+        """
+        Job = self.job_model
+        cutoff = datetime.utcnow() - timedelta(seconds=self.stale_after)
+        stale = Job.query.filter(Job.status == RUNNING, Job.heartbeat_at < cutoff).all()
+
+        for job in stale:
+            if job.attempts >= self.max_attempts:
+                job.status = FAILED
+                job.error = 'Worker stopped responding'
+                job.finished_at = datetime.utcnow()
+            else:
+                job.status = QUEUED
+                job.worker = None
+            print(f"Recovered stale job {job.id} ({job.status})")
+
+        if stale:
+            self.db.session.commit()
+        return len(stale)
+
+    def run_pending(self):
+        """process queued jobs in the calling thread until none are left
+
+        Handy for tests and one-off scripts that don't want worker threads.
+        """
+        processed = 0
+        while True:
+            job_id = self._claim_next()
+            if job_id is None:
+                return processed
+            self._run(job_id)
+            processed += 1
+
+    def _claim_next(self):
+        """atomically flip the next queued job to running, returns its id
+
+        None when the queue is empty, every user with queued jobs is at
+        their cap, or max_running jobs are running already
+        """
+        Job = self.job_model
+        session = self.db.session
+
+        while True:
+            running = dict(session.query(Job.user_id, func.count(Job.id)).filter(
+                Job.status == RUNNING).group_by(Job.user_id).all())
+            if sum(running.values()) >= self.max_running:
+                session.rollback()
+                return None
+
+            query = Job.query.filter_by(status=QUEUED)
+            if self.max_per_user:
+                busy = [user_id for user_id, count in running.items() if count >= self.max_per_user]
+                if busy:
+                    query = query.filter(or_(Job.user_id.notin_(busy), Job.priority == INTERACTIVE))
+            job = query.order_by(*self._order()).first()
+            if job is None:
+                session.rollback()
+                return None
+
+            now = datetime.utcnow()
+            # the status check in the WHERE makes this safe against other
+            # workers (or other processes) grabbing the same row, the counts
+            # keep the caps when they claim other rows at the same time
+            claimed = Job.query.filter(
+                Job.id == job.id, Job.status == QUEUED, *self._cap_checks(job)
+            ).update({
+                'status': RUNNING,
+                'worker': self.worker_id,
+                'attempts': Job.attempts + 1,
+                'started_at': now,
+                'heartbeat_at': now,
+            }, synchronize_session=False)
+            session.commit()
+
+            if claimed:
+                return job.id
+
+    def _cap_checks(self, job):
+        """WHERE clauses that only hold while the caps that apply to job have room"""
+        other = aliased(self.job_model)
+        checks = [select(func.count(other.id)).where(other.status == RUNNING).scalar_subquery() < self.max_running]
+        if self.max_per_user and job.priority != INTERACTIVE:
+            checks.append(select(func.count(other.id)).where(
+                other.status == RUNNING, other.user_id == job.user_id).scalar_subquery() < self.max_per_user)
+        return checks
+
+    def _run(self, job_id):
+        Job = self.job_model
+        session = self.db.session
+        with self._lock:
+            self._active.add(job_id)
+
+        try:
+            job = session.get(Job, job_id)
+            try:
+                self.handler(job)
+                job.status = DONE
+                job.error = None
+            except Exception as e:
+                print(f"Download job {job_id} failed: {e}")
+                traceback.print_exc()
+                session.rollback()
+                job = session.get(Job, job_id)
+                job.status = FAILED
+                job.error = str(e)[:500]
+            job.finished_at = datetime.utcnow()
+            session.commit()
+        finally:
+            with self._lock:
+                self._active.discard(job_id)
+            # a cap has room again, idle workers can look for the next job
+            self._wakeup.set()
+
+    def _worker_loop(self):
+        while not self._stopping.is_set():
+            try:
+                with self.app.app_context():
+                    job_id = self._claim_next()
+                    if job_id is not None:
+                        self._run(job_id)
+                        continue
+                    self.requeue_stale()
+            except Exception as e:
+                # never let a worker thread die on a database hiccup
+                print(f"Download worker error: {e}")
+                traceback.print_exc()
+
+            self._wakeup.wait(self.poll_interval)
+            self._wakeup.clear()
+
+    def _heartbeat_loop(self):
+        Job = self.job_model
+        while not self._stopping.wait(self.heartbeat_interval):
+            with self._lock:
+                active = list(self._active)
+            if not active:
+                continue
+            try:
+                with self.app.app_context():
+                    Job.query.filter(Job.id.in_(active)).update(
+                        {'heartbeat_at': datetime.utcnow()}, synchronize_session=False
+                    )
+                    self.db.session.commit()
+            except Exception as e:
+                print(f"Heartbeat error: {e}")
+
+
+def job_to_dict(job, queue_position=None):
+    """JSON-friendly view of a job for the status endpoint"""
+    return {
+        'id': job.id,
+        'status': job.status,
+        'lane': LANES.get(job.priority, LANES[MANUAL]),
+        'queue_position': queue_position,
+        'video_url': job.video_url,
+        'error': job.error,
+        'episode_id': job.episode_id,
+        'attempts': job.attempts,
+        'created_at': job.created_at.isoformat() if job.created_at else None,
+        'started_at': job.started_at.isoformat() if job.started_at else None,
+        'finished_at': job.finished_at.isoformat() if job.finished_at else None,
+    }
@@ -0,0 +1,404 @@
+#!/usr/bin/env python3
+"""
+End-to-end load test for the web app, fully offline
+
+Starts the real Flask app (with its background download workers) on a local
+port and lets a number of simulated users hit it over HTTP at the same time:
+register and log in, queue a batch of videos, poll /jobs and their feed until
+everything is converted, then play each episode with Range requests like a
+podcast app does. yt-dlp is replaced by a fake extractor that writes
+deterministic audio files after a configurable delay, so nothing touches
+YouTube or FFmpeg.
+
+Usage:
+    python loadtest.py --concurrency 1 4 16 --output after.json
+    python loadtest.py --concurrency 1 4 16 --baseline before.json
+
+Reports throughput, p50/p95/p99 latency per route and error rates for each
+concurrency level.
+"""
+
+import argparse
+import hashlib
+import json
+import logging
+import re
+import shutil
+import statistics
+import sys
+import tempfile
+import threading
+import time
+import http.client
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from http.cookies import SimpleCookie
+from pathlib import Path
+from urllib.parse import quote, urlencode, urlsplit
+
+from werkzeug.serving import make_server
+
+
+class FakeExtractor:
+    """stands in for yt_dlp.YoutubeDL
+
+    sleeps for the configured extract / fetch / postprocess latencies, runs
+    the progress and postprocessor hooks like yt-dlp would and writes an
+    audio file whose bytes only depend on the video id
+    """
+
+    extract_latency = 0.2
+    fetch_latency = 0.5
+    postprocess_latency = 0.5
+    audio_bytes = 256 * 1024
+
+    def __init__(self, opts=None):
+        self.opts = opts or {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def extract_info(self, url, download=True, process=True, **kwargs):
+        video_id = _video_id(url)
+        time.sleep(self.extract_latency)
+        info = {
+            'id': video_id, 'extractor_key': 'Youtube', 'title': f"Load test {video_id}",
+            'description': f"Synthetic episode {video_id}", 'duration': 600,
+            'upload_date': '20240101', 'uploader': 'Load Test',
+        }
+        if not download or not process:
+            return info
+        return self.process_ie_result(info, download=True)
+
+    def process_ie_result(self, info, download=True):
+        """the fetch and postprocess half, for info dicts that were already extracted"""
+        if not download:
+            return info
+
+        for hook in self.opts.get('progress_hooks', []):
+            hook({'status': 'downloading'})
+        time.sleep(self.fetch_latency)
+        for hook in self.opts.get('progress_hooks', []):
+            hook({'status': 'finished'})
+
+        for hook in self.opts.get('postprocessor_hooks', []):
+            hook({'status': 'started', 'postprocessor': 'ExtractAudio'})
+        time.sleep(self.postprocess_latency)
+        path = self._output_path(info)
+        path.write_bytes(fake_audio(info['id'], self.audio_bytes))
+        for hook in self.opts.get('postprocessor_hooks', []):
+            hook({'status': 'finished', 'postprocessor': 'ExtractAudio'})
+
+        return dict(info, requested_downloads=[{'filepath': str(path)}])
+
+    def _output_path(self, info):
+        codec = self.opts.get('postprocessors', [{}])[0].get('preferredcodec', 'mp3')
+        ext = 'm4a' if codec == 'best' else codec
+        outtmpl = self.opts.get('outtmpl', '%(title)s.%(ext)s')
+        return Path(outtmpl.replace('%(title)s', info['title']).replace('%(ext)s', ext))
+
+
+def fake_audio(video_id, size):
+    """deterministic bytes for a video, an ID3 header and sha256 noise"""
+    seed = hashlib.sha256(video_id.encode()).digest()
+    block = b''.join(hashlib.sha256(seed + bytes([i])).digest() for i in range(128))
+    data = b'ID3' + block * (size // len(block) + 1)
+    return data[:size]
+
+
+def _video_id(url):
+    match = re.search(r'[?&]v=([\w-]{11})', url)
+    return match.group(1) if match else hashlib.md5(url.encode()).hexdigest()[:11]
+
+
+def video_url(n):
+    return f"https://www.youtube.com/watch?v=lt{n:09d}"
+
+
+class Recorder:
+    """latencies and errors per route, shared by every simulated user"""
+
+    def __init__(self):
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(int)
+        self._lock = threading.Lock()
+
+    def record(self, route, seconds, ok):
+        with self._lock:
+            self.latencies[route].append(seconds)
+            if not ok:
+                self.errors[route] += 1
+
+    def error(self, route):
+        with self._lock:
+            self.errors[route] += 1
+
+    def summary(self, wall_seconds):
+        routes = {}
+        total = 0
+        for route in sorted(set(self.latencies) | set(self.errors)):
+            latencies = sorted(self.latencies.get(route, []))
+            total += len(latencies)
+            routes[route] = {
+                'requests': len(latencies),
+                'errors': self.errors.get(route, 0),
+                'error_rate': self.errors.get(route, 0) / len(latencies) if latencies else 1.0,
+                'p50': percentile(latencies, 50),
+                'p95': percentile(latencies, 95),
+                'p99': percentile(latencies, 99),
+                'mean': statistics.fmean(latencies) if latencies else None,
+            }
+        return {
+            'wall_seconds': wall_seconds,
+            'requests': total,
+            'throughput': total / wall_seconds if wall_seconds else 0.0,
+            'errors': sum(self.errors.values()),
+            'routes': routes,
+        }
+
+
+def percentile(sorted_values, pct):
+    """nearest-rank percentile, None for no samples"""
+    if not sorted_values:
+        return None
+    rank = max(1, -(-len(sorted_values) * pct // 100))
+    return sorted_values[int(rank) - 1]
+
+
+class Session:
+    """one simulated user: cookies plus timed HTTP calls against the server"""
+
+    def __init__(self, host, port, recorder):
+        self.host = host
+        self.port = port
+        self.recorder = recorder
+        self.cookies = {}
+
+    def request(self, route, method, path, body=None, headers=None, ok_statuses=(200, 302)):
+        headers = dict(headers or {})
+        if self.cookies:
+            headers['Cookie'] = '; '.join(f"{k}={v}" for k, v in self.cookies.items())
+        if body is not None:
+            body = urlencode(body)
+            headers['Content-Type'] = 'application/x-www-form-urlencoded'
+
+        started = time.perf_counter()
+        try:
+            connection = http.client.HTTPConnection(self.host, self.port, timeout=60)
+            try:
+                connection.request(method, path, body=body, headers=headers)
+                response = connection.getresponse()
+                data = response.read()
+            finally:
+                connection.close()
+        except (OSError, http.client.HTTPException):
+            self.recorder.record(route, time.perf_counter() - started, ok=False)
+            return None, b''
+
+        self.recorder.record(route, time.perf_counter() - started, ok=response.status in ok_statuses)
+        for header in response.headers.get_all('Set-Cookie') or []:
+            for name, morsel in SimpleCookie(header).items():
+                self.cookies[name] = morsel.value
+        return response, data
+
+
+def simulate_user(session, user_number, videos, feed_poll_interval, timeout):
+    """the whole life of one user, returns how many of their jobs failed"""
+    username = f"load{user_number}-{time.monotonic_ns() % 10**9}"
+    session.request('POST /register', 'POST', '/register',
+                    {'username': username, 'email': f"{username}@example.com", 'password': 'pw'})
+    session.request('POST /login', 'POST', '/login', {'username': username, 'password': 'pw'})
+
+    for url in videos:
+        session.request('POST /add_video', 'POST', '/add_video', {'video_url': url})
+
+    # wait for the download workers, polling like the dashboard and a podcast app would
+    deadline = time.monotonic() + timeout
+    last_feed_poll = 0.0
+    while time.monotonic() < deadline:
+        response, data = session.request('GET /jobs', 'GET', '/jobs?active=1', ok_statuses=(200,))
+        if time.monotonic() - last_feed_poll >= feed_poll_interval:
+            session.request('GET /feed', 'GET', f"/feed/{username}", ok_statuses=(200, 304))
+            last_feed_poll = time.monotonic()
+        if response is not None and response.status == 200 and not json.loads(data)['jobs']:
+            break
+        time.sleep(0.2)
+    else:
+        session.recorder.error('jobs timed out')
+
+    _, data = session.request('GET /jobs', 'GET', '/jobs', ok_statuses=(200,))
+    failed = sum(1 for job in json.loads(data or b'{"jobs": []}')['jobs'] if job['status'] == 'failed')
+
+    # conditional poll, then play every episode: first chunk, then a seek
+    response, feed = session.request('GET /feed', 'GET', f"/feed/{username}", ok_statuses=(200, 304))
+    etag = response.getheader('ETag') if response is not None else None
+    if etag:
+        session.request('GET /feed (conditional)', 'GET', f"/feed/{username}",
+                        headers={'If-None-Match': etag}, ok_statuses=(304,))
+
+    for enclosure in re.findall(rb'<enclosure url="([^"]+)"', feed):
+        # enclosure URLs aren't percent-encoded, podcast apps encode them before fetching
+        path = quote(urlsplit(enclosure.decode().replace('&amp;', '&')).path)
+        session.request('GET /episode (range)', 'GET', path, headers={'Range': 'bytes=0-65535'}, ok_statuses=(206,))
+        session.request('GET /episode (range)', 'GET', path, headers={'Range': 'bytes=-65536'}, ok_statuses=(206,))
+    return failed
+
+
+def reset_app(web):
+    """empty database, cache and episode folders so each level starts the same"""
+    web.download_queue.stop(timeout=30)
+    with web.app.app_context():
+        web.db.session.remove()
+        web.db.drop_all()
+        web.init_db()
+    web.feed_cache.clear()
+    web.info_cache.clear()
+    for path in Path(web.UPLOAD_FOLDER).iterdir():
+        if path.is_dir() and path != Path(web.audio_store.root):
+            shutil.rmtree(path, ignore_errors=True)
+    for path in Path(web.audio_store.root).iterdir():
+        if path.is_file():
+            path.unlink()
+
+
+def run_level(web, concurrency, videos_per_user=5, shared_videos=0.5, feed_poll_interval=2.0, timeout=300):
+    """run one concurrency level against web, an imported app module
+
+    shared_videos is the fraction of each user's videos picked from a pool
+    every user draws from, so the shared audio store gets exercised
+    """
+    reset_app(web)
+    web.app.config['TESTING'] = True
+    web.app.config['WTF_CSRF_ENABLED'] = False  # forms are posted directly
+    web.download_queue.start()
+
+    server = make_server('127.0.0.1', 0, web.app, threaded=True)
+    server_thread = threading.Thread(target=server.serve_forever, daemon=True)
+    server_thread.start()
+
+    recorder = Recorder()
+    shared_count = int(videos_per_user * shared_videos)
+    pool = [video_url(n) for n in range(videos_per_user)]
+
+    def user_videos(user_number):
+        own = [video_url(1_000_000 + user_number * videos_per_user + n)
+               for n in range(videos_per_user - shared_count)]
+        return pool[:shared_count] + own
+
+    started = time.perf_counter()
+    try:
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            futures = [
+                executor.submit(simulate_user, Session('127.0.0.1', server.server_port, recorder),
+                                n, user_videos(n), feed_poll_interval, timeout)
+                for n in range(concurrency)
+            ]
+            failed_jobs = sum(future.result() for future in futures)
+    finally:
+        wall = time.perf_counter() - started
+        server.shutdown()
+        server_thread.join()
+
+    summary = recorder.summary(wall)
+    summary['concurrency'] = concurrency
+    summary['videos'] = concurrency * videos_per_user
+    summary['failed_jobs'] = failed_jobs
+    summary['videos_per_second'] = summary['videos'] / wall if wall else 0.0
+    return summary
+
+
+def install_fake_extractor(extract_latency, fetch_latency, postprocess_latency, audio_bytes):
+    import yt_dlp
+
+    FakeExtractor.extract_latency = extract_latency
+    FakeExtractor.fetch_latency = fetch_latency
+    FakeExtractor.postprocess_latency = postprocess_latency
+    FakeExtractor.audio_bytes = audio_bytes
+    yt_dlp.YoutubeDL = FakeExtractor
+
+
+def print_level(summary):
+    print(f"\nConcurrency {summary['concurrency']}: {summary['requests']} requests in "
+          f"{summary['wall_seconds']:.1f}s ({summary['throughput']:.1f} req/s, "
+          f"{summary['videos_per_second']:.2f} videos/s), {summary['errors']} errors, "
+          f"{summary['failed_jobs']} failed jobs")
+    print(f"  {'route':<26}{'count':>7}{'err%':>7}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}")
+    for route, stats in summary['routes'].items():
+        def ms(value):
+            return f"{value * 1000:9.1f}" if value is not None else f"{'-':>9}"
+        print(f"  {route:<26}{stats['requests']:>7}{stats['error_rate'] * 100:>6.1f}%"
+              f"{ms(stats['p50'])}{ms(stats['p95'])}{ms(stats['p99'])}")
+
+
+def print_comparison(levels, baseline):
+    """throughput and p95 changes against an earlier run"""
+    before = {level['concurrency']: level for level in baseline['levels']}
+    print("\nCompared with baseline:")
+    for level in levels:
+        old = before.get(level['concurrency'])
+        if not old:
+            continue
+        change = (level['throughput'] / old['throughput'] - 1) * 100 if old['throughput'] else 0.0
+        print(f"  concurrency {level['concurrency']}: throughput {change:+.1f}%")
+        for route, stats in level['routes'].items():
+            old_stats = old['routes'].get(route)
+            if old_stats and old_stats['p95'] and stats['p95']:
+                print(f"    {route:<26} p95 {(stats['p95'] / old_stats['p95'] - 1) * 100:+.1f}%")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='offline end-to-end load test for the web app')
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 4, 16],
+                        help='simulated users at once, one run per value (default: 1 4 16)')
+    parser.add_argument('--videos-per-user', type=int, default=5)
+    parser.add_argument('--shared-videos', type=float, default=0.5,
+                        help='fraction of each user\'s videos that other users also add (default: 0.5)')
+    parser.add_argument('--workers', type=int, help='download worker threads (default: DOWNLOAD_WORKERS)')
+    parser.add_argument('--extract-latency', type=float, default=0.2, help='fake yt-dlp extraction seconds')
+    parser.add_argument('--fetch-latency', type=float, default=0.5, help='fake download seconds')
+    parser.add_argument('--postprocess-latency', type=float, default=0.5, help='fake FFmpeg seconds')
+    parser.add_argument('--audio-bytes', type=int, default=256 * 1024, help='size of each fake audio file')
+    parser.add_argument('--feed-poll-interval', type=float, default=2.0)
+    parser.add_argument('--timeout', type=float, default=300, help='give up waiting for jobs after this long')
+    parser.add_argument('--output', help='write the results as JSON to this file')
+    parser.add_argument('--baseline', help='results JSON from an earlier run to compare against')
+    parser.add_argument('--workdir', help='scratch folder (default: a new temp folder)')
+    args = parser.parse_args()
+
+    logging.getLogger('werkzeug').setLevel(logging.WARNING)  # no per-request log lines
+    install_fake_extractor(args.extract_latency, args.fetch_latency, args.postprocess_latency, args.audio_bytes)
+
+    # same scratch database/episodes setup the benchmarks use
+    from benchmark import import_web_app
+    workdir = Path(args.workdir or tempfile.mkdtemp(prefix='yt2podcast-load-'))
+    web = import_web_app(workdir)
+    if args.workers:
+        web.download_queue.workers = args.workers
+
+    levels = []
+    for concurrency in args.concurrency:
+        summary = run_level(web, concurrency, args.videos_per_user, args.shared_videos,
+                            args.feed_poll_interval, args.timeout)
+        print_level(summary)
+        levels.append(summary)
+    web.download_queue.stop(timeout=30)
+
+    result = {
+        'settings': {key: value for key, value in vars(args).items() if key not in ('output', 'baseline', 'workdir')},
+        'levels': levels,
+    }
+    if args.output:
+        Path(args.output).write_text(json.dumps(result, indent=2) + '\n', encoding='utf-8')
+        print(f"\nResults written to {args.output}")
+    if args.baseline:
+        print_comparison(levels, json.loads(Path(args.baseline).read_text(encoding='utf-8')))
+
+    if any(level['errors'] or level['failed_jobs'] for level in levels):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,266 @@
+#!/usr/bin/env python3
+"""
+Episode metadata storage for YT2Podcast
+
+Both stores behave like the dict that used to live in YT2Podcast.metadata
+(video hash -> episode data, in the order episodes were added), so the rest
+of the code doesn't care which one it's talking to.
+
+    JSONMetadataStore   - the classic episodes_metadata.json file
+    SQLiteMetadataStore - one row per episode, WAL mode, safe for several
+                          threads and processes writing at once
+
+Downloads that are still running are tracked next to the episodes
+(mark_pending / clear_pending / pending), and written straight away, so a
+crashed run leaves a record of what it was in the middle of.
+"""
+
+import json
+import sqlite3
+import threading
+from collections.abc import MutableMapping
+from contextlib import contextmanager
+from pathlib import Path
+
+from atomic_file import atomic_write
+
+try:
+    import fcntl
+except ImportError:  # windows
+    fcntl = None
+
+SQLITE_SUFFIXES = ('.db', '.sqlite', '.sqlite3')
+
+
+class JSONMetadataStore(MutableMapping):
+    """metadata kept in memory and written out as one JSON file on flush()
+
+    writes go through a temp file + rename so a crash never leaves a
+    truncated file behind. Two processes flushing at once is still last
+    writer wins, use the SQLite store for that.
+    """
+
+    def __init__(self, path):
+        self.path = Path(path)
+        # running downloads go in a small file of their own, the episodes
+        # file keeps its old format
+        self.pending_path = self.path.with_name(f"{self.path.stem}.pending.json")
+        self._lock = threading.RLock()
+        self._data = _read_json(self.path)
+
+    def __getitem__(self, video_hash):
+        return self._data[video_hash]
+
+    def __setitem__(self, video_hash, episode_data):
+        with self._lock:
+            self._data[video_hash] = episode_data
+
+    def __delitem__(self, video_hash):
+        with self._lock:
+            del self._data[video_hash]
+
+    def __iter__(self):
+        return iter(list(self._data))
+
+    def __len__(self):
+        return len(self._data)
+
+    def __contains__(self, video_hash):
+        return video_hash in self._data
+
+    def flush(self):
+        """write everything back to the JSON file"""
+        with self._lock, _file_lock(self.path):
+            _write_json(self.path, self._data)
+
+    def mark_pending(self, video_hash, record):
+        """remember a download that has started, on disk right away"""
+        self._update_pending(lambda pending: pending.__setitem__(video_hash, record))
+
+    def clear_pending(self, video_hash):
+        self._update_pending(lambda pending: pending.pop(video_hash, None))
+
+    def pending(self):
+        """video hash -> record for downloads that never finished"""
+        return _read_json(self.pending_path)
+
+    def _update_pending(self, change):
+        # read-modify-write under the file lock, other processes share the file
+        with self._lock, _file_lock(self.pending_path):
+            pending = _read_json(self.pending_path)
+            change(pending)
+            if pending:
+                _write_json(self.pending_path, pending)
+            else:
+                self.pending_path.unlink(missing_ok=True)
+
+    def close(self):
+        pass
+
+
+class SQLiteMetadataStore(MutableMapping):
+    """metadata in an SQLite database, every write is a single-row upsert
+
+    rowid keeps the insertion order so feeds come out the same as with the
+    JSON file. Indexed on video hash (the primary key) and upload date.
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS episodes (
+            video_hash TEXT PRIMARY KEY,
+            upload_date TEXT,
+            download_date TEXT,
+            data TEXT NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS ix_episodes_upload_date ON episodes (upload_date);
+        CREATE TABLE IF NOT EXISTS pending_downloads (
+            video_hash TEXT PRIMARY KEY,
+            data TEXT NOT NULL
+        );
+    """
+
+    def __init__(self, path, timeout=30):
+        self.path = Path(path)
+        self._lock = threading.RLock()
+        # one connection shared by our threads, sqlite handles other processes
+        self._conn = sqlite3.connect(str(self.path), timeout=timeout, check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        with self._conn:
+            self._conn.executescript(self.SCHEMA)
+
+    def __getitem__(self, video_hash):
+        with self._lock:
+            row = self._conn.execute(
+                'SELECT data FROM episodes WHERE video_hash = ?', (video_hash,)
+            ).fetchone()
+        if row is None:
+            raise KeyError(video_hash)
+        return json.loads(row[0])
+
+    def __setitem__(self, video_hash, episode_data):
+        self.upsert_many([(video_hash, episode_data)])
+
+    def __delitem__(self, video_hash):
+        with self._lock, self._conn:
+            cursor = self._conn.execute('DELETE FROM episodes WHERE video_hash = ?', (video_hash,))
+        if not cursor.rowcount:
+            raise KeyError(video_hash)
+
+    def __iter__(self):
+        with self._lock:
+            rows = self._conn.execute('SELECT video_hash FROM episodes ORDER BY rowid').fetchall()
+        return (row[0] for row in rows)
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute('SELECT COUNT(*) FROM episodes').fetchone()[0]
+
+    def __contains__(self, video_hash):
+        with self._lock:
+            return self._conn.execute(
+                'SELECT 1 FROM episodes WHERE video_hash = ?', (video_hash,)
+            ).fetchone() is not None
+
+    def items(self):
+        """all episodes in one query instead of one lookup per key"""
+        with self._lock:
+            rows = self._conn.execute('SELECT video_hash, data FROM episodes ORDER BY rowid').fetchall()
+        return [(video_hash, json.loads(data)) for video_hash, data in rows]
+
+    def values(self):
+        return [episode_data for _, episode_data in self.items()]
+
+    def upsert_many(self, items):
+        """insert or update several episodes in one transaction"""
+        rows = [
+            (video_hash, episode_data.get('upload_date'), episode_data.get('download_date'),
+             json.dumps(episode_data, ensure_ascii=False))
+            for video_hash, episode_data in items
+        ]
+        with self._lock, self._conn:
+            self._conn.executemany(
+                """INSERT INTO episodes (video_hash, upload_date, download_date, data)
+                   VALUES (?, ?, ?, ?)
+                   ON CONFLICT(video_hash) DO UPDATE SET
+                       upload_date = excluded.upload_date,
+                       download_date = excluded.download_date,
+                       data = excluded.data""",
+                rows,
+            )
+
+    def mark_pending(self, video_hash, record):
+        """remember a download that has started"""
+        with self._lock, self._conn:
+            self._conn.execute(
+                'INSERT OR REPLACE INTO pending_downloads (video_hash, data) VALUES (?, ?)',
+                (video_hash, json.dumps(record, ensure_ascii=False)),
+            )
+
+    def clear_pending(self, video_hash):
+        with self._lock, self._conn:
+            self._conn.execute('DELETE FROM pending_downloads WHERE video_hash = ?', (video_hash,))
+
+    def pending(self):
+        """video hash -> record for downloads that never finished"""
+        with self._lock:
+            rows = self._conn.execute('SELECT video_hash, data FROM pending_downloads ORDER BY rowid').fetchall()
+        return {video_hash: json.loads(data) for video_hash, data in rows}
+
+    def flush(self):
+        """nothing to do, every write is already committed"""
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+def open_metadata_store(path):
+    """pick the store from the file extension (.db/.sqlite means SQLite)"""
+    path = Path(path)
+    if path.suffix.lower() in SQLITE_SUFFIXES:
+        return SQLiteMetadataStore(path)
+    return JSONMetadataStore(path)
+
+
+def migrate_json_to_sqlite(json_path, sqlite_path):
+    """copy every episode from a JSON metadata file into an SQLite store
+
+    safe to run again, existing rows are just updated. Returns how many
+    episodes were copied.
+    """
+    source = JSONMetadataStore(json_path)
+    target = SQLiteMetadataStore(sqlite_path)
+    try:
+        target.upsert_many(source.items())
+        return len(source)
+    finally:
+        target.close()
+
+
+def _read_json(path):
+    """contents of a JSON file, {} if it's missing or unreadable"""
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (json.JSONDecodeError, FileNotFoundError):
+        return {}
+
+
+def _write_json(path, data):
+    """temp file + rename, so a crash never leaves a truncated file"""
+    atomic_write(path, json.dumps(data, indent=2, ensure_ascii=False).encode('utf-8'))
+
+
+@contextmanager
+def _file_lock(path):
+    """advisory lock on path.lock so two processes don't flush at once"""
+    if fcntl is None:
+        yield
+        return
+    with open(f"{path}.lock", 'w') as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+"""
+Incremental publisher for static hosting (GitHub Pages, an S3 bucket or a
+CDN origin)
+
+The feeds and audio are laid out in an output folder that mirrors the
+public URLs. A manifest in that folder (.publish-manifest.json) remembers
+the sha256 of every published file, so the next run only copies what's new
+or different and lists what went away:
+
+    publisher = StaticPublisher('site')
+    result = publisher.publish([
+        SiteFile('rss.xml', rendered_bytes),
+        SiteFile('episodes/talk.mp3', Path('episodes/talk.mp3')),
+    ])
+    result.changed      # paths written this run, upload these
+    result.deleted      # paths that aren't part of the site any more
+
+Audio files are only hashed when their size or mtime changed since the last
+run (or not at all when the caller already knows the hash), so a publish
+costs time in proportion to what changed rather than to the library.
+"""
+
+import hashlib
+import json
+import os
+from collections import namedtuple
+from datetime import datetime, timezone
+from pathlib import Path, PurePosixPath
+
+from atomic_file import atomic_write
+from audio_store import file_sha256
+
+MANIFEST_NAME = '.publish-manifest.json'
+
+
+class SiteFile(namedtuple('SiteFile', ['path', 'source', 'sha256'], defaults=(None,))):
+    """one file of the site: its path under the output folder and bytes or a file to copy
+
+    sha256 can be passed in when it's already known (the web app's shared
+    audio keeps it), which saves reading the file at all
+    """
+
+    __slots__ = ()
+
+
+PublishResult = namedtuple('PublishResult', ['changed', 'unchanged', 'deleted'])
+
+
+class StaticPublisher:
+    """keeps output_dir in step with a list of SiteFiles, copying only changes"""
+
+    def __init__(self, output_dir, manifest_name=MANIFEST_NAME):
+        self.output_dir = Path(output_dir)
+        self.manifest_file = self.output_dir / manifest_name
+
+    def publish(self, files):
+        """write new and changed files, remove ones that are gone, returns a PublishResult"""
+        self.output_dir.mkdir(parents=True, exist_ok=True)
+        previous = self.load_manifest().get('files', {})
+        entries = {}
+        changed = []
+        unchanged = 0
+
+        for site_file in files:
+            path = _clean_path(site_file.path)
+            if path in entries:
+                raise ValueError(f"{path} is in the site twice")
+            entry = _manifest_entry(site_file, previous.get(path))
+            entries[path] = entry
+
+            old = previous.get(path)
+            target = self.output_dir / path
+            if old and old['sha256'] == entry['sha256'] and _has_size(target, entry['size']):
+                unchanged += 1
+                continue
+            _write_file(target, site_file.source)
+            changed.append(path)
+
+        deleted = sorted(set(previous) - set(entries))
+        for path in deleted:
+            (self.output_dir / path).unlink(missing_ok=True)
+            self._remove_empty_parents(self.output_dir / path)
+
+        self._save_manifest({
+            'files': entries,
+            'last_run': {
+                'published_at': datetime.now(timezone.utc).isoformat(),
+                'changed': changed,
+                'deleted': deleted,
+            },
+        })
+        return PublishResult(changed, unchanged, deleted)
+
+    def load_manifest(self):
+        """the manifest from the last run, empty if there wasn't one (or it's unreadable)"""
+        try:
+            with open(self.manifest_file, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return {}
+
+    def _save_manifest(self, manifest):
+        data = json.dumps(manifest, indent=1, sort_keys=True, ensure_ascii=False).encode('utf-8')
+        _write_file(self.manifest_file, data)
+
+    def _remove_empty_parents(self, path):
+        parent = path.parent
+        while parent != self.output_dir and self.output_dir in parent.parents:
+            try:
+                parent.rmdir()
+            except OSError:
+                break
+            parent = parent.parent
+
+
+def _clean_path(path):
+    """site-relative posix path, nothing that could escape the output folder"""
+    clean = PurePosixPath(str(path).replace('\\', '/'))
+    if clean.is_absolute() or '..' in clean.parts or not clean.parts or clean.name == MANIFEST_NAME:
+        raise ValueError(f"bad site path: {path}")
+    return clean.as_posix()
+
+
+def _manifest_entry(site_file, old):
+    """sha256 and size of a site file, reusing the old hash when the source file looks untouched"""
+    source = site_file.source
+    if isinstance(source, (bytes, bytearray)):
+        return {'sha256': site_file.sha256 or hashlib.sha256(source).hexdigest(), 'size': len(source)}
+
+    stat = os.stat(source)
+    sha256 = site_file.sha256
+    if sha256 is None and old and old['size'] == stat.st_size and old.get('mtime_ns') == stat.st_mtime_ns:
+        sha256 = old['sha256']
+    return {'sha256': sha256 or file_sha256(source), 'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+
+
+def _has_size(path, size):
+    """published file still there (someone may have cleaned the folder out)"""
+    try:
+        return path.stat().st_size == size
+    except FileNotFoundError:
+        return False
+
+
+def _write_file(path, source):
+    """bytes or a copy of a file into path, through a temp file so nothing is ever half written"""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    atomic_write(path, source if isinstance(source, (bytes, bytearray)) else _read_chunks(source))
+
+
+def _read_chunks(path, size=1024 * 1024):
+    with open(path, 'rb') as f:
+        yield from iter(lambda: f.read(size), b'')
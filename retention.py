@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+"""
+Disk budget helpers for YT2Podcast
+
+RetentionPolicy holds the limits (keep the newest N episodes, drop audio
+nobody played for X days, per-user and global quotas), lru_victims() picks
+what to remove when something is over its quota, and AccessTracker keeps
+"last played" times in memory and writes them out in batches instead of
+one database write per request.
+
+    tracker = AccessTracker(save_times, interval=60)
+    tracker.touch(episode_id)      # on every play
+    tracker.flush()                # before looking at the times
+"""
+
+import threading
+import time
+from datetime import datetime
+
+
+class RetentionPolicy:
+    """the limits, 0 (or None) switches a rule off"""
+
+    def __init__(self, keep_newest=0, idle_days=0, user_quota_bytes=0, global_quota_bytes=0):
+        self.keep_newest = keep_newest or 0
+        self.idle_days = idle_days or 0
+        self.user_quota_bytes = user_quota_bytes or 0
+        self.global_quota_bytes = global_quota_bytes or 0
+
+    @property
+    def enabled(self):
+        return any((self.keep_newest, self.idle_days, self.user_quota_bytes, self.global_quota_bytes))
+
+    @classmethod
+    def from_config(cls, config):
+        """build one from a Flask config (or any mapping) with the RETENTION_* keys"""
+        mb = 1024 * 1024
+        return cls(
+            keep_newest=config.get('RETENTION_KEEP_NEWEST', 0),
+            idle_days=config.get('RETENTION_IDLE_DAYS', 0),
+            user_quota_bytes=config.get('USER_QUOTA_MB', 0) * mb,
+            global_quota_bytes=config.get('GLOBAL_QUOTA_MB', 0) * mb,
+        )
+
+
+def lru_victims(items, total_bytes, quota_bytes):
+    """keys to remove, least recently used first, to get total_bytes under quota_bytes
+
+    items are (key, size, last_used) tuples, last_used can be anything that
+    sorts. Items never used should pass when they were added instead,
+    otherwise they go first.
+    """
+    if not quota_bytes or total_bytes <= quota_bytes:
+        return []
+    victims = []
+    # never-used (None) first, then oldest use
+    for key, size, _ in sorted(items, key=lambda item: (item[2] is not None, item[2])):
+        if total_bytes <= quota_bytes:
+            break
+        victims.append(key)
+        total_bytes -= size or 0
+    return victims
+
+
+class AccessTracker:
+    """last-use times kept in memory, handed to save() in batches
+
+    save gets a dict of key -> datetime. touch() only writes when the last
+    flush was more than interval seconds ago or max_pending keys are
+    waiting, so a busy server does one write a minute instead of one per
+    request. Times not flushed yet are lost if the process dies, which only
+    makes eviction a little less accurate.
+    """
+
+    def __init__(self, save, interval=60, max_pending=1000):
+        self.save = save
+        self.interval = interval
+        self.max_pending = max_pending
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._last_flush = time.monotonic()
+
+    def touch(self, key, when=None):
+        """note a use of key, returns True if it triggered a flush"""
+        with self._lock:
+            self._pending[key] = when or datetime.utcnow()
+            due = (len(self._pending) >= self.max_pending
+                   or time.monotonic() - self._last_flush >= self.interval)
+        if due:
+            self.flush()
+        return due
+
+    def pending(self):
+        with self._lock:
+            return dict(self._pending)
+
+    def flush(self):
+        """write everything waiting, returns how many keys were saved"""
+        with self._lock:
+            batch, self._pending = self._pending, {}
+            self._last_flush = time.monotonic()
+        if not batch:
+            return 0
+        try:
+            self.save(batch)
+        except Exception:
+            # put them back (newer touches win) so the next flush tries again
+            with self._lock:
+                self._pending = {**batch, **self._pending}
+            raise
+        return len(batch)
@@ -0,0 +1,196 @@
+#!/usr/bin/env python3
+"""
+Subscription poller for the web app
+
+Subscriptions (a user following a YouTube channel or playlist) are rows in
+the database with a next_poll_at time. One scheduler thread per process
+claims the ones that are due, lists the source with flat extraction and
+hands anything newer than the stored high-water mark to the download
+queue. Poll times are jittered and polls go through a rate limiter, so
+thousands of subscriptions added at once don't all hit YouTube in the same
+minute.
+"""
+
+import random
+import threading
+import time
+import traceback
+from datetime import datetime, timedelta
+
+
+class RateLimiter:
+    """token bucket: at most rate calls per period seconds, with bursts up to rate"""
+
+    def __init__(self, rate, period=60.0):
+        self.rate = max(1, rate)
+        self.period = period
+        self._tokens = float(self.rate)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, stop=None):
+        """wait for a token, returns False if stop (an Event) got set while waiting"""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.rate, self._tokens + (now - self._updated) * self.rate / self.period)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return True
+                wait = (1 - self._tokens) * self.period / self.rate
+            if stop is not None:
+                if stop.wait(wait):
+                    return False
+            else:
+                time.sleep(wait)
+
+
+def entries_since(entries, last_seen_id):
+    """entries newer than the high-water mark, newest first
+
+    entries are newest first. Without a mark everything is new; if the mark
+    isn't in the listing any more (deleted video, or more new uploads than
+    we fetched) everything fetched counts as new as well.
+    """
+    new = []
+    for entry in entries:
+        if last_seen_id and entry.get('id') == last_seen_id:
+            break
+        new.append(entry)
+    return new
+
+
+def next_poll_time(now, interval, jitter=0.1, failures=0, max_backoff=24 * 3600):
+    """when to poll again: interval seconds (+/- jitter), doubled for every failure in a row"""
+    seconds = interval * (2 ** failures) if failures else interval
+    seconds = min(seconds, max(interval, max_backoff))
+    seconds *= 1 + random.uniform(-jitter, jitter)
+    return now + timedelta(seconds=seconds)
+
+
+class SubscriptionScheduler:
+    """One thread polling due subscriptions, rate limited
+
+    poll is called with a subscription inside an app context and returns
+    how many videos it queued. Raising counts as a failed poll and backs
+    the subscription off.
+    """
+
+    def __init__(self, app, db, subscription_model, poll, tick=30.0,
+                 polls_per_minute=30, batch_size=50, jitter=0.1):
+        self.app = app
+        self.db = db
+        self.subscription_model = subscription_model
+        self.poll = poll
+        self.tick = tick
+        self.batch_size = batch_size
+        self.jitter = jitter
+        self.limiter = RateLimiter(polls_per_minute)
+
+        self._thread = None
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopping = threading.Event()
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self):
+        """start the scheduler thread (safe to call more than once)"""
+        with self._lock:
+            if self.running:
+                return
+            self._stopping.clear()
+            self._thread = threading.Thread(target=self._loop, name="subscription-scheduler", daemon=True)
+            self._thread.start()
+
+    def stop(self, timeout=None):
+        self._stopping.set()
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+        self._thread = None
+
+    def notify(self):
+        """check for due subscriptions now instead of at the next tick"""
+        self._wakeup.set()
+
+    def run_due(self, now=None):
+        """poll every subscription that's due in the calling thread, returns how many
+
+        Handy for tests and cron-style use without the thread.
+        """
+        polled = 0
+        while True:
+            claimed = self._claim_due(now)
+            if not claimed:
+                return polled
+            for subscription_id in claimed:
+                if not self.limiter.acquire(self._stopping):
+                    return polled
+                self._poll_one(subscription_id, now)
+                polled += 1
+
+    def _claim_due(self, now=None):
+        """push next_poll_at of a batch of due subscriptions forward, returns their ids
+
+        The conditional UPDATE stops another process from polling the same
+        subscription; if the poll crashes it simply comes round again later.
+        """
+        Subscription = self.subscription_model
+        session = self.db.session
+        now = now or datetime.utcnow()
+
+        due = session.query(Subscription.id, Subscription.next_poll_at).filter(
+            Subscription.next_poll_at <= now
+        ).order_by(Subscription.next_poll_at).limit(self.batch_size).all()
+
+        claimed = []
+        for subscription_id, next_poll_at in due:
+            updated = Subscription.query.filter_by(id=subscription_id, next_poll_at=next_poll_at).update(
+                {'next_poll_at': now + timedelta(seconds=self.tick * 10)}, synchronize_session=False
+            )
+            if updated:
+                claimed.append(subscription_id)
+        session.commit()
+        return claimed
+
+    def _poll_one(self, subscription_id, now=None):
+        session = self.db.session
+        subscription = session.get(self.subscription_model, subscription_id)
+        if subscription is None:
+            return
+
+        now = now or datetime.utcnow()
+        try:
+            queued = self.poll(subscription)
+            subscription.failures = 0
+            subscription.last_error = None
+            print(f"Polled subscription {subscription.id} ({subscription.source_url}): {queued} new")
+        except Exception as e:
+            print(f"Polling subscription {subscription_id} failed: {e}")
+            session.rollback()
+            subscription = session.get(self.subscription_model, subscription_id)
+            subscription.failures = (subscription.failures or 0) + 1
+            subscription.last_error = str(e)[:500]
+
+        subscription.last_polled_at = now
+        subscription.next_poll_at = next_poll_time(
+            now, subscription.poll_interval, self.jitter, subscription.failures or 0
+        )
+        session.commit()
+
+    def _loop(self):
+        while not self._stopping.is_set():
+            try:
+                with self.app.app_context():
+                    self.run_due()
+            except Exception as e:
+                # a database hiccup shouldn't stop polling for good
+                print(f"Subscription scheduler error: {e}")
+                traceback.print_exc()
+
+            self._wakeup.wait(self.tick)
+            self._wakeup.clear()
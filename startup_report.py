@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+"""
+Startup time report for the web app
+
+Imports app.py in a fresh interpreter with -X importtime and breaks the
+import down by top-level module, then starts another one that serves its
+first requests (the landing page and a feed) through Flask's test client.
+Both run against a scratch database, nothing touches the real one.
+
+Usage:
+    python startup_report.py
+    python startup_report.py --output startup.json --budget 3.0
+
+Exits with an error if a module that should load lazily (yt_dlp) got
+imported on the way, or if the time to first request is over --budget
+seconds.
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent
+
+# only the download code paths may import these
+LAZY_MODULES = ('yt_dlp',)
+
+# runs in the child: import, set up the database, serve a few requests
+_FIRST_REQUEST_SCRIPT = """
+import json, sys, time
+started = time.perf_counter()
+import app as web
+imported = time.perf_counter()
+with web.app.app_context():
+    web.init_db()
+ready = time.perf_counter()
+client = web.app.test_client()
+statuses = {path: client.get(path).status_code for path in sys.argv[1:]}
+served = time.perf_counter()
+print(json.dumps({
+    'wall_clock': time.time(),
+    'import': imported - started,
+    'init_db': ready - imported,
+    'first_requests': served - ready,
+    'statuses': statuses,
+    'lazy_modules_loaded': sorted(name for name in %r if name in sys.modules),
+}))
+"""
+
+
+def parse_importtime(stderr, module='app'):
+    """-X importtime output -> (seconds for module, [(child, seconds)] slowest first, every module imported)
+
+    lines look like "import time: <self us> | <cumulative us> | <indent><name>",
+    children are printed before their parent and indented two more spaces
+    """
+    entries = []
+    for line in stderr.splitlines():
+        parts = line[len('import time:'):].split('|')
+        if not line.startswith('import time:') or len(parts) != 3 or 'cumulative' in line:
+            continue
+        _, cumulative_us, name = parts
+        depth = (len(name) - len(name.lstrip(' ')) - 1) // 2
+        entries.append((depth, name.strip(), int(cumulative_us) / 1e6))
+
+    total = 0.0
+    children = []
+    pending = []
+    for depth, name, seconds in entries:
+        if depth == 0:
+            if name == module:
+                total = seconds
+                children = [(child, child_seconds) for child_depth, child, child_seconds in pending if child_depth == 1]
+            pending = []
+        else:
+            pending.append((depth, name, seconds))
+    children.sort(key=lambda item: item[1], reverse=True)
+    return total, children, {name for _, name, _ in entries}
+
+
+def _child_env(workdir):
+    env = dict(os.environ)
+    env['DATABASE_URI'] = f"sqlite:///{Path(workdir) / 'startup.db'}"
+    env['INFO_CACHE_FILE'] = str(Path(workdir) / 'info_cache.db')
+    env['FEED_CACHE_BACKEND'] = 'memory'
+    return env
+
+
+def import_profile(workdir, module='app'):
+    """import breakdown of module in a fresh interpreter"""
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', f"import {module}"],
+        cwd=ROOT, env=_child_env(workdir), capture_output=True, text=True, check=True,
+    )
+    total, children, modules = parse_importtime(result.stderr, module)
+    return {
+        'import_seconds': total,
+        'breakdown': children,
+        'lazy_modules_loaded': sorted(name for name in LAZY_MODULES if name in modules),
+    }
+
+
+def first_request(workdir, paths=('/', '/feed/nobody')):
+    """time from starting python to answering the first requests"""
+    started = time.time()
+    result = subprocess.run(
+        [sys.executable, '-c', _FIRST_REQUEST_SCRIPT % (LAZY_MODULES,), *paths],
+        cwd=ROOT, env=_child_env(workdir), capture_output=True, text=True, check=True,
+    )
+    child = json.loads(result.stdout.strip().splitlines()[-1])
+    child['time_to_first_request'] = child.pop('wall_clock') - started
+    return child
+
+
+def run_report(workdir=None):
+    workdir = Path(workdir or tempfile.mkdtemp(prefix='yt2podcast-startup-'))
+    workdir.mkdir(parents=True, exist_ok=True)
+    report = import_profile(workdir)
+    serving = first_request(workdir)
+    report['time_to_first_request'] = serving['time_to_first_request']
+    report['first_request'] = serving
+    report['lazy_modules_loaded'] = sorted(set(report['lazy_modules_loaded']) | set(serving['lazy_modules_loaded']))
+    return report
+
+
+def format_report(report, top=8):
+    lines = [
+        f"import app: {report['import_seconds'] * 1000:.0f} ms, "
+        f"first request {report['time_to_first_request'] * 1000:.0f} ms after starting python",
+    ]
+    for name, seconds in report['breakdown'][:top]:
+        lines.append(f"  {name:<28} {seconds * 1000:8.1f} ms")
+    if report['lazy_modules_loaded']:
+        lines.append(f"  loaded at startup but should be lazy: {', '.join(report['lazy_modules_loaded'])}")
+    return '\n'.join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='report how long the web app takes to start')
+    parser.add_argument('--output', help='write the report as JSON to this file')
+    parser.add_argument('--budget', type=float, help='fail if the first request takes longer than this many seconds')
+    parser.add_argument('--workdir', help='scratch folder (default: a new temp folder)')
+    args = parser.parse_args()
+
+    report = run_report(args.workdir)
+    print(format_report(report))
+
+    if args.output:
+        Path(args.output).write_text(json.dumps(report, indent=2) + '\n', encoding='utf-8')
+        print(f"Report written to {args.output}")
+
+    failed = bool(report['lazy_modules_loaded'])
+    if args.budget and report['time_to_first_request'] > args.budget:
+        print(f"Time to first request is over the {args.budget:.1f}s budget")
+        failed = True
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
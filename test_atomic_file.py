@@ -0,0 +1,46 @@
+#!/usr/bin/env python3
+"""
+Tests for the shared atomic file write
+"""
+
+import stat
+
+import pytest
+
+import atomic_file
+from atomic_file import atomic_write
+
+
+def test_bytes_and_chunks_replace_the_file(tmp_path):
+    path = tmp_path / 'rss.xml'
+    atomic_write(path, b'<rss>1</rss>')
+    assert path.read_bytes() == b'<rss>1</rss>'
+
+    atomic_write(str(path), (chunk for chunk in (b'<rss>', b'2', b'</rss>')))
+    assert path.read_bytes() == b'<rss>2</rss>'
+    assert [p.name for p in tmp_path.iterdir()] == ['rss.xml']
+
+
+def test_failed_write_keeps_the_old_file(tmp_path):
+    path = tmp_path / 'rss.xml'
+    path.write_bytes(b'old')
+
+    def broken_chunks():
+        yield b'new'
+        raise RuntimeError('disk on fire')
+
+    with pytest.raises(RuntimeError):
+        atomic_write(path, broken_chunks())
+    assert path.read_bytes() == b'old'
+    assert [p.name for p in tmp_path.iterdir()] == ['rss.xml']
+
+
+def test_new_files_follow_the_umask_and_old_files_keep_their_mode(tmp_path, monkeypatch):
+    monkeypatch.setattr(atomic_file, '_UMASK', 0o022)
+    path = tmp_path / 'rss.xml'
+    atomic_write(path, b'<rss/>')
+    assert stat.S_IMODE(path.stat().st_mode) == 0o644
+
+    path.chmod(0o640)
+    atomic_write(path, b'<rss>2</rss>')
+    assert stat.S_IMODE(path.stat().st_mode) == 0o640
@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+"""
+Tests for the MP3 vs remux (no transcoding) audio modes
+"""
+
+import pytest
+
+from yt2podcast import YT2Podcast, DownloadResult, audio_mime_type
+
+
+def test_remux_mode_stream_copies(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    mp3 = YT2Podcast().engine._ydl_options()
+    remux = YT2Podcast(audio_mode='remux').engine._ydl_options()
+
+    assert mp3['postprocessors'][0]['preferredcodec'] == 'mp3'
+    assert remux['postprocessors'][0] == {'key': 'FFmpegExtractAudio', 'preferredcodec': 'best'}
+    assert remux['format'].startswith('bestaudio[ext=m4a]')
+
+    with pytest.raises(ValueError):
+        YT2Podcast(audio_mode='flac')
+
+
+def test_mime_types_follow_the_codec():
+    assert audio_mime_type('a.mp3') == 'audio/mpeg'
+    assert audio_mime_type('a.M4A') == 'audio/x-m4a'
+    assert audio_mime_type('a.opus') == 'audio/ogg'
+
+
+def test_cli_feed_enclosure_uses_stored_type(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    podcast = YT2Podcast(base_url='https://example.com')
+    base = {'description': 'd', 'duration': 5, 'upload_date': '20240101', 'uploader': 'u',
+            'download_date': '2024-01-01T00:00:00+00:00', 'file_size': 10}
+    podcast.metadata['old'] = dict(base, title='old', filename='old.mp3', audio_url='https://example.com/episodes/old.mp3')
+    podcast.metadata['new'] = dict(base, title='new', filename='new.m4a', audio_url='https://example.com/episodes/new.m4a',
+                                   mime_type='audio/x-m4a')
+
+    for incremental in (False, True):
+        podcast.generate_rss_feed(incremental=incremental)
+        xml = podcast.rss_file.read_text()
+        assert 'old.mp3" length="10" type="audio/mpeg"' in xml
+        assert 'new.m4a" length="10" type="audio/x-m4a"' in xml
+
+
+def test_user_audio_mode_reaches_download_and_feed(web_app, client, monkeypatch):
+    modes = []
+
+    def fake_fetch(self, url, video_key=None):
+        modes.append(self.audio_mode)
+        path = self.output_dir / 'Song.m4a'
+        path.write_bytes(b'\0' * 32)
+        return DownloadResult(path, url, 'abcdefghijk', 'Song', 32, duration=3, upload_date='20240101', uploader='x')
+
+    monkeypatch.setattr(web_app.DownloadEngine, 'fetch', fake_fetch)
+    monkeypatch.setattr(web_app.download_queue, 'start', lambda: None)
+
+    client.post('/settings/audio_mode', data={'audio_mode': 'remux'})
+    client.post('/add_video', data={'video_url': 'https://youtu.be/abcdefghijk'})
+    with web_app.app.app_context():
+        web_app.download_queue.run_pending()
+
+    assert modes == ['remux']
+    feed = client.get(f"/feed/{client.username}").data
+    assert b'type="audio/x-m4a"' in feed
+
+    with web_app.app.app_context():
+        blob = web_app.AudioBlob.query.one()
+        assert blob.audio_mode == 'remux'
+        assert blob.path.endswith('abcdefghijk.remux.m4a')
+        user_id = web_app.User.query.filter_by(username=client.username).one().id
+
+    response = client.get(f"/episode/{user_id}/Song.m4a")
+    assert response.headers['Content-Type'] == 'audio/x-m4a'
+    response.close()
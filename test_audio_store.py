@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+"""
+Tests for the shared audio store that deduplicates downloads across users
+"""
+
+import os
+import uuid
+
+
+def login_new_user(web_app):
+    client = web_app.app.test_client()
+    username = f"user{uuid.uuid4().hex[:8]}"
+    client.post('/register', data={'username': username, 'email': f"{username}@example.com", 'password': 'pw'})
+    client.post('/login', data={'username': username, 'password': 'pw'})
+    return client
+
+
+def add_and_process(web_app, client, url):
+    client.post('/add_video', data={'video_url': url})
+    with web_app.app.app_context():
+        web_app.download_queue.run_pending()
+    job = client.get('/jobs').get_json()['jobs'][0]
+    assert job['status'] == 'done', job['error']
+    return job['episode_id']
+
+
+def episode_path(web_app, episode_id):
+    with web_app.app.app_context():
+        episode = web_app.db.session.get(web_app.Episode, episode_id)
+        return web_app.UPLOAD_FOLDER / str(episode.user_id) / episode.filename, episode.blob_id
+
+
+def test_second_user_reuses_the_stored_audio(web_app, fake_download):
+    first, second = login_new_user(web_app), login_new_user(web_app)
+
+    first_episode = add_and_process(web_app, first, 'https://www.youtube.com/watch?v=dQw4w9WgXcQ')
+    second_episode = add_and_process(web_app, second, 'https://www.youtube.com/watch?v=dQw4w9WgXcQ')
+    assert len(fake_download) == 1
+
+    first_path, blob_id = episode_path(web_app, first_episode)
+    second_path, second_blob_id = episode_path(web_app, second_episode)
+    assert blob_id == second_blob_id
+    assert os.path.samefile(first_path, second_path)
+
+    with web_app.app.app_context():
+        blob = web_app.db.session.get(web_app.AudioBlob, blob_id)
+        assert blob.refcount == 2
+        blob_path = blob.path
+
+    first.post(f"/delete_episode/{first_episode}")
+    assert not first_path.exists()
+    assert os.path.exists(blob_path) and second_path.exists()
+
+    second.post(f"/delete_episode/{second_episode}")
+    assert not os.path.exists(blob_path)
+    with web_app.app.app_context():
+        assert web_app.db.session.get(web_app.AudioBlob, blob_id) is None
+
+
+def test_same_video_from_another_url_shares_the_blob(web_app, fake_download):
+    first, second = login_new_user(web_app), login_new_user(web_app)
+
+    first_episode = add_and_process(web_app, first, 'https://www.youtube.com/watch?v=dQw4w9WgXcQ&ab_channel=x')
+    second_episode = add_and_process(web_app, second, 'https://youtu.be/dQw4w9WgXcQ')
+    assert len(fake_download) == 1
+
+    assert episode_path(web_app, first_episode)[1] == episode_path(web_app, second_episode)[1]
+    assert [p.name for p in web_app.audio_store.root.iterdir()] == ['dQw4w9WgXcQ.mp3']
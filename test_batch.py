@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+"""
+Tests for batch/playlist processing in the yt2podcast CLI
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+
+import yt2podcast
+from yt2podcast import YT2Podcast
+
+
+class FakePlaylistYDL:
+    def __init__(self, opts):
+        assert opts['extract_flat'] == 'in_playlist'
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def extract_info(self, url, download=False):
+        return {'_type': 'playlist', 'entries': [
+            {'_type': 'playlist', 'entries': [
+                {'url': 'https://www.youtube.com/watch?v=aaa'},
+                {'url': 'https://www.youtube.com/watch?v=bbb'},
+            ]},
+            {'url': 'https://www.youtube.com/watch?v=aaa'},
+            None,
+        ]}
+
+
+def test_collection_urls_are_detected_without_network(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    podcast = YT2Podcast()
+    assert podcast._is_collection_url('https://www.youtube.com/playlist?list=PL123')
+    assert podcast._is_collection_url('https://www.youtube.com/@someone/videos')
+    assert podcast._is_collection_url('https://www.youtube.com/channel/UC123')
+    assert not podcast._is_collection_url('https://www.youtube.com/watch?v=abc&list=PL123')
+    assert not podcast._is_collection_url('https://youtu.be/abc')
+
+
+def test_expand_urls_flattens_and_dedupes(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(yt2podcast.yt_dlp, 'YoutubeDL', FakePlaylistYDL)
+    podcast = YT2Podcast()
+    urls = podcast.expand_urls([
+        'https://www.youtube.com/watch?v=zzz',
+        'https://www.youtube.com/playlist?list=PL123',
+    ])
+    assert urls == [
+        'https://www.youtube.com/watch?v=zzz',
+        'https://www.youtube.com/watch?v=aaa',
+        'https://www.youtube.com/watch?v=bbb',
+    ]
+
+
+def test_process_batch_saves_and_builds_feed_once(tmp_path, monkeypatch, capsys):
+    monkeypatch.chdir(tmp_path)
+    calls = {'save': 0, 'rss': 0}
+
+    def fake_download(self, url, save=True):
+        assert save is False
+        if url.endswith('bad'):
+            return None
+        data = {'title': url[-3:]}
+        with self._metadata_lock:
+            self.metadata[self._get_video_hash(url)] = data
+        return data
+
+    monkeypatch.setattr(YT2Podcast, 'download_video', fake_download)
+    monkeypatch.setattr(YT2Podcast, '_save_metadata', lambda self: calls.__setitem__('save', calls['save'] + 1))
+    monkeypatch.setattr(YT2Podcast, 'generate_rss_feed', lambda self, **kw: calls.__setitem__('rss', calls['rss'] + 1))
+
+    podcast = YT2Podcast()
+    results = podcast.process_batch([
+        'https://youtu.be/one', 'https://youtu.be/two', 'https://youtu.be/bad',
+    ], workers=3)
+
+    assert [bool(episode_data) for _, episode_data, _ in results] == [True, True, False]
+    assert calls == {'save': 1, 'rss': 1}
+    assert len(podcast.metadata) == 2
+    assert 'Batch finished: 2 succeeded, 1 failed' in capsys.readouterr().out
+
+
+def test_process_workers_get_the_download_settings(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    # same code path as a real process pool, minus the pickling
+    monkeypatch.setattr(yt2podcast, 'ProcessPoolExecutor', ThreadPoolExecutor)
+    seen = []
+
+    def fake_download(self, url, save=True):
+        engine = self.engine
+        seen.append((engine.retries, engine.retry_backoff, engine.max_filesize))
+        return None
+
+    monkeypatch.setattr(YT2Podcast, 'download_video', fake_download)
+    podcast = YT2Podcast(retries=5, retry_backoff=0.5, max_filesize=1000)
+    podcast.process_batch(['https://youtu.be/one'], workers=1, use_processes=True)
+    assert seen == [(5, 0.5, 1000)]
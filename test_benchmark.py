@@ -0,0 +1,35 @@
+#!/usr/bin/env python3
+"""
+Smoke test for benchmark.py - a tiny library, one run of everything
+"""
+
+import yt2podcast
+import benchmark
+
+
+def test_suite_runs_offline_and_reports_every_benchmark(web_app, tmp_path, monkeypatch):
+    monkeypatch.setattr(yt2podcast.yt_dlp, 'YoutubeDL', benchmark.OfflineYoutubeDL)
+
+    report = benchmark.run_suite(sizes=[30], repeat=1, workdir=tmp_path, web=web_app)
+
+    assert report['meta']['sizes'] == [30]
+    names = {name.split('/')[0] for name in report['results']}
+    assert names == {
+        'metadata_load_json', 'metadata_save_json', 'metadata_load_sqlite', 'metadata_save_sqlite',
+        'rss_full', 'rss_incremental',
+        'web_feed_cold', 'web_feed_warm', 'web_feed_cold_unlimited', 'web_dashboard',
+    }
+    assert all(timing['median'] >= 0 for timing in report['results'].values())
+    assert (tmp_path / 'cli-30' / 'rss.xml').exists()
+
+
+def test_compare_flags_regressions_over_threshold():
+    baseline = {'results': {'rss_full/100': {'median': 1.0}, 'web_dashboard/100': {'median': 1.0}}}
+    current = {'results': {
+        'rss_full/100': {'median': 1.2},
+        'web_dashboard/100': {'median': 1.3},
+        'web_feed_cold/100': {'median': 5.0},  # new benchmark, nothing to compare with
+    }}
+
+    assert benchmark.compare(current, baseline, 1.25) == [('web_dashboard/100', 1.0, 1.3)]
+    assert benchmark.compare(current, baseline, 1.5) == []
@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+"""
+Tests for the keyset-paginated dashboard and the Episode indexes
+"""
+
+import re
+from datetime import timedelta
+
+
+def page_titles(response):
+    return re.findall(r'Episode \d{3}', response.get_data(as_text=True))
+
+
+def walk_pages(client):
+    titles, url = [], '/dashboard'
+    while url:
+        response = client.get(url)
+        assert response.status_code == 200
+        titles.extend(page_titles(response))
+        match = re.search(r'href="(/dashboard\?before=[^"]+)"', response.get_data(as_text=True))
+        url = match.group(1).replace('&amp;', '&') if match else None
+    return titles
+
+
+def test_dashboard_pages_through_every_episode(web_app, client, monkeypatch, add_episodes):
+    monkeypatch.setitem(web_app.app.config, 'DASHBOARD_PAGE_SIZE', 10)
+    add_episodes(client.username, 25, title='Episode {n:03d}')
+
+    first = client.get('/dashboard')
+    assert 'Your Podcast Episodes (25)' in first.get_data(as_text=True)
+    assert page_titles(first)[:2] == ['Episode 024', 'Episode 023']
+    assert len(page_titles(first)) == 10
+
+    titles = walk_pages(client)
+    assert titles == [f"Episode {i:03d}" for i in reversed(range(25))]
+
+
+def test_cursor_breaks_ties_on_id(web_app, client, monkeypatch, add_episodes):
+    monkeypatch.setitem(web_app.app.config, 'DASHBOARD_PAGE_SIZE', 4)
+    add_episodes(client.username, 9, title='Episode {n:03d}', interval=timedelta(0))
+
+    titles = walk_pages(client)
+    assert sorted(titles) == [f"Episode {i:03d}" for i in range(9)]
+    assert len(set(titles)) == 9
+
+
+def test_bad_cursor_shows_first_page(web_app, client, add_episodes):
+    add_episodes(client.username, 3, title='Episode {n:03d}')
+    response = client.get('/dashboard?before=not-a-cursor')
+    assert response.status_code == 200
+    assert len(page_titles(response)) == 3
+
+
+def test_episode_indexes_created_on_existing_database(web_app):
+    with web_app.app.app_context():
+        connection = web_app.db.session.connection()
+        connection.exec_driver_sql('DROP INDEX ix_episode_user_download')
+        web_app.db.session.commit()
+
+        web_app.init_db()
+        indexes = {index['name']: index['column_names']
+                   for index in web_app.db.inspect(web_app.db.engine).get_indexes('episode')}
+        assert indexes['ix_episode_user_download'] == ['user_id', 'download_date']
+        assert indexes['ix_episode_user_video'] == ['user_id', 'video_hash']
@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+"""
+Tests for YT2Podcast.download_video against a stand-in for yt_dlp.YoutubeDL
+"""
+
+import os
+import time
+
+import pytest
+
+import yt2podcast
+from info_cache import InfoCache
+from yt2podcast import DownloadEngine, DownloadFailed, YT2Podcast
+
+
+class FakeYoutubeDL:
+    """downloads nothing, just writes the file yt-dlp would have produced"""
+
+    calls = []
+
+    def __init__(self, opts):
+        self.opts = opts
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def extract_info(self, url, download=True):
+        FakeYoutubeDL.calls.append((url, download))
+        outtmpl = self.opts['outtmpl']
+        for hook in self.opts['progress_hooks']:
+            hook({'status': 'downloading'})
+        time.sleep(0.01)
+        for hook in self.opts['progress_hooks']:
+            hook({'status': 'finished'})
+        for hook in self.opts['postprocessor_hooks']:
+            hook({'status': 'started', 'postprocessor': 'ExtractAudio'})
+
+        # yt-dlp's own filename sanitising differs from ours on purpose
+        final_path = outtmpl.replace('%(title)s', 'Weird： Title').replace('%(ext)s', 'mp3')
+        with open(final_path, 'wb') as f:
+            f.write(b'ID3' + b'\0' * 100)
+        for hook in self.opts['postprocessor_hooks']:
+            hook({'status': 'finished', 'postprocessor': 'ExtractAudio'})
+
+        return {
+            'id': 'abcdefghijk', 'extractor_key': 'Youtube', 'title': 'Weird: Title',
+            'description': None, 'duration': 12, 'upload_date': '20240101', 'uploader': 'Someone',
+            'requested_downloads': [{'filepath': final_path}],
+        }
+
+
+def test_single_extraction_and_exact_output_path(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(yt2podcast.yt_dlp, 'YoutubeDL', FakeYoutubeDL)
+    FakeYoutubeDL.calls = []
+
+    podcast = YT2Podcast(base_url='https://example.com')
+    # a newer unrelated mp3 must not be picked up
+    decoy = podcast.episodes_dir / 'decoy.mp3'
+    decoy.write_bytes(b'x')
+    os.utime(decoy, (time.time() + 60, time.time() + 60))
+
+    episode = podcast.download_video('https://www.youtube.com/watch?v=abcdefghijk')
+
+    assert FakeYoutubeDL.calls == [('https://www.youtube.com/watch?v=abcdefghijk', True)]
+    assert episode['filename'] == 'Weird： Title.mp3'
+    assert episode['file_size'] == 103
+    assert episode['video_id'] == 'abcdefghijk'
+    assert set(episode['timings']) == {'extract', 'fetch', 'postprocess', 'total'}
+    assert episode['timings']['fetch'] > 0
+    assert 'timings' not in podcast.metadata['abcdefghijk']
+
+
+def test_failed_extraction_returns_none(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+
+    class NoInfoYDL(FakeYoutubeDL):
+        def extract_info(self, url, download=True):
+            return None
+
+    monkeypatch.setattr(yt2podcast.yt_dlp, 'YoutubeDL', NoInfoYDL)
+    assert YT2Podcast().download_video('https://youtu.be/abcdefghijk') is None
+
+
+def test_engine_only_writes_to_its_output_dir(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(yt2podcast.yt_dlp, 'YoutubeDL', FakeYoutubeDL)
+    output_dir = tmp_path / 'jobs' / '1'
+
+    result = DownloadEngine(output_dir).fetch('https://youtu.be/abcdefghijk')
+
+    assert result.path == output_dir / 'Weird： Title.mp3'
+    assert (result.video_id, result.title, result.file_size) == ('abcdefghijk', 'Weird: Title', 103)
+    assert result.mime_type == 'audio/mpeg'
+    # no episodes/ folder or metadata file in the working directory
+    assert sorted(p.name for p in tmp_path.iterdir()) == ['jobs']
+
+    episode = result.episode_data('https://example.com/')
+    assert episode['audio_url'] == 'https://example.com/episodes/Weird： Title.mp3'
+    assert episode['description'] == ''
+    assert 'timings' not in episode
+
+
+def test_engine_raises_instead_of_returning_none(tmp_path, monkeypatch):
+    class PrivateYDL(FakeYoutubeDL):
+        def extract_info(self, url, download=True):
+            raise yt2podcast.yt_dlp.utils.DownloadError('ERROR: Private video')
+
+    monkeypatch.setattr(yt2podcast.yt_dlp, 'YoutubeDL', PrivateYDL)
+    with pytest.raises(DownloadFailed) as failed:
+        DownloadEngine(tmp_path).fetch('https://youtu.be/abcdefghijk')
+    assert failed.value.reason == 'private'
+    assert not failed.value.transient
+
+
+def test_info_cache_reconnects_after_fork(tmp_path, monkeypatch):
+    cache = InfoCache(tmp_path / 'info.db')
+    cache.put('abc', {'id': 'abc'})
+    parent_conn = cache._conn
+
+    # what a gunicorn worker sees: same object, different process
+    monkeypatch.setattr('info_cache.os.getpid', lambda: -1)
+    assert cache.get('abc') == {'id': 'abc'}
+    assert cache._conn is not parent_conn
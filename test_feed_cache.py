@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+"""
+Tests for the rendered feed cache, conditional GETs and compressed
+variants on /feed/<username>
+"""
+
+import gzip
+import types
+import zlib
+
+import feed_writer
+from feed_cache import LRUFeedCache, FileFeedCache, make_entry, negotiate
+from werkzeug.http import parse_accept_header
+
+
+def count_renders(web_app, monkeypatch):
+    calls = []
+    real_render = web_app._render_user_feed
+
+    def render(user, feed_url):
+        calls.append(user.id)
+        return real_render(user, feed_url)
+
+    monkeypatch.setattr(web_app, '_render_user_feed', render)
+    return calls
+
+
+def test_feed_is_rendered_once_and_revalidated(web_app, client, monkeypatch, add_episodes):
+    renders = count_renders(web_app, monkeypatch)
+    add_episodes(client.username, title='Cached Episode')
+
+    first = client.get(f"/feed/{client.username}")
+    assert first.status_code == 200
+    assert b'Cached Episode' in first.data
+    etag = first.headers['ETag']
+    assert not etag.startswith('W/')
+    assert first.headers['Last-Modified']
+
+    second = client.get(f"/feed/{client.username}")
+    assert second.data == first.data
+    assert renders == [renders[0]]
+
+    not_modified = client.get(f"/feed/{client.username}", headers={'If-None-Match': etag})
+    assert not_modified.status_code == 304
+    assert not_modified.data == b''
+
+    since = client.get(f"/feed/{client.username}", headers={'If-Modified-Since': first.headers['Last-Modified']})
+    assert since.status_code == 304
+    assert len(renders) == 1
+
+
+def test_delete_invalidates_feed(web_app, client, monkeypatch, add_episodes):
+    renders = count_renders(web_app, monkeypatch)
+    [episode_id] = add_episodes(client.username, title='Doomed')
+
+    etag = client.get(f"/feed/{client.username}").headers['ETag']
+    client.post(f"/delete_episode/{episode_id}")
+
+    response = client.get(f"/feed/{client.username}", headers={'If-None-Match': etag})
+    assert response.status_code == 200
+    assert b'Doomed' not in response.data
+    assert len(renders) == 2
+
+
+def test_lru_evicts_oldest_and_ignores_stale_renders():
+    cache = LRUFeedCache(max_entries=2)
+    for user_id in (1, 2, 3):
+        cache.set(user_id, '', make_entry(b'feed'), cache.generation(user_id))
+    assert cache.get(1) is None
+    assert cache.get(3) is not None
+
+    generation = cache.generation(2)
+    cache.invalidate(2)
+    assert cache.set(2, '', make_entry(b'old feed'), generation) is False
+    assert cache.get(2) is None
+
+
+def test_file_cache_is_shared_between_instances(tmp_path):
+    writer = FileFeedCache(tmp_path)
+    reader = FileFeedCache(tmp_path)
+
+    entry = make_entry(b'<rss/>', last_modified=1700000000)
+    assert writer.set(7, 'http://a/feed/x', entry, writer.generation(7))
+    assert reader.get(7, 'http://a/feed/x') == entry
+    assert reader.get(7, 'http://b/feed/x') is None
+
+    generation = reader.generation(7)
+    writer.invalidate(7)
+    assert reader.get(7, 'http://a/feed/x') is None
+    assert reader.set(7, 'http://a/feed/x', entry, generation) is False
+
+
+def fake_brotli(monkeypatch):
+    """stand-in for the optional brotli package (not a real br stream)"""
+    module = types.SimpleNamespace(MODE_TEXT=1, compress=lambda body, mode, quality: b'br:' + zlib.compress(body, 9))
+    monkeypatch.setattr(feed_writer, 'brotli', module)
+
+
+def test_feed_is_served_compressed(web_app, client, add_episodes):
+    add_episodes(client.username, 3)
+
+    plain = client.get(f"/feed/{client.username}")
+    assert 'Content-Encoding' not in plain.headers
+    assert 'Accept-Encoding' in plain.vary
+
+    compressed = client.get(f"/feed/{client.username}", headers={'Accept-Encoding': 'gzip, deflate'})
+    assert compressed.headers['Content-Encoding'] == 'gzip'
+    assert 'Accept-Encoding' in compressed.vary
+    assert gzip.decompress(compressed.data) == plain.data
+    assert len(compressed.data) < len(plain.data)
+    # different bytes, different validator
+    assert compressed.headers['ETag'] != plain.headers['ETag']
+
+    not_modified = client.get(f"/feed/{client.username}", headers={
+        'Accept-Encoding': 'gzip', 'If-None-Match': compressed.headers['ETag']})
+    assert not_modified.status_code == 304
+
+    refused = client.get(f"/feed/{client.username}", headers={'Accept-Encoding': 'gzip;q=0'})
+    assert refused.data == plain.data
+
+
+def test_brotli_is_preferred_when_installed(monkeypatch):
+    fake_brotli(monkeypatch)
+    entry = make_entry(b'<rss>' + b'<item>same old</item>' * 50 + b'</rss>')
+    assert set(entry.encoded) == {'br', 'gzip'}
+
+    body, encoding, etag = negotiate(entry, parse_accept_header('gzip, deflate, br'))
+    assert (encoding, etag) == ('br', f"{entry.etag}-br")
+    assert negotiate(entry, parse_accept_header('br;q=0.5, gzip'))[1] == 'gzip'
+    assert negotiate(entry, parse_accept_header('identity')) == (entry.body, None, entry.etag)
+    # tiny feeds aren't worth it
+    assert make_entry(b'<rss/>').encoded == {}
+
+
+def test_file_cache_keeps_compressed_variants(tmp_path, monkeypatch):
+    fake_brotli(monkeypatch)
+    cache = FileFeedCache(tmp_path)
+    entry = make_entry(b'<rss>' + b'<item>x</item>' * 100 + b'</rss>', last_modified=1700000000)
+    cache.set(3, '', entry, cache.generation(3))
+    assert cache.get(3) == entry
+
+    # a compressed copy that doesn't match what was cached is dropped, not served
+    (next(tmp_path.glob('3/*.xml.gz'))).write_bytes(gzip.compress(b'<rss>other</rss>'))
+    assert set(cache.get(3).encoded) == {'br'}
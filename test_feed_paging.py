@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+"""
+Tests for RFC 5005 feed paging: item limit on the main feed plus archive pages
+"""
+
+import xml.etree.ElementTree as ET
+from urllib.parse import urlsplit
+
+ATOM = '{http://www.w3.org/2005/Atom}'
+FH = '{http://purl.org/syndication/history/1.0}'
+
+
+def parse(response):
+    channel = ET.fromstring(response.data).find('channel')
+    titles = [item.findtext('title') for item in channel.findall('item')]
+    links = {link.get('rel'): link.get('href') for link in channel.findall(f'{ATOM}link')}
+    return channel, titles, links
+
+
+def local(url):
+    parts = urlsplit(url)
+    return f"{parts.path}?{parts.query}" if parts.query else parts.path
+
+
+def configure(web_app, monkeypatch, limit=3, page_size=2):
+    monkeypatch.setitem(web_app.app.config, 'FEED_ITEM_LIMIT', limit)
+    monkeypatch.setitem(web_app.app.config, 'FEED_ARCHIVE_PAGE_SIZE', page_size)
+
+
+def test_main_feed_is_limited_and_archives_cover_the_rest(web_app, client, monkeypatch, add_episodes):
+    configure(web_app, monkeypatch)
+    add_episodes(client.username, 8)
+
+    _, titles, links = parse(client.get(f"/feed/{client.username}"))
+    assert sorted(titles) == ['Episode 5', 'Episode 6', 'Episode 7']
+    assert 'prev-archive' in links
+
+    seen = list(titles)
+    pages = []
+    url = links['prev-archive']
+    while url:
+        response = client.get(local(url))
+        assert response.status_code == 200
+        channel, titles, links = parse(response)
+        assert channel.find(f'{FH}archive') is not None
+        assert links['current'].endswith(f"/feed/{client.username}")
+        pages.append(sorted(titles))
+        seen.extend(titles)
+        url = links.get('prev-archive')
+
+    # newest archive page first, oldest page last
+    assert pages == [['Episode 4'], ['Episode 2', 'Episode 3'], ['Episode 0', 'Episode 1']]
+    assert sorted(seen) == sorted(f"Episode {i}" for i in range(8))
+
+
+def test_archive_pages_are_immutable_until_their_episodes_change(web_app, client, monkeypatch, add_episodes):
+    configure(web_app, monkeypatch)
+    add_episodes(client.username, 8)
+
+    _, _, links = parse(client.get(f"/feed/{client.username}"))
+    newest_archive = links['prev-archive']
+    _, _, archive_links = parse(client.get(local(newest_archive)))
+    oldest_archive = local(archive_links['prev-archive'])
+    oldest_archive = local(parse(client.get(oldest_archive))[2]['prev-archive'])
+
+    response = client.get(oldest_archive)
+    assert 'immutable' in response.headers['Cache-Control']
+    assert 'max-age=31536000' in response.headers['Cache-Control']
+    assert client.get(oldest_archive, headers={'If-None-Match': response.headers['ETag']}).status_code == 304
+
+    # without the version the page still works but has to be revalidated
+    unversioned = client.get(oldest_archive.split('?')[0])
+    assert 'no-cache' in unversioned.headers['Cache-Control']
+    assert unversioned.data == response.data
+
+    # a new episode pushes one more into the archive: the partial page gets a
+    # new URL, the full pages keep theirs and their bytes
+    add_episodes(client.username, 1, start=8)
+    _, _, links = parse(client.get(f"/feed/{client.username}"))
+    assert links['prev-archive'] != newest_archive
+    assert client.get(oldest_archive).data == response.data
+
+
+def test_no_archives_when_limit_disabled(web_app, client, monkeypatch, add_episodes):
+    configure(web_app, monkeypatch, limit=0)
+    add_episodes(client.username, 5)
+
+    _, titles, links = parse(client.get(f"/feed/{client.username}"))
+    assert len(titles) == 5
+    assert 'prev-archive' not in links
+    assert client.get(f"/feed/{client.username}/archive/1").status_code == 404
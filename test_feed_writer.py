@@ -0,0 +1,163 @@
+#!/usr/bin/env python3
+"""
+Tests for the streaming RSS writer - its output has to match what feedgen
+used to produce for the same episodes
+"""
+
+import re
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from feedgen.feed import FeedGenerator
+
+from feed_cache import NullFeedCache
+from feed_writer import FeedWriter, render_item
+from yt2podcast import YT2Podcast
+
+
+def without_build_date(xml):
+    return re.sub(rb'<lastBuildDate>[^<]*</lastBuildDate>', b'', xml)
+
+
+def cli_episode(n):
+    return {
+        'title': f"Episode {n} & <friends>",
+        'description': f"Line one\r\nQuotes \"here\" & 'there' <b>{n}</b> – ünïcode" if n % 3 else '',
+        'duration': [0, 59, 3700][n % 3] + n,
+        'upload_date': f"202401{n:02d}" if n % 2 else 'garbage',
+        'uploader': 'Some "Uploader"' if n % 4 else None,
+        'filename': f"Episode {n}.{'m4a' if n % 5 == 0 else 'mp3'}",
+        'file_size': 1000 + n,
+        'download_date': f"2025-07-{n:02d}T16:49:44.644945+00:00",
+        'video_url': f"https://www.youtube.com/watch?v=vid{n}",
+        'audio_url': f"https://example.com/episodes/Episode {n} & co.mp3?x=\"1\"",
+    }
+
+
+def feedgen_cli_feed(podcast):
+    """what generate_rss_feed wrote when it still went through feedgen"""
+    fg = FeedGenerator()
+    fg.load_extension('podcast')
+    fg.title('My YouTube Podcast')
+    fg.description('A podcast feed generated from YouTube videos')
+    fg.link(href=f"{podcast.base_url}/rss.xml", rel='self')
+    fg.language('en')
+    fg.author(name='YT2Podcast', email='warriorsplash1@gmail.com')
+    fg.subtitle('YouTube videos as podcast episodes')
+    fg.logo(f"{podcast.base_url}/logo.png")
+    fg.category({'term': 'Technology', 'scheme': 'https://itunes.apple.com/us/genre/podcasts-technology/id1310'})
+    fg.podcast.itunes_owner(name='YT2Podcast', email='warriorsplash1@gmail.com')
+    for episode_data in podcast.metadata.values():
+        fe = fg.add_entry()
+        fe.title(episode_data['title'])
+        fe.description(episode_data['description'])
+        fe.link(href=episode_data['audio_url'])
+        fe.published(podcast._published_date(episode_data))
+        fe.podcast.itunes_author(episode_data['uploader'])
+        fe.podcast.itunes_duration(podcast._format_duration(episode_data['duration']))
+        fe.podcast.itunes_summary(episode_data['description'])
+        fe.enclosure(episode_data['audio_url'], str(episode_data['file_size']), podcast._mime_type(episode_data))
+    return fg.rss_str(pretty=False)
+
+
+@pytest.mark.parametrize('incremental', [True, False])
+def test_cli_feed_matches_feedgen(tmp_path, monkeypatch, incremental):
+    monkeypatch.chdir(tmp_path)
+    podcast = YT2Podcast(base_url='https://example.com/a&b')
+    for n in range(1, 13):
+        podcast.metadata[f"hash{n}"] = cli_episode(n)
+
+    podcast.generate_rss_feed(incremental=incremental)
+    assert without_build_date(podcast.rss_file.read_bytes()) == without_build_date(feedgen_cli_feed(podcast))
+
+
+def test_empty_feed_matches_feedgen(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    podcast = YT2Podcast(base_url='https://example.com')
+    podcast.generate_rss_feed()
+    assert without_build_date(podcast.rss_file.read_bytes()) == without_build_date(feedgen_cli_feed(podcast))
+
+
+def feedgen_user_feed(username, feed_url, episodes):
+    """what /feed/<username> served when it still went through feedgen"""
+    fg = FeedGenerator()
+    fg.load_extension('podcast')
+    fg.title(f'{username}\'s Personal Podcast')
+    fg.description(f'A personal podcast feed for {username}')
+    fg.link(href=feed_url, rel='self')
+    fg.language('en')
+    fg.author(name=username)
+    fg.subtitle(f'YouTube videos curated by {username}')
+    fg.category({'term': 'Personal', 'scheme': 'https://itunes.apple.com/us/genre/podcasts-personal/id1305'})
+    for episode in episodes:
+        fe = fg.add_entry()
+        fe.title(episode.title)
+        fe.description(episode.description)
+        fe.link(href=episode.audio_url)
+        published = episode.download_date.replace(tzinfo=timezone.utc)
+        if episode.upload_date:
+            try:
+                published = datetime.strptime(episode.upload_date, '%Y%m%d').replace(tzinfo=timezone.utc)
+            except ValueError:
+                pass
+        fe.published(published)
+        fe.podcast.itunes_author(episode.uploader or 'Unknown')
+        fe.podcast.itunes_duration(web_format_duration(episode.duration))
+        fe.podcast.itunes_summary(episode.description)
+        fe.enclosure(episode.audio_url, str(episode.file_size), episode.mime_type or 'audio/mpeg')
+    return fg.rss_str()
+
+
+def web_format_duration(seconds):
+    import app as web
+    return web._format_duration(seconds)
+
+
+@pytest.mark.parametrize('streamed', [False, True])
+def test_user_feed_matches_feedgen(web_app, client, monkeypatch, streamed):
+    monkeypatch.setitem(web_app.app.config, 'FEED_ITEM_LIMIT', 0)
+    if streamed:
+        monkeypatch.setattr(web_app, 'feed_cache', NullFeedCache())
+
+    with web_app.app.app_context():
+        user_id = web_app.User.query.filter_by(username=client.username).one().id
+        for n in range(1, 9):
+            web_app.db.session.add(web_app.Episode(
+                user_id=user_id, title=f"Talk {n} <&>", description=cli_episode(n)['description'] or None,
+                duration=[None, 61, 4000][n % 3], upload_date=['', '20240105', 'bad'][n % 3],
+                uploader=None if n % 2 else 'Up "loader"', file_size=1000 * n,
+                download_date=datetime(2024, 3, 1) + timedelta(hours=n),
+                audio_url=f"http://localhost/episode/{user_id}/Talk {n}.mp3",
+                mime_type='audio/x-m4a' if n == 4 else None,
+            ))
+        web_app.db.session.commit()
+
+    response = client.get(f"/feed/{client.username}")
+    assert response.status_code == 200
+    # a streamed feed can't know its ETag up front
+    assert ('ETag' in response.headers) != streamed
+
+    with web_app.app.app_context():
+        episodes = web_app.Episode.query.filter_by(user_id=user_id).order_by(
+            web_app.Episode.download_date.desc()).all()
+        expected = feedgen_user_feed(client.username, f"http://localhost/feed/{client.username}", episodes)
+    assert without_build_date(response.data) == without_build_date(expected)
+
+
+def test_stream_is_lazy():
+    consumed = []
+
+    def items():
+        for n in range(3):
+            consumed.append(n)
+            yield render_item(f"t{n}", 'http://x/a.mp3', None, 'http://x/a.mp3', 1, 'audio/mpeg',
+                              datetime(2024, 1, 1, tzinfo=timezone.utc))
+
+    writer = FeedWriter(title='t', description='d', self_url='http://x/feed')
+    stream = writer.stream(items())
+    head = next(stream)
+    assert head.endswith(b'</lastBuildDate>')
+    assert consumed == []
+    assert next(stream).startswith(b'<item><title>t0</title>')
+    assert consumed == [0]
+    assert b''.join(stream).endswith(b'</channel></rss>')
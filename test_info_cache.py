@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+"""
+Tests for the yt-dlp info cache and how downloads use it
+"""
+
+import time
+
+import yt_dlp
+
+import info_cache
+from info_cache import InfoCache, stream_url_expiry
+from yt2podcast import YT2Podcast
+import yt2podcast
+
+URL = 'https://www.youtube.com/watch?v=abcdefghijk'
+
+
+class CachingYDL:
+    """fake YoutubeDL with the extract and process halves yt-dlp has
+
+    process_errors are raised by process_ie_result, one per call, before it
+    starts working
+    """
+
+    extracts = []
+    process_errors = []
+
+    def __init__(self, opts):
+        self.opts = opts
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def extract_info(self, url, download=True, process=True):
+        assert not download and not process
+        CachingYDL.extracts.append(url)
+        return {'id': 'abcdefghijk', 'extractor_key': 'Youtube', 'title': 'Cached', 'duration': 60,
+                'formats': [{'url': 'https://rr1.googlevideo.com/videoplayback?expire=%d' % (time.time() + 6 * 3600)}],
+                'automatic_captions': {'en': ['lots of data']}}
+
+    def process_ie_result(self, info, download=True):
+        if CachingYDL.process_errors:
+            raise CachingYDL.process_errors.pop(0)
+        path = self.opts['outtmpl'].replace('%(title)s', info['title']).replace('%(ext)s', 'mp3')
+        with open(path, 'wb') as f:
+            f.write(b'ID3 fake audio')
+        return dict(info, requested_downloads=[{'filepath': path}])
+
+
+def caching_ydl(monkeypatch, *process_errors):
+    CachingYDL.extracts = []
+    CachingYDL.process_errors = list(process_errors)
+    monkeypatch.setattr(yt2podcast.yt_dlp, 'YoutubeDL', CachingYDL)
+    monkeypatch.setattr(yt2podcast.time, 'sleep', lambda seconds: None)
+
+
+def test_put_get_and_invalidate(tmp_path):
+    cache = InfoCache(tmp_path / 'info.db')
+    assert cache.get('abc') is None
+    assert cache.put('abc', {'id': 'abc', 'title': 'T', 'subtitles': {'en': []}})
+    assert cache.get('abc') == {'id': 'abc', 'title': 'T'}
+    assert 'abc' in cache and len(cache) == 1
+
+    # persistent, another process (or a restart) sees it
+    assert InfoCache(tmp_path / 'info.db').get('abc')['title'] == 'T'
+
+    assert cache.invalidate('abc') is True
+    assert cache.invalidate('abc') is False
+    assert cache.get('abc') is None
+
+
+def test_entries_expire(tmp_path, monkeypatch):
+    now = [1_000_000.0]
+    monkeypatch.setattr(info_cache.time, 'time', lambda: now[0])
+    cache = InfoCache(tmp_path / 'info.db', ttl=3600)
+    cache.put('abc', {'id': 'abc'})
+    # stream URLs good for 40 more minutes, minus the safety margin
+    cache.put('soon', {'id': 'soon', 'formats': [
+        {'url': 'https://rr1.googlevideo.com/videoplayback?expire=%d&sig=x' % (now[0] + 40 * 60)},
+        {'url': 'https://example.com/no-expiry.m4a'},
+    ]})
+    # already as good as expired, not worth keeping
+    assert not cache.put('stale', {'id': 'stale', 'url': 'https://x.googlevideo.com/videoplayback?expire=%d' % now[0]})
+
+    now[0] += 11 * 60
+    assert cache.get('abc') is not None
+    assert cache.get('soon') is None
+    now[0] += 3600
+    assert cache.get('abc') is None
+    assert len(cache) == 0
+
+
+def test_least_recently_used_are_evicted(tmp_path, monkeypatch):
+    now = [1_000_000.0]
+    monkeypatch.setattr(info_cache.time, 'time', lambda: now[0])
+    cache = InfoCache(tmp_path / 'info.db', max_entries=2)
+    for key in ('a', 'b'):
+        cache.put(key, {'id': key})
+        now[0] += 1
+    cache.get('a')
+    now[0] += 1
+    cache.put('c', {'id': 'c'})
+    assert 'a' in cache and 'c' in cache and 'b' not in cache
+
+
+def test_stream_url_expiry():
+    assert stream_url_expiry({'formats': [{'url': 'https://a/videoplayback?expire=200'},
+                                          {'url': 'https://a/videoplayback?expire=100'}]}) == 100
+    assert stream_url_expiry({'url': 'https://a/videoplayback/expire/300/sig/x/file.m4a'}) == 300
+    assert stream_url_expiry({'formats': [{'url': 'https://a/b.m4a'}]}) is None
+
+
+def test_retries_and_repeat_downloads_skip_extraction(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    caching_ydl(monkeypatch, yt_dlp.utils.DownloadError('ERROR: Connection reset by peer'))
+    cache = InfoCache(tmp_path / 'info.db')
+    podcast = YT2Podcast(base_url='https://example.com', info_cache=cache, retries=2)
+
+    assert podcast.download_video(URL)['title'] == 'Cached'
+    # the retry after the dropped connection used the cached info
+    assert CachingYDL.extracts == [URL]
+    assert podcast.metrics.info_cache.value(result='hit') == 1
+
+    # a fresh library (or another user in the web app) downloading it again
+    other = YT2Podcast(base_url='https://example.com', metadata_file='other.json', info_cache=cache)
+    other.episodes_dir = tmp_path / 'other'
+    other.episodes_dir.mkdir()
+    assert other.download_video(URL) is not None
+    assert CachingYDL.extracts == [URL]
+
+
+def test_expired_stream_urls_are_extracted_again(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    caching_ydl(monkeypatch)
+    cache = InfoCache(tmp_path / 'info.db')
+    cache.put('abcdefghijk', CachingYDL({}).extract_info(URL, download=False, process=False))
+    CachingYDL.extracts = []
+    CachingYDL.process_errors = [yt_dlp.utils.DownloadError('ERROR: unable to download video data: HTTP Error 403: Forbidden')]
+
+    # no retries left, but a stale cache entry isn't the server's fault
+    podcast = YT2Podcast(base_url='https://example.com', info_cache=cache, retries=0)
+    assert podcast.download_video(URL) is not None
+    assert CachingYDL.extracts == [URL]
+    assert podcast.metrics.info_cache.value(result='expired') == 1
+
+
+def test_permanent_failures_are_not_cached(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    caching_ydl(monkeypatch, yt_dlp.utils.DownloadError('ERROR: Requested format is not available'))
+    cache = InfoCache(tmp_path / 'info.db')
+    podcast = YT2Podcast(base_url='https://example.com', info_cache=cache)
+
+    assert podcast.download_video(URL) is None
+    assert 'abcdefghijk' not in cache
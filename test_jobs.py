@@ -0,0 +1,221 @@
+#!/usr/bin/env python3
+"""
+Tests for the background download queue behind /add_video: workers,
+lanes, fair ordering between users and concurrency caps
+"""
+
+import re
+from datetime import datetime, timedelta
+
+from jobs import QUEUED, RUNNING, DONE, FAILED, INTERACTIVE, MANUAL, BULK
+from yt2podcast import DownloadResult, PermanentDownloadError
+
+
+def fake_fetch(self, url, video_key=None):
+    path = self.output_dir / 'fake.mp3'
+    path.write_bytes(b'ID3' + b'\0' * 64)
+    return DownloadResult(
+        path=path,
+        video_url=url,
+        video_id=None,
+        title='Fake Episode',
+        file_size=67,
+        description='made up',
+        duration=61,
+        upload_date='20240101',
+        uploader='Tester',
+    )
+
+
+def failed_fetch(self, url, video_key=None):
+    raise PermanentDownloadError('ERROR: Private video', reason='private')
+
+
+def test_add_video_returns_immediately_and_worker_finishes_it(web_app, client, monkeypatch):
+    monkeypatch.setattr(web_app.DownloadEngine, 'fetch', fake_fetch)
+    monkeypatch.setattr(web_app.download_queue, 'start', lambda: None)
+
+    response = client.post('/add_video', data={'video_url': 'https://youtube.com/watch?v=abc'})
+    assert response.status_code == 302
+
+    jobs = client.get('/jobs').get_json()['jobs']
+    assert [job['status'] for job in jobs] == [QUEUED]
+
+    with web_app.app.app_context():
+        assert web_app.download_queue.run_pending() == 1
+
+    job = client.get(f"/jobs/{jobs[0]['id']}").get_json()
+    assert job['status'] == DONE
+    assert job['episode_id'] is not None
+    assert client.get('/jobs?active=1').get_json()['jobs'] == []
+
+
+def test_failed_download_marks_job_failed(web_app, client, monkeypatch):
+    monkeypatch.setattr(web_app.DownloadEngine, 'fetch', failed_fetch)
+    monkeypatch.setattr(web_app.download_queue, 'start', lambda: None)
+
+    client.post('/add_video', data={'video_url': 'https://youtube.com/watch?v=broken'})
+    with web_app.app.app_context():
+        web_app.download_queue.run_pending()
+
+    job = client.get('/jobs').get_json()['jobs'][0]
+    assert job['status'] == FAILED
+    assert 'Failed to download' in job['error']
+
+
+def test_stale_running_job_is_requeued(web_app, client):
+    queue = web_app.download_queue
+    with web_app.app.app_context():
+        user = web_app.User.query.filter_by(username=client.username).first()
+        job = web_app.DownloadJob(
+            user_id=user.id, video_url='https://youtube.com/watch?v=dead',
+            status=RUNNING, attempts=1,
+            heartbeat_at=datetime.utcnow() - timedelta(seconds=queue.stale_after + 60),
+        )
+        web_app.db.session.add(job)
+        web_app.db.session.commit()
+
+        assert queue.requeue_stale() >= 1
+        assert web_app.db.session.get(web_app.DownloadJob, job.id).status == QUEUED
+
+        job.status = RUNNING
+        job.attempts = queue.max_attempts
+        job.heartbeat_at = datetime.utcnow() - timedelta(seconds=queue.stale_after + 60)
+        web_app.db.session.commit()
+        queue.requeue_stale()
+        assert web_app.db.session.get(web_app.DownloadJob, job.id).status == FAILED
+
+
+def test_jobs_of_other_users_are_hidden(web_app, client, monkeypatch):
+    monkeypatch.setattr(web_app.download_queue, 'start', lambda: None)
+    client.post('/add_video', data={'video_url': 'https://youtube.com/watch?v=mine'})
+    job_id = client.get('/jobs').get_json()['jobs'][0]['id']
+
+    other = web_app.app.test_client()
+    other.post('/register', data={'username': f"{client.username}x", 'email': f"{client.username}x@example.com", 'password': 'pw'})
+    other.post('/login', data={'username': f"{client.username}x", 'password': 'pw'})
+    assert other.get(f"/jobs/{job_id}").status_code == 403
+
+
+def make_users(web_app, *names, weights=None):
+    ids = []
+    for name in names:
+        user = web_app.User(username=name, email=f"{name}@example.com", download_weight=(weights or {}).get(name))
+        user.set_password('pw')
+        web_app.db.session.add(user)
+        web_app.db.session.commit()
+        ids.append(user.id)
+    return ids
+
+
+def queue_jobs(web_app, user_id, count, priority=MANUAL):
+    return [web_app.download_queue.enqueue(
+        priority=priority, user_id=user_id, video_url=f"https://youtube.com/watch?v={user_id}-{n}",
+    ).id for n in range(count)]
+
+
+def claim_order(web_app):
+    """user of every job in the order they get claimed, finishing each one before the next"""
+    Job = web_app.DownloadJob
+    order = []
+    while (job_id := web_app.download_queue._claim_next()) is not None:
+        job = web_app.db.session.get(Job, job_id)
+        order.append(job.user_id)
+        job.status = DONE
+        web_app.db.session.commit()
+    return order
+
+
+def test_users_take_turns_instead_of_first_come_first_served(web_app):
+    with web_app.app.app_context():
+        bulk_user, other = make_users(web_app, 'bulk', 'other')
+        queue_jobs(web_app, bulk_user, 4)
+        late = queue_jobs(web_app, other, 2)
+
+        job = web_app.db.session.get(web_app.DownloadJob, late[0])
+        assert web_app.download_queue.queue_position(job) == 2
+        jobs = web_app.DownloadJob.query.order_by(web_app.DownloadJob.id).all()
+        assert list(web_app.download_queue.queue_positions(jobs).values()) == [1, 3, 5, 6, 2, 4]
+        assert claim_order(web_app) == [bulk_user, other, bulk_user, other, bulk_user, bulk_user]
+
+
+def test_weights_give_bigger_shares(web_app):
+    with web_app.app.app_context():
+        heavy, light = make_users(web_app, 'heavy', 'light', weights={'heavy': 2.0})
+        queue_jobs(web_app, light, 3)
+        queue_jobs(web_app, heavy, 6)
+        assert claim_order(web_app)[:6] == [heavy, light, heavy, heavy, light, heavy]
+
+
+def test_lanes_go_in_order(web_app, monkeypatch):
+    monkeypatch.setattr(web_app.download_queue, 'max_running', 4)
+    with web_app.app.app_context():
+        (user,) = make_users(web_app, 'someone')
+        backfill = queue_jobs(web_app, user, 3, priority=BULK)
+        manual = queue_jobs(web_app, user, 1)
+        replay = queue_jobs(web_app, user, 1, priority=INTERACTIVE)
+
+        queue = web_app.download_queue
+        assert [queue._claim_next() for _ in range(2)] == replay + manual
+        web_app.DownloadJob.query.filter_by(status=RUNNING).update({'status': DONE})
+        web_app.db.session.commit()
+        assert queue._claim_next() == backfill[0]
+
+
+def test_per_user_and_global_caps(web_app, monkeypatch):
+    queue = web_app.download_queue
+    monkeypatch.setattr(queue, 'max_per_user', 1)
+    monkeypatch.setattr(queue, 'max_running', 2)
+    with web_app.app.app_context():
+        busy, waiting, third = make_users(web_app, 'busy', 'waiting', 'third')
+        queue_jobs(web_app, busy, 3)
+        queue_jobs(web_app, waiting, 1)
+        queue_jobs(web_app, third, 1)
+
+        first = queue._claim_next()
+        assert web_app.db.session.get(web_app.DownloadJob, first).user_id == busy
+        # busy's other jobs are further up the queue but busy is at the cap
+        second = queue._claim_next()
+        assert web_app.db.session.get(web_app.DownloadJob, second).user_id == waiting
+        # two running, that's the global cap
+        assert queue._claim_next() is None
+
+
+def test_interactive_jobs_skip_the_per_user_cap(web_app, monkeypatch):
+    queue = web_app.download_queue
+    monkeypatch.setattr(queue, 'max_per_user', 1)
+    monkeypatch.setattr(queue, 'max_running', 3)
+    with web_app.app.app_context():
+        (user,) = make_users(web_app, 'backfilling')
+        backfill = queue_jobs(web_app, user, 2, priority=BULK)
+        assert queue._claim_next() == backfill[0]
+        assert queue._claim_next() is None
+
+        # somebody's waiting to play this one
+        replay = queue_jobs(web_app, user, 1, priority=INTERACTIVE)
+        assert queue._claim_next() == replay[0]
+        assert queue._claim_next() is None
+
+
+def test_job_status_shows_lane_and_position(web_app, client, monkeypatch):
+    monkeypatch.setattr(web_app.download_queue, 'start', lambda: None)
+    for video_id in ('first', 'second'):
+        client.post('/add_video', data={'video_url': f"https://youtube.com/watch?v={video_id}"})
+
+    jobs = client.get('/jobs').get_json()['jobs']
+    assert [(job['lane'], job['queue_position']) for job in jobs] == [('manual', 2), ('manual', 1)]
+    assert b'queued #2' in client.get('/dashboard').data
+
+
+def test_dashboard_lists_the_jobs_it_polls_for(web_app, client, monkeypatch):
+    monkeypatch.setattr(web_app.download_queue, 'start', lambda: None)
+    with web_app.app.app_context():
+        user_id = web_app.User.query.filter_by(username=client.username).one().id
+        queue_jobs(web_app, user_id, web_app.JOB_LIST_LIMIT + 5)
+
+    polled = {job['id'] for job in client.get('/jobs?active=1').get_json()['jobs']}
+    page = client.get('/dashboard').data.decode()
+    shown = {int(job_id) for job_id in re.findall(r'data-job-id="(\d+)"', page)}
+    # otherwise the page reloads forever waiting for jobs it never gets back
+    assert shown == polled
+    assert f"Processing ({web_app.JOB_LIST_LIMIT + 5})" in page
@@ -0,0 +1,52 @@
+#!/usr/bin/env python3
+"""
+Smoke test for loadtest.py - one tiny level against the test database
+"""
+
+import json
+
+import yt2podcast
+import loadtest
+
+
+def test_fake_audio_is_deterministic():
+    assert loadtest.fake_audio('lt000000001', 5000) == loadtest.fake_audio('lt000000001', 5000)
+    assert loadtest.fake_audio('lt000000001', 5000) != loadtest.fake_audio('lt000000002', 5000)
+    assert len(loadtest.fake_audio('lt000000001', 5000)) == 5000
+
+
+def test_percentile():
+    values = [0.1 * n for n in range(1, 101)]
+    assert loadtest.percentile(values, 50) == values[49]
+    assert loadtest.percentile(values, 99) == values[98]
+    assert loadtest.percentile([], 95) is None
+
+
+def test_run_level_end_to_end(web_app, monkeypatch):
+    monkeypatch.setattr(yt2podcast.yt_dlp, 'YoutubeDL', loadtest.FakeExtractor)
+    monkeypatch.setattr(loadtest.FakeExtractor, 'extract_latency', 0)
+    monkeypatch.setattr(loadtest.FakeExtractor, 'fetch_latency', 0)
+    monkeypatch.setattr(loadtest.FakeExtractor, 'postprocess_latency', 0)
+    monkeypatch.setattr(loadtest.FakeExtractor, 'audio_bytes', 100_000)
+    monkeypatch.setattr(web_app.download_queue, 'workers', 2)
+
+    try:
+        summary = loadtest.run_level(web_app, concurrency=2, videos_per_user=2, shared_videos=0.5,
+                                     feed_poll_interval=0, timeout=30)
+    finally:
+        web_app.download_queue.stop(timeout=10)
+
+    assert summary['errors'] == 0, summary['routes']
+    assert summary['failed_jobs'] == 0
+    assert summary['videos'] == 4
+    routes = summary['routes']
+    assert routes['POST /add_video']['requests'] == 4
+    # two episodes per user, two Range requests each
+    assert routes['GET /episode (range)']['requests'] == 8
+    assert routes['GET /feed (conditional)']['requests'] == 2
+    assert summary['throughput'] > 0
+    json.dumps(summary)
+
+    # the shared video was only converted once
+    with web_app.app.app_context():
+        assert web_app.AudioBlob.query.count() == 3
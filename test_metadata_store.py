@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+"""
+Tests for the JSON and SQLite episode metadata stores
+"""
+
+import json
+import sqlite3
+import threading
+
+from metadata_store import (
+    JSONMetadataStore, SQLiteMetadataStore, open_metadata_store, migrate_json_to_sqlite,
+)
+from yt2podcast import YT2Podcast
+
+
+def episode(n):
+    return {'title': f"Episode {n} – ü", 'upload_date': f"2024010{n}", 'download_date': '2025-01-01T00:00:00+00:00'}
+
+
+def test_stores_behave_like_the_old_dict(tmp_path):
+    for store in (JSONMetadataStore(tmp_path / 'meta.json'), SQLiteMetadataStore(tmp_path / 'meta.db')):
+        for n in (3, 1, 2):
+            store[f"h{n}"] = episode(n)
+        store['h1'] = dict(episode(1), title='updated')
+
+        assert list(store) == ['h3', 'h1', 'h2']
+        assert 'h1' in store and 'nope' not in store
+        assert store['h1']['title'] == 'updated'
+        assert len(store) == 3
+
+        del store['h3']
+        assert [key for key, _ in store.items()] == ['h1', 'h2']
+        store.flush()
+        store.close()
+
+
+def test_json_store_flushes_atomically_in_old_format(tmp_path):
+    path = tmp_path / 'episodes_metadata.json'
+    store = JSONMetadataStore(path)
+    store['abc'] = episode(1)
+    store.flush()
+
+    assert json.loads(path.read_text(encoding='utf-8')) == {'abc': episode(1)}
+    assert JSONMetadataStore(path)['abc'] == episode(1)
+    assert [p.name for p in tmp_path.iterdir() if p.name.startswith('.')] == []
+
+
+def test_sqlite_store_uses_wal_and_indexes(tmp_path):
+    store = SQLiteMetadataStore(tmp_path / 'meta.db')
+    store['abc'] = episode(1)
+
+    conn = sqlite3.connect(tmp_path / 'meta.db')
+    assert conn.execute('PRAGMA journal_mode').fetchone()[0] == 'wal'
+    indexes = [row[1] for row in conn.execute("PRAGMA index_list('episodes')")]
+    assert 'ix_episodes_upload_date' in indexes
+    plan = conn.execute("EXPLAIN QUERY PLAN SELECT data FROM episodes WHERE video_hash = 'abc'").fetchall()
+    assert 'INDEX' in str(plan)
+
+
+def test_sqlite_store_handles_concurrent_writers(tmp_path):
+    path = tmp_path / 'meta.db'
+    stores = [SQLiteMetadataStore(path) for _ in range(3)]
+
+    def write(store, offset):
+        for n in range(50):
+            store[f"{offset}-{n}"] = episode(n % 9 + 1)
+
+    threads = [threading.Thread(target=write, args=(store, i)) for i, store in enumerate(stores)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(SQLiteMetadataStore(path)) == 150
+
+
+def test_migrate_json_to_sqlite(tmp_path):
+    source = JSONMetadataStore(tmp_path / 'episodes_metadata.json')
+    for n in (2, 1):
+        source[f"h{n}"] = episode(n)
+    source.flush()
+
+    assert migrate_json_to_sqlite(tmp_path / 'episodes_metadata.json', tmp_path / 'episodes.db') == 2
+    # running it twice doesn't duplicate anything
+    assert migrate_json_to_sqlite(tmp_path / 'episodes_metadata.json', tmp_path / 'episodes.db') == 2
+
+    store = open_metadata_store(tmp_path / 'episodes.db')
+    assert isinstance(store, SQLiteMetadataStore)
+    assert dict(store.items()) == {'h2': episode(2), 'h1': episode(1)}
+    assert list(store) == ['h2', 'h1']
+
+
+def test_yt2podcast_picks_store_from_extension(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    assert isinstance(YT2Podcast().metadata, JSONMetadataStore)
+    assert isinstance(YT2Podcast(metadata_file='episodes.db').metadata, SQLiteMetadataStore)
+
+
+def test_pending_downloads_survive_reopening(tmp_path):
+    for path in (tmp_path / 'meta.json', tmp_path / 'meta.db'):
+        store = open_metadata_store(path)
+        store.mark_pending('h1', {'video_url': 'https://youtu.be/one'})
+        store.mark_pending('h2', {'video_url': 'https://youtu.be/two'})
+        store.clear_pending('h1')
+        store.clear_pending('never-started')
+        store.close()
+
+        # written straight away, no flush() needed
+        reopened = open_metadata_store(path)
+        assert reopened.pending() == {'h2': {'video_url': 'https://youtu.be/two'}}
+        assert len(reopened) == 0
+        reopened.clear_pending('h2')
+        assert reopened.pending() == {}
+        reopened.close()
+
+    # the JSON store keeps its episodes file in the old format
+    assert not (tmp_path / 'meta.json').exists()
+    assert not (tmp_path / 'meta.pending.json').exists()
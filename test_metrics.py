@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+"""
+Tests for the metrics registry, YT2Podcast's instrumentation and /metrics
+"""
+
+import json
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+import pytest
+import yt_dlp
+
+import yt2podcast
+from metrics import MetricsRegistry
+from test_download import FakeYoutubeDL
+from yt2podcast import YT2Podcast, failure_reason
+
+
+def test_prometheus_text_format():
+    registry = MetricsRegistry()
+    registry.counter('jobs_total', 'Jobs "done"\nso far', ['status']).inc(2, status='o"k')
+    registry.gauge('in_flight', 'Running').set(3)
+    histogram = registry.histogram('render_seconds', 'Render time', buckets=(0.1, 1))
+    histogram.observe(0.05)
+    histogram.observe(5)
+
+    assert registry.render().splitlines() == [
+        '# HELP in_flight Running',
+        '# TYPE in_flight gauge',
+        'in_flight 3',
+        '# HELP jobs_total Jobs "done"\\nso far',
+        '# TYPE jobs_total counter',
+        'jobs_total{status="o\\"k"} 2',
+        '# HELP render_seconds Render time',
+        '# TYPE render_seconds histogram',
+        'render_seconds_bucket{le="0.1"} 1',
+        'render_seconds_bucket{le="1"} 1',
+        'render_seconds_bucket{le="+Inf"} 2',
+        'render_seconds_sum 5.05',
+        'render_seconds_count 2',
+    ]
+
+
+def test_registry_rejects_mismatched_labels():
+    registry = MetricsRegistry()
+    counter = registry.counter('x_total', 'X', ['reason'])
+    assert registry.counter('x_total', 'X', ['reason']) is counter
+    with pytest.raises(ValueError):
+        registry.counter('x_total', 'X', ['other'])
+    with pytest.raises(ValueError):
+        counter.inc(wrong='label')
+    with pytest.raises(ValueError):
+        counter.inc(-1, reason='r')
+
+
+def test_download_records_phase_timings(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(yt2podcast.yt_dlp, 'YoutubeDL', FakeYoutubeDL)
+    registry = MetricsRegistry()
+
+    podcast = YT2Podcast(base_url='https://example.com', metrics=registry)
+    podcast.download_video('https://www.youtube.com/watch?v=abcdefghijk')
+    podcast.download_video('https://youtu.be/abcdefghijk')
+    podcast.generate_rss_feed()
+
+    assert podcast.metrics.downloads.value(result='ok') == 1
+    assert podcast.metrics.downloads.value(result='cached') == 1
+    assert podcast.metrics.extract_seconds.count() == 1
+    assert podcast.metrics.download_seconds.count() == 1
+    assert podcast.metrics.postprocess_seconds.count() == 1
+    assert podcast.metrics.feed_render_seconds.count(source='cli') == 1
+    assert podcast.metrics.in_flight.value() == 0
+
+
+def test_process_batch_keeps_timings_out_of_the_metadata(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(yt2podcast.yt_dlp, 'YoutubeDL', FakeYoutubeDL)
+    # same code path as a real process pool, minus the pickling
+    monkeypatch.setattr(yt2podcast, 'ProcessPoolExecutor', ThreadPoolExecutor)
+
+    podcast = YT2Podcast(base_url='https://example.com')
+    [(_, episode_data, error)] = podcast.process_batch(
+        ['https://www.youtube.com/watch?v=abcdefghijk'], workers=1, use_processes=True)
+
+    assert error is None and 'timings' in episode_data
+    assert podcast.metrics.download_seconds.count() == 1
+    assert all('timings' not in episode for episode in podcast.metadata.values())
+    saved = json.loads(podcast.metadata_file.read_text())
+    assert all('timings' not in episode for episode in saved.values())
+
+
+def test_failures_are_counted_by_reason(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+
+    class PrivateYDL(FakeYoutubeDL):
+        def extract_info(self, url, download=True):
+            raise yt_dlp.utils.DownloadError('ERROR: [youtube] abcdefghijk: Private video')
+
+    monkeypatch.setattr(yt2podcast.yt_dlp, 'YoutubeDL', PrivateYDL)
+    podcast = YT2Podcast(base_url='https://example.com')
+    assert podcast.download_video('https://www.youtube.com/watch?v=abcdefghijk') is None
+    assert podcast.metrics.failures.value(reason='private') == 1
+    assert podcast.metrics.downloads.value(result='failed') == 1
+
+    assert failure_reason(FileNotFoundError('gone')) == 'missing_output'
+    assert failure_reason(yt_dlp.utils.DownloadError('ERROR: something odd')) == 'download_error'
+    assert failure_reason(ValueError('boom')) == 'other'
+
+
+def test_cli_writes_metrics_json(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(yt2podcast.yt_dlp, 'YoutubeDL', FakeYoutubeDL)
+    monkeypatch.setattr(sys, 'argv', [
+        'yt2podcast.py', '--metrics-json', 'metrics.json', 'https://www.youtube.com/watch?v=abcdefghijk',
+    ])
+
+    yt2podcast.main()
+
+    data = json.loads((tmp_path / 'metrics.json').read_text())
+    assert data['yt2podcast_downloads_total']['samples'] == [{'labels': {'result': 'ok'}, 'value': 1}]
+    assert data['yt2podcast_download_seconds']['samples'][0]['count'] == 1
+    assert data['yt2podcast_feed_render_seconds']['samples'][0]['labels'] == {'source': 'cli'}
+
+
+def test_metrics_endpoint(web_app, client, add_episodes):
+    add_episodes(client.username, title='Song', file_size=4096)
+    # the audio is gone from disk, it shouldn't count
+    add_episodes(client.username, title='Old song', file_size=8192, evicted_at=datetime(2024, 2, 1))
+
+    hits = web_app.feed_cache_lookups.value(result='hit')
+    misses = web_app.feed_cache_lookups.value(result='miss')
+    not_modified = web_app.not_modified_responses.value(route='feed')
+
+    first = client.get(f"/feed/{client.username}")
+    client.get(f"/feed/{client.username}", headers={'If-None-Match': first.headers['ETag']})
+
+    assert web_app.feed_cache_lookups.value(result='miss') == misses + 1
+    assert web_app.feed_cache_lookups.value(result='hit') == hits + 1
+    assert web_app.not_modified_responses.value(route='feed') == not_modified + 1
+
+    response = client.get('/metrics')
+    assert response.status_code == 200
+    assert response.mimetype == 'text/plain'
+    text = response.get_data(as_text=True)
+    assert f'yt2podcast_user_disk_bytes{{user="{client.username}"}} 4096' in text
+    assert '# TYPE yt2podcast_feed_render_seconds histogram' in text
+    assert 'yt2podcast_feed_render_seconds_count{source="web"}' in text
+    assert '# TYPE yt2podcast_downloads_in_flight gauge' in text
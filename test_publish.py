@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+"""
+Tests for publishing feeds and audio to a static folder incrementally
+"""
+
+import stat
+
+import pytest
+
+import atomic_file
+import publisher
+from publisher import SiteFile, StaticPublisher
+from yt2podcast import YT2Podcast
+
+
+def test_only_changes_are_written(tmp_path, monkeypatch):
+    audio = tmp_path / 'talk.mp3'
+    audio.write_bytes(b'ID3 audio')
+    site = StaticPublisher(tmp_path / 'site')
+
+    first = site.publish([SiteFile('rss.xml', b'<rss>1</rss>'), SiteFile('episodes/talk.mp3', audio)])
+    assert first == (['rss.xml', 'episodes/talk.mp3'], 0, [])
+    assert (tmp_path / 'site' / 'episodes' / 'talk.mp3').read_bytes() == b'ID3 audio'
+
+    # the audio's size and mtime haven't moved, so it isn't even read again
+    def no_hashing(path):
+        raise AssertionError(f"hashed {path}")
+
+    monkeypatch.setattr(publisher, 'file_sha256', no_hashing)
+    second = site.publish([SiteFile('rss.xml', b'<rss>2</rss>'), SiteFile('episodes/talk.mp3', audio)])
+    assert second == (['rss.xml'], 1, [])
+
+    third = site.publish([SiteFile('rss.xml', b'<rss>2</rss>')])
+    assert third == ([], 1, ['episodes/talk.mp3'])
+    assert not (tmp_path / 'site' / 'episodes').exists()
+    assert site.load_manifest()['last_run']['deleted'] == ['episodes/talk.mp3']
+
+
+def test_files_missing_from_the_output_are_written_again(tmp_path):
+    site = StaticPublisher(tmp_path / 'site')
+    site.publish([SiteFile('rss.xml', b'<rss/>')])
+    (tmp_path / 'site' / 'rss.xml').unlink()
+    assert site.publish([SiteFile('rss.xml', b'<rss/>')]).changed == ['rss.xml']
+
+
+def test_published_files_are_readable_by_other_users(tmp_path, monkeypatch):
+    # a web server or sync tool usually runs as someone else
+    monkeypatch.setattr(atomic_file, '_UMASK', 0o022)
+    audio = tmp_path / 'talk.mp3'
+    audio.write_bytes(b'ID3 audio')
+    site = StaticPublisher(tmp_path / 'site')
+    site.publish([SiteFile('rss.xml', b'<rss/>'), SiteFile('episodes/talk.mp3', audio)])
+
+    for path in ('rss.xml', 'episodes/talk.mp3'):
+        mode = stat.S_IMODE((tmp_path / 'site' / path).stat().st_mode)
+        assert mode & (stat.S_IRGRP | stat.S_IROTH) == stat.S_IRGRP | stat.S_IROTH, oct(mode)
+
+
+def test_paths_stay_inside_the_output(tmp_path):
+    site = StaticPublisher(tmp_path / 'site')
+    for path in ('../escape.xml', '/etc/passwd', '.publish-manifest.json'):
+        with pytest.raises(ValueError):
+            site.publish([SiteFile(path, b'x')])
+    with pytest.raises(ValueError):
+        site.publish([SiteFile('rss.xml', b'a'), SiteFile('rss.xml', b'b')])
+
+
+def test_cli_publish(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    podcast = YT2Podcast(base_url='https://example.com')
+    for n in range(2):
+        (podcast.episodes_dir / f"{n}.mp3").write_bytes(b'x' * 100)
+        podcast.metadata[f"h{n}"] = {
+            'title': f"Episode {n}", 'description': '', 'duration': 1, 'upload_date': '20240101',
+            'uploader': 'Me', 'filename': f"{n}.mp3", 'file_size': 100,
+            'download_date': '2024-01-01T00:00:00+00:00', 'video_url': 'https://youtu.be/x',
+            'audio_url': f"https://example.com/episodes/{n}.mp3",
+        }
+
+    result = podcast.publish(tmp_path / 'site')
+    assert sorted(result.changed)[:3] == ['episodes/0.mp3', 'episodes/1.mp3', 'rss.xml']
+
+    podcast.prune(keep_newest=1)
+    result = podcast.publish(tmp_path / 'site')
+    # the feed and its compressed copies
+    assert [path for path in result.changed if not path.startswith('rss.xml')] == []
+    assert result.deleted == ['episodes/0.mp3']
+
+
+def test_flask_publish_command(web_app, client, monkeypatch, tmp_path, add_videos):
+    monkeypatch.setitem(web_app.app.config, 'FEED_ITEM_LIMIT', 1)
+    monkeypatch.setitem(web_app.app.config, 'FEED_ARCHIVE_PAGE_SIZE', 1)
+    add_videos(client, 'one', 'two')
+    output = tmp_path / 'site'
+    runner = web_app.app.test_cli_runner()
+
+    result = runner.invoke(args=['publish', str(output), '--base-url', 'https://cdn.example.com/'])
+    assert 'Published to' in result.output, result.output
+    feed_dir = output / 'feed' / client.username
+    assert sorted(path.name for path in feed_dir.iterdir() if not path.name.endswith('.br')) == [
+        'rss-archive-1.xml', 'rss-archive-1.xml.gz', 'rss.xml', 'rss.xml.gz']
+    with web_app.app.app_context():
+        user_id = web_app.User.query.filter_by(username=client.username).one().id
+
+    feed = (output / 'feed' / client.username / 'rss.xml').read_text()
+    assert f"https://cdn.example.com/episode/{user_id}/two.mp3" in feed
+    assert f"https://cdn.example.com/feed/{client.username}/rss-archive-1.xml" in feed
+    assert (output / 'episode' / str(user_id) / 'one.mp3').exists()
+
+    # nothing changed, nothing to upload
+    result = runner.invoke(args=['publish', str(output), '--base-url', 'https://cdn.example.com/'])
+    assert '0 changed' in result.output and '0 deleted' in result.output, result.output
+
+
+def test_usernames_that_are_not_a_folder_are_left_out(web_app, client, tmp_path):
+    for bad in ('../escape', 'a/b', '.hidden'):
+        client.post('/register', data={'username': bad, 'email': f"{bad}@example.com", 'password': 'pw'})
+    with web_app.app.app_context():
+        assert web_app.User.query.filter(web_app.User.username.in_(['../escape', 'a/b', '.hidden'])).count() == 0
+        # from before registration checked them
+        for bad in ('../escape', 'a/b'):
+            web_app.db.session.add(web_app.User(username=bad, email=f"{bad}@example.com", password_hash='x'))
+        web_app.db.session.commit()
+
+    result = web_app.app.test_cli_runner().invoke(
+        args=['publish', str(tmp_path / 'site'), '--base-url', 'https://cdn.example.com/'])
+    assert "'../escape' can't be a folder name" in result.output, result.output
+    assert sorted(path.name for path in (tmp_path / 'site' / 'feed').iterdir()) == [client.username]
@@ -0,0 +1,180 @@
+#!/usr/bin/env python3
+"""
+Tests for download retries, error classification and crash recovery
+"""
+
+import os
+import time
+
+import yt_dlp
+
+import yt2podcast
+from test_download import FakeYoutubeDL
+from yt2podcast import YT2Podcast, TransientDownloadError, PermanentDownloadError, classify_error
+
+URL = 'https://www.youtube.com/watch?v=abcdefghijk'
+
+
+def flaky_ydl(*errors):
+    """a FakeYoutubeDL that raises the given errors first, then works"""
+    remaining = list(errors)
+
+    class FlakyYDL(FakeYoutubeDL):
+        def extract_info(self, url, download=True):
+            if remaining:
+                FakeYoutubeDL.calls.append((url, download))
+                raise remaining.pop(0)
+            return super().extract_info(url, download)
+
+    FakeYoutubeDL.calls = []
+    return FlakyYDL
+
+
+def test_errors_are_classified():
+    assert isinstance(classify_error(yt_dlp.utils.DownloadError('ERROR: Connection reset by peer')),
+                      TransientDownloadError)
+    assert isinstance(classify_error(yt_dlp.utils.DownloadError('ERROR: HTTP Error 503: Service Unavailable')),
+                      TransientDownloadError)
+    assert isinstance(classify_error(TimeoutError()), TransientDownloadError)
+    assert isinstance(classify_error(yt_dlp.utils.DownloadError('ERROR: Private video')), PermanentDownloadError)
+    assert isinstance(classify_error(yt_dlp.utils.DownloadError('ERROR: Unsupported URL: https://x')),
+                      PermanentDownloadError)
+    assert classify_error(RuntimeError('yt-dlp returned no video info')).reason == 'no_info'
+    # "webpage" used to count as an age restriction
+    assert classify_error(yt_dlp.utils.DownloadError(
+        'ERROR: Unable to download webpage: Temporary failure in name resolution')).reason == 'network'
+
+
+def test_yt_dlp_resumes_and_no_longer_ignores_errors(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    options = YT2Podcast().engine._ydl_options()
+    assert 'ignoreerrors' not in options
+    assert options['continuedl'] is True
+    assert options['skip_unavailable_fragments'] is False
+    assert options['retry_sleep_functions']['fragment'](3) == 8
+
+
+def test_transient_failure_is_retried_with_backoff(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    sleeps = []
+    monkeypatch.setattr(yt2podcast.time, 'sleep', sleeps.append)
+    monkeypatch.setattr(yt2podcast.yt_dlp, 'YoutubeDL', flaky_ydl(
+        yt_dlp.utils.DownloadError('ERROR: Connection reset by peer'),
+        yt_dlp.utils.DownloadError('ERROR: HTTP Error 429: Too Many Requests'),
+    ))
+
+    podcast = YT2Podcast(base_url='https://example.com', retries=3, retry_backoff=2.0)
+    episode = podcast.download_video(URL)
+
+    assert episode['title'] == 'Weird: Title'
+    assert len(FakeYoutubeDL.calls) == 3
+    # doubling each time, with up to half of it taken off as jitter
+    assert 1.0 <= sleeps[0] <= 2.0 and 2.0 <= sleeps[1] <= 4.0
+    assert podcast.metrics.retries.value(reason='network') == 1
+    assert podcast.metrics.retries.value(reason='rate_limited') == 1
+    assert podcast.metadata.pending() == {}
+
+
+def test_permanent_failure_is_not_retried(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(yt2podcast.time, 'sleep', lambda seconds: None)
+    monkeypatch.setattr(yt2podcast.yt_dlp, 'YoutubeDL', flaky_ydl(
+        yt_dlp.utils.DownloadError('ERROR: [youtube] abcdefghijk: Private video'),
+    ))
+
+    podcast = YT2Podcast(base_url='https://example.com')
+    assert podcast.download_video(URL) is None
+    assert len(FakeYoutubeDL.calls) == 1
+    assert isinstance(podcast.last_errors['abcdefghijk'], PermanentDownloadError)
+    assert podcast.metadata.pending() == {}
+
+
+def test_unfinished_download_is_resumed_on_startup(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(yt2podcast.time, 'sleep', lambda seconds: None)
+    monkeypatch.setattr(yt2podcast.yt_dlp, 'YoutubeDL', flaky_ydl(
+        *[yt_dlp.utils.DownloadError('ERROR: The read operation timed out')] * 2
+    ))
+
+    podcast = YT2Podcast(base_url='https://example.com', retries=1)
+    assert podcast.download_video(URL) is None
+    error = podcast.last_errors['abcdefghijk']
+    assert isinstance(error, TransientDownloadError) and error.attempts == 2
+    # kept, so the next run knows to try again
+    assert podcast.metadata.pending()['abcdefghijk']['video_url'] == URL
+    podcast.metadata.close()
+
+    monkeypatch.setattr(yt2podcast.yt_dlp, 'YoutubeDL', FakeYoutubeDL)
+    podcast = YT2Podcast(base_url='https://example.com')
+    resumed, _ = podcast.recover_incomplete()
+
+    assert [episode['title'] for episode in resumed] == ['Weird: Title']
+    assert 'abcdefghijk' in YT2Podcast().metadata
+    assert podcast.metadata.pending() == {}
+    assert podcast.rss_file.exists()
+
+
+def test_no_resume_drops_records_and_sweeps_partial_files(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    podcast = YT2Podcast(base_url='https://example.com')
+    podcast.metadata['kept'] = {'filename': 'Finished.m4a'}
+    podcast.metadata.mark_pending('gone', {'video_url': URL, 'pid': 1, 'host': 'elsewhere'})
+
+    old = time.time() - 3600
+    episodes = podcast.episodes_dir
+    for name in ('Finished.m4a', 'Talk.webm.part', 'Talk.webm.part-Frag3', 'Talk.webm.ytdl',
+                 'Talk.f251.webm', 'Talk.temp.mp3', 'Other.webm', 'Elsewhere.opus', 'notes.txt'):
+        (episodes / name).write_bytes(b'x')
+        os.utime(episodes / name, (old, old))
+    (episodes / 'Running.webm.part').write_bytes(b'x')
+
+    resumed, removed = podcast.recover_incomplete(resume=False)
+
+    assert resumed == []
+    assert podcast.metadata.pending() == {}
+    assert sorted(path.name for path in removed) == [
+        'Talk.f251.webm', 'Talk.temp.mp3', 'Talk.webm.part', 'Talk.webm.part-Frag3', 'Talk.webm.ytdl',
+    ]
+    # episodes (even ones another metadata file lists), unrelated files and
+    # anything still being written stay
+    assert sorted(path.name for path in episodes.iterdir()) == [
+        'Elsewhere.opus', 'Finished.m4a', 'Other.webm', 'Running.webm.part', 'notes.txt']
+
+
+def test_download_of_a_live_process_is_left_alone(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    podcast = YT2Podcast(base_url='https://example.com')
+    other = yt2podcast.datetime.now(yt2podcast.timezone.utc).isoformat()
+    podcast.metadata.mark_pending('busy', {
+        'video_url': URL, 'pid': os.getppid(), 'host': yt2podcast.socket.gethostname(), 'started': other,
+    })
+
+    assert podcast.recover_incomplete() == ([], [])
+    assert 'busy' in podcast.metadata.pending()
+
+
+def test_web_job_resumes_in_its_own_staging_folder(web_app, client, monkeypatch):
+    monkeypatch.setattr(web_app.download_queue, 'start', lambda: None)
+    seen = []
+
+    def fake_fetch(self, url, video_key=None):
+        seen.append(self.output_dir)
+        raise PermanentDownloadError('ERROR: Private video', reason='private')
+
+    monkeypatch.setattr(web_app.DownloadEngine, 'fetch', fake_fetch)
+    client.post('/add_video', data={'video_url': URL})
+
+    with web_app.app.app_context():
+        job = web_app.DownloadJob.query.one()
+        leftover = web_app.audio_store.staging_dir('job999')
+        # a worker died while downloading this job's video
+        partial = web_app.audio_store.staging_dir(web_app._staging_name(job)) / 'Talk.webm.part'
+        partial.write_bytes(b'x')
+
+        web_app.sweep_staging()
+        assert not leftover.exists()
+        assert partial.exists()
+
+        web_app.download_queue.run_pending()
+    assert seen == [partial.parent]
+    assert not partial.parent.exists()
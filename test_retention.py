@@ -0,0 +1,222 @@
+#!/usr/bin/env python3
+"""
+Tests for the disk budget: retention rules, quotas, batched play times and
+downloading evicted episodes again when they're played
+"""
+
+from datetime import datetime, timedelta
+
+from sqlalchemy.exc import OperationalError
+
+from retention import AccessTracker, RetentionPolicy, lru_victims
+from yt2podcast import YT2Podcast
+
+
+def stored(web_app):
+    """titles of episodes that still have their audio, oldest first"""
+    with web_app.app.app_context():
+        episodes = web_app.Episode.query.order_by(web_app.Episode.id).all()
+        return [episode.title for episode in episodes if episode.evicted_at is None]
+
+
+def test_lru_victims_goes_oldest_first_until_under_quota():
+    items = [('a', 40, 3), ('b', 40, 1), ('c', 40, None), ('d', 40, 2)]
+    assert lru_victims(items, 160, 100) == ['c', 'b']
+    assert lru_victims(items, 160, 0) == []
+    assert lru_victims(items, 90, 100) == []
+
+
+def test_access_tracker_writes_in_batches():
+    saved = []
+    tracker = AccessTracker(saved.append, interval=3600, max_pending=3)
+    first = datetime(2024, 1, 1)
+
+    assert tracker.touch(1, first) is False
+    assert tracker.touch(1, first + timedelta(seconds=5)) is False
+    assert tracker.touch(2, first) is False
+    assert saved == []
+    # a third key fills the batch
+    assert tracker.touch(3, first) is True
+    assert saved == [{1: first + timedelta(seconds=5), 2: first, 3: first}]
+
+    tracker.touch(4, first)
+    assert tracker.flush() == 1 and tracker.flush() == 0
+    assert len(saved) == 2
+
+
+def test_access_tracker_keeps_times_when_the_write_fails():
+    def broken(times):
+        raise RuntimeError('database is locked')
+
+    tracker = AccessTracker(broken, interval=3600)
+    tracker.touch(1, datetime(2024, 1, 1))
+    try:
+        tracker.flush()
+    except RuntimeError:
+        pass
+    assert tracker.pending() == {1: datetime(2024, 1, 1)}
+
+
+def test_policy_from_config():
+    policy = RetentionPolicy.from_config({'USER_QUOTA_MB': 2, 'RETENTION_KEEP_NEWEST': 5})
+    assert policy.enabled
+    assert policy.user_quota_bytes == 2 * 1024 * 1024 and policy.global_quota_bytes == 0
+    assert not RetentionPolicy.from_config({}).enabled
+
+
+def test_plays_are_tracked_and_batched(web_app, client, add_videos):
+    add_videos(client, 'one')
+
+    with web_app.app.app_context():
+        episode = web_app.Episode.query.one()
+        url = f"/episode/{episode.user_id}/{episode.filename}"
+        episode_id = episode.id
+    assert client.get(url).status_code == 200
+    assert client.get(url, headers={'Range': 'bytes=0-9'}).status_code == 206
+
+    with web_app.app.app_context():
+        # nothing written per request
+        assert web_app.db.session.get(web_app.Episode, episode_id).last_played_at is None
+        assert episode_id in web_app.play_times.pending()
+        web_app.play_times.flush()
+        assert web_app.db.session.get(web_app.Episode, episode_id).last_played_at is not None
+
+
+def test_failed_play_time_write_does_not_stop_playback(web_app, client, monkeypatch, add_videos):
+    add_videos(client, 'one')
+    with web_app.app.app_context():
+        episode = web_app.Episode.query.one()
+        url = f"/episode/{episode.user_id}/{episode.filename}"
+        episode_id = episode.id
+
+    def locked(times):
+        raise OperationalError('UPDATE episode', {}, Exception('database is locked'))
+
+    monkeypatch.setattr(web_app, 'play_times', AccessTracker(locked, interval=0))
+    response = client.get(url)
+    assert response.status_code == 200
+    assert response.data.startswith(b'ID3')
+    # kept for the next flush
+    assert episode_id in web_app.play_times.pending()
+
+
+def test_keep_newest_evicts_older_audio_but_keeps_the_feed(web_app, client, monkeypatch, add_videos):
+    monkeypatch.setitem(web_app.app.config, 'RETENTION_KEEP_NEWEST', 2)
+    add_videos(client, 'one', 'two', 'three')
+
+    assert stored(web_app) == ['two', 'three']
+    feed = client.get(f"/feed/{client.username}").data
+    assert feed.count(b'<item>') == 3
+    with web_app.app.app_context():
+        # only reference gone, so the shared file went too
+        assert web_app.AudioBlob.query.count() == 2
+
+
+def test_user_quota_evicts_least_recently_played(web_app, client, monkeypatch, add_videos):
+    add_videos(client, 'one', 'two', 'three')
+
+    with web_app.app.app_context():
+        episodes = {episode.title: episode for episode in web_app.Episode.query.all()}
+        # "one" is the oldest download but was played recently
+        episodes['one'].last_played_at = datetime.utcnow()
+        web_app.db.session.commit()
+
+        # room for two of the three (each is 1000 bytes)
+        monkeypatch.setattr(web_app.RetentionPolicy, 'from_config', classmethod(
+            lambda cls, config: cls(user_quota_bytes=2100)))
+        assert web_app.enforce_retention() == 1
+    assert stored(web_app) == ['one', 'three']
+
+
+def test_idle_episodes_lose_their_audio(web_app, client, monkeypatch, add_videos):
+    add_videos(client, 'one', 'two')
+
+    with web_app.app.app_context():
+        old = web_app.Episode.query.filter_by(title='one').one()
+        old.download_date = datetime.utcnow() - timedelta(days=40)
+        web_app.db.session.commit()
+        monkeypatch.setitem(web_app.app.config, 'RETENTION_IDLE_DAYS', 30)
+        assert web_app.enforce_retention() == 1
+    assert stored(web_app) == ['two']
+
+
+def test_global_quota_counts_shared_audio_once(web_app, client, monkeypatch, add_videos):
+    other = web_app.app.test_client()
+    other.post('/register', data={'username': 'other', 'email': 'other@example.com', 'password': 'pw'})
+    other.post('/login', data={'username': 'other', 'password': 'pw'})
+
+    add_videos(client, 'shared')
+    add_videos(other, 'shared')
+    add_videos(client, 'mine')
+
+    with web_app.app.app_context():
+        monkeypatch.setattr(web_app.RetentionPolicy, 'from_config', classmethod(
+            lambda cls, config: cls(global_quota_bytes=1500)))
+        # two files on disk, the shared one is the least recently used
+        assert web_app.enforce_retention() == 2
+        assert web_app.AudioBlob.query.count() == 1
+    assert stored(web_app) == ['mine']
+
+
+def test_evicted_episode_is_downloaded_again_when_played(web_app, client, monkeypatch, add_videos, fake_download):
+    monkeypatch.setitem(web_app.app.config, 'REFETCH_WAIT_SECONDS', 0)
+    add_videos(client, 'one')
+
+    with web_app.app.app_context():
+        episode = web_app.Episode.query.one()
+        url = f"/episode/{episode.user_id}/{episode.filename}"
+        web_app.evict_episode_audio([episode], 'test')
+    assert fake_download == ['https://www.youtube.com/watch?v=one']
+
+    response = client.get(url)
+    assert response.status_code == 503
+    assert response.headers['Retry-After'] == '30'
+    # asking again doesn't queue a second download
+    assert client.get(url).status_code == 503
+    assert len(client.get('/jobs?active=1').get_json()['jobs']) == 1
+
+    with web_app.app.app_context():
+        web_app.download_queue.run_pending()
+        assert web_app.Episode.query.one().evicted_at is None
+    assert len(fake_download) == 2
+
+    response = client.get(url)
+    assert response.status_code == 200
+    assert response.data.startswith(b'ID3')
+
+    # deleting an evicted episode still works
+    with web_app.app.app_context():
+        web_app.evict_episode_audio(web_app.Episode.query.all(), 'test')
+        episode_id = web_app.Episode.query.one().id
+    client.post(f"/delete_episode/{episode_id}")
+    with web_app.app.app_context():
+        assert web_app.Episode.query.count() == 0
+
+
+def test_missing_file_that_was_never_evicted_is_still_404(web_app, client, add_videos):
+    add_videos(client, 'one')
+    with web_app.app.app_context():
+        episode = web_app.Episode.query.one()
+        path = web_app.UPLOAD_FOLDER / str(episode.user_id) / episode.filename
+        url = f"/episode/{episode.user_id}/{episode.filename}"
+    path.unlink()
+    assert client.get(url).status_code == 404
+
+
+def test_cli_prune_removes_oldest_episodes(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    podcast = YT2Podcast(base_url='https://example.com')
+    for n in range(4):
+        (podcast.episodes_dir / f"{n}.mp3").write_bytes(b'x' * 100)
+        podcast.metadata[f"h{n}"] = {
+            'title': f"Episode {n}", 'description': '', 'duration': 1, 'upload_date': '20240101',
+            'uploader': 'Me', 'filename': f"{n}.mp3", 'file_size': 100,
+            'download_date': '2024-01-01T00:00:00+00:00', 'video_url': 'https://youtu.be/x',
+            'audio_url': f"https://example.com/episodes/{n}.mp3",
+        }
+
+    assert podcast.prune(keep_newest=3) == ['h0']
+    assert podcast.prune(max_bytes=150) == ['h1', 'h2']
+    assert list(podcast.metadata) == ['h3']
+    assert sorted(path.name for path in podcast.episodes_dir.iterdir()) == ['3.mp3']
+    assert podcast.rss_file.read_text().count('<item>') == 1
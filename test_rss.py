@@ -0,0 +1,167 @@
+#!/usr/bin/env python3
+"""
+Tests for RSS generation in YT2Podcast
+"""
+
+import gzip
+import re
+import xml.etree.ElementTree as ET
+from pathlib import Path
+
+import feed_writer
+import yt2podcast
+from atomic_file import atomic_write
+from yt2podcast import YT2Podcast
+
+ATOM = '{http://www.w3.org/2005/Atom}'
+FH = '{http://purl.org/syndication/history/1.0}'
+
+
+def episode(n, **overrides):
+    data = {
+        'title': f"Episode {n} & <friends>",
+        'description': f"Line one\r\nQuotes \"here\" & 'there' <b>{n}</b> – ünïcode",
+        'duration': 3700 + n,
+        'upload_date': f"202401{n:02d}",
+        'uploader': 'Some "Uploader"',
+        'filename': f"Episode {n}.mp3",
+        'file_size': 1000 + n,
+        'download_date': '2025-07-31T16:49:44.644945+00:00',
+        'video_url': f"https://www.youtube.com/watch?v=vid{n}",
+        'audio_url': f"https://example.com/episodes/Episode {n} & co.mp3",
+    }
+    data.update(overrides)
+    return data
+
+
+def without_build_date(xml):
+    return re.sub(rb'<lastBuildDate>[^<]*</lastBuildDate>', b'', xml)
+
+
+def make_podcast(tmp_path, monkeypatch, count):
+    monkeypatch.chdir(tmp_path)
+    podcast = YT2Podcast(base_url='https://example.com')
+    for n in range(1, count + 1):
+        podcast.metadata[f"hash{n}"] = episode(n)
+    podcast.metadata['hash2']['upload_date'] = ''
+    if count >= 3:
+        podcast.metadata['hash3']['uploader'] = None
+        podcast.metadata['hash3']['description'] = ''
+    return podcast
+
+
+def test_incremental_output_matches_full_rebuild(tmp_path, monkeypatch):
+    podcast = make_podcast(tmp_path, monkeypatch, 4)
+
+    podcast.generate_rss_feed(incremental=False)
+    full = podcast.rss_file.read_bytes()
+
+    podcast.rss_items_file.unlink()
+    podcast.generate_rss_feed()
+    incremental = podcast.rss_file.read_bytes()
+
+    assert without_build_date(incremental) == without_build_date(full)
+
+
+def test_incremental_reuses_fragments_and_drops_deleted(tmp_path, monkeypatch):
+    podcast = make_podcast(tmp_path, monkeypatch, 3)
+    podcast.generate_rss_feed()
+
+    rendered = []
+    real_render = podcast._render_item
+    monkeypatch.setattr(podcast, '_render_item', lambda data: rendered.append(data) or real_render(data))
+
+    podcast.metadata['hash4'] = episode(4)
+    del podcast.metadata['hash1']
+    podcast.generate_rss_feed()
+
+    assert [data['title'] for data in rendered] == [episode(4)['title']]
+    xml = podcast.rss_file.read_bytes()
+    assert b'Episode 4 &amp;' in xml
+    assert b'Episode 1 &amp;' not in xml
+    assert xml.index(b'Episode 4 &amp;') < xml.index(b'Episode 2 &amp;')
+
+    podcast.metadata = {}
+    podcast.generate_rss_feed()
+    assert b'<item>' not in podcast.rss_file.read_bytes()
+
+
+def test_feed_write_is_atomic(tmp_path, monkeypatch):
+    podcast = make_podcast(tmp_path, monkeypatch, 2)
+    podcast.generate_rss_feed()
+
+    def broken_chunks():
+        yield b'<rss>'
+        raise RuntimeError('disk on fire')
+
+    before = podcast.rss_file.read_bytes()
+    try:
+        atomic_write(podcast.rss_file, broken_chunks())
+    except RuntimeError:
+        pass
+    assert podcast.rss_file.read_bytes() == before
+    compressed = ['rss.xml.br', 'rss.xml.gz'] if feed_writer.brotli else ['rss.xml.gz']
+    assert sorted(p.name for p in tmp_path.iterdir()) == sorted(['episodes', 'rss.xml', 'rss_items.json'] + compressed)
+
+
+def test_max_items_splits_feed_into_archive_pages(tmp_path, monkeypatch):
+    podcast = make_podcast(tmp_path, monkeypatch, 5)
+    podcast.max_items = 2
+    podcast.generate_rss_feed()
+
+    head = ET.parse(podcast.rss_file).getroot().find('channel')
+    assert [item.findtext('title') for item in head.findall('item')] == [episode(5)['title'], episode(4)['title']]
+    assert head.find(f'{ATOM}link[@rel="prev-archive"]').get('href') == 'https://example.com/rss-archive-2.xml'
+
+    newest = ET.parse(tmp_path / 'rss-archive-2.xml').getroot().find('channel')
+    assert [item.findtext('title') for item in newest.findall('item')] == [episode(3)['title']]
+    assert newest.find(f'{ATOM}link[@rel="current"]').get('href') == 'https://example.com/rss.xml'
+    assert newest.find(f'{ATOM}link[@rel="prev-archive"]').get('href') == 'https://example.com/rss-archive-1.xml'
+    assert newest.find(f'{FH}archive') is not None
+
+    oldest = ET.parse(tmp_path / 'rss-archive-1.xml').getroot().find('channel')
+    assert len(oldest.findall('item')) == 2
+    assert oldest.find(f'{ATOM}link[@rel="prev-archive"]') is None
+
+    # rebuilding only touches the head and the archive page that changed
+    written = []
+    monkeypatch.setattr(yt2podcast, 'atomic_write', lambda path, data: written.append(Path(path).name) or atomic_write(path, data))
+    podcast.metadata['hash6'] = episode(6)
+    podcast.generate_rss_feed()
+    assert 'rss-archive-1.xml' not in written
+    assert 'rss-archive-2.xml' in written
+
+    # fewer episodes, the extra archive page goes away
+    for n in (1, 2, 3):
+        del podcast.metadata[f"hash{n}"]
+    podcast.generate_rss_feed()
+    assert not (tmp_path / 'rss-archive-2.xml').exists()
+    assert (tmp_path / 'rss-archive-1.xml').exists()
+
+
+def test_max_items_full_rebuild_matches_incremental(tmp_path, monkeypatch):
+    podcast = make_podcast(tmp_path, monkeypatch, 5)
+    podcast.max_items = 2
+
+    podcast.generate_rss_feed(incremental=False)
+    full = podcast.rss_file.read_bytes()
+    archive = (tmp_path / 'rss-archive-1.xml').read_bytes()
+
+    podcast.rss_items_file.unlink()
+    podcast.generate_rss_feed()
+    assert without_build_date(podcast.rss_file.read_bytes()) == without_build_date(full)
+    assert (tmp_path / 'rss-archive-1.xml').read_bytes() == archive
+
+
+def test_feed_files_get_compressed_siblings(tmp_path, monkeypatch):
+    podcast = make_podcast(tmp_path, monkeypatch, 5)
+    podcast.max_items = 2
+    podcast.generate_rss_feed()
+
+    for name in ('rss.xml', 'rss-archive-1.xml', 'rss-archive-2.xml'):
+        path = tmp_path / name
+        assert gzip.decompress(path.with_name(name + '.gz').read_bytes()) == path.read_bytes()
+
+    podcast.max_items = None
+    podcast.generate_rss_feed()
+    assert sorted(path.name for path in tmp_path.glob('rss*.gz')) == ['rss.xml.gz']
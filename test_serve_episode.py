@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""
+Tests for /episode/ serving: byte ranges, strong ETags and proxy offloading
+"""
+
+
+def add_blob_episode(web_app, add_episodes, username, payload=b'0123456789' * 100):
+    with web_app.app.app_context():
+        user = web_app.User.query.filter_by(username=username).one()
+        blob_path = web_app.audio_store.root / 'abcdefghijk.mp3'
+        blob_path.write_bytes(payload)
+        blob = web_app.AudioBlob(
+            video_id='abcdefghijk', path=str(blob_path), file_size=len(payload), refcount=1,
+            content_hash=web_app.file_sha256(blob_path), info='{}',
+        )
+        web_app.db.session.add(blob)
+        web_app.db.session.commit()
+        filename = web_app.audio_store.link(blob_path, web_app.UPLOAD_FOLDER / str(user.id), 'Song.mp3')
+        url, blob_id, content_hash = f"/episode/{user.id}/{filename}", blob.id, blob.content_hash
+    add_episodes(username, title='Song', filename=filename, file_size=len(payload), blob_id=blob_id)
+    return url, content_hash
+
+
+def test_range_requests_with_strong_etag(web_app, client, add_episodes):
+    url, content_hash = add_blob_episode(web_app, add_episodes, client.username)
+
+    full = client.get(url)
+    assert full.status_code == 200
+    assert full.headers['ETag'] == f'"{content_hash}"'
+    assert full.headers['Accept-Ranges'] == 'bytes'
+    assert len(full.data) == 1000
+    full.close()
+
+    partial = client.get(url, headers={'Range': 'bytes=10-19'})
+    assert partial.status_code == 206
+    assert partial.headers['Content-Range'] == 'bytes 10-19/1000'
+    assert partial.data == b'0123456789'
+    partial.close()
+
+    # If-Range with the current ETag keeps the range, a stale one gets everything
+    matching = client.get(url, headers={'Range': 'bytes=0-4', 'If-Range': f'"{content_hash}"'})
+    assert matching.status_code == 206
+    matching.close()
+    stale = client.get(url, headers={'Range': 'bytes=0-4', 'If-Range': '"something-else"'})
+    assert stale.status_code == 200
+    assert len(stale.data) == 1000
+    stale.close()
+
+    unchanged = client.get(url, headers={'If-None-Match': f'"{content_hash}"'})
+    assert unchanged.status_code == 304
+    unchanged.close()
+
+
+def test_x_accel_redirect_hands_off_to_nginx(web_app, client, monkeypatch, add_episodes):
+    url, content_hash = add_blob_episode(web_app, add_episodes, client.username)
+    monkeypatch.setitem(web_app.app.config, 'EPISODE_SERVE_MODE', 'x-accel')
+
+    response = client.get(url)
+    assert response.status_code == 200
+    assert response.data == b''
+    assert response.headers['X-Accel-Redirect'] == '/_episodes/' + url.split('/episode/')[1].replace(' ', '%20')
+    assert response.headers['Content-Type'] == 'audio/mpeg'
+    assert response.headers['ETag'] == f'"{content_hash}"'
+
+    # nginx would send the file anyway if the header stayed on the 304
+    unchanged = client.get(url, headers={'If-None-Match': f'"{content_hash}"'})
+    assert unchanged.status_code == 304
+    assert 'X-Accel-Redirect' not in unchanged.headers
+
+
+def test_x_sendfile_uses_absolute_path(web_app, client, monkeypatch, add_episodes):
+    url, content_hash = add_blob_episode(web_app, add_episodes, client.username)
+    monkeypatch.setitem(web_app.app.config, 'EPISODE_SERVE_MODE', 'x-sendfile')
+
+    response = client.get(url)
+    assert response.data == b''
+    assert response.headers['X-Sendfile'].endswith('/Song.mp3')
+    assert response.headers['X-Sendfile'].startswith('/')
+
+    unchanged = client.get(url, headers={'If-None-Match': f'"{content_hash}"'})
+    assert unchanged.status_code == 304
+    assert 'X-Sendfile' not in unchanged.headers
+
+
+def test_paths_outside_the_episode_folder_are_404_in_every_mode(web_app, client, monkeypatch, add_episodes):
+    url, _ = add_blob_episode(web_app, add_episodes, client.username)
+    user_id = url.split('/')[2]
+    for mode in ('stream', 'x-accel', 'x-sendfile'):
+        monkeypatch.setitem(web_app.app.config, 'EPISODE_SERVE_MODE', mode)
+        for name in ('..', '.'):
+            response = client.get(f"/episode/{user_id}/{name}")
+            assert response.status_code == 404, (mode, name)
+            assert 'X-Accel-Redirect' not in response.headers and 'X-Sendfile' not in response.headers
@@ -0,0 +1,49 @@
+#!/usr/bin/env python3
+"""
+Startup checks - the web app must not import yt-dlp until it downloads
+something. The report is printed at the end of the test run
+"""
+
+import startup_report
+import yt2podcast
+
+SAMPLE = """\
+import time: self [us] | cumulative | imported package
+import time:       120 |        120 | site
+import time:       300 |        300 |     markupsafe
+import time:       500 |        800 |   jinja2
+import time:       700 |        700 |   sqlalchemy
+import time:       100 |       1600 | app
+"""
+
+
+def test_parse_importtime():
+    total, children, modules = startup_report.parse_importtime(SAMPLE)
+    assert total == 0.0016
+    assert children == [('jinja2', 0.0008), ('sqlalchemy', 0.0007)]
+    assert 'markupsafe' in modules and 'site' in modules
+
+
+def test_yt_dlp_is_only_imported_when_used():
+    lazy = yt2podcast._LazyModule('json')
+    assert lazy.loaded  # already imported by someone else
+    assert lazy.dumps([1]) == '[1]'
+
+    lazy = yt2podcast._LazyModule('yt2podcast_no_such_module')
+    assert not lazy.loaded
+    try:
+        lazy.anything
+    except ImportError:
+        pass
+    else:
+        raise AssertionError('expected the import to fail on first use')
+
+
+def test_web_app_starts_without_yt_dlp(tmp_path, pytestconfig):
+    report = startup_report.run_report(tmp_path)
+    pytestconfig.startup_report = report
+
+    assert report['lazy_modules_loaded'] == [], startup_report.format_report(report)
+    assert report['first_request']['statuses'] == {'/': 200, '/feed/nobody': 404}
+    assert report['import_seconds'] > 0
+    assert 'yt2podcast' in dict(report['breakdown'])
@@ -0,0 +1,178 @@
+#!/usr/bin/env python3
+"""
+Tests for channel/playlist subscriptions: the high-water mark, polling
+schedule, backoff and rate limiting
+"""
+
+import threading
+from datetime import datetime, timedelta
+
+from scheduler import RateLimiter, entries_since, next_poll_time
+
+CHANNEL = 'https://www.youtube.com/@someChannel/videos'
+
+
+def video(video_id):
+    return {'url': f"https://www.youtube.com/watch?v={video_id}", 'id': video_id, 'title': video_id}
+
+
+def fake_channel(web_app, monkeypatch, uploads):
+    """list_collection serving uploads (newest first), records how it was called"""
+    calls = []
+
+    def fake_list_collection(url, limit=None):
+        calls.append((url, limit))
+        if isinstance(uploads, Exception):
+            raise uploads
+        return [video(video_id) for video_id in uploads][:limit]
+
+    monkeypatch.setattr(web_app, 'list_collection', fake_list_collection)
+    monkeypatch.setattr(web_app.download_queue, 'start', lambda: None)
+    monkeypatch.setattr(web_app.subscription_scheduler, 'start', lambda: None)
+    monkeypatch.setattr(web_app.subscription_scheduler.limiter, 'acquire', lambda stop=None: True)
+    return calls
+
+
+def queued_videos(web_app):
+    with web_app.app.app_context():
+        jobs = web_app.DownloadJob.query.order_by(web_app.DownloadJob.id).all()
+        return [job.video_url.rsplit('=', 1)[-1] for job in jobs]
+
+
+def poll(web_app, now=None):
+    with web_app.app.app_context():
+        return web_app.subscription_scheduler.run_due(now)
+
+
+def subscription(web_app):
+    with web_app.app.app_context():
+        return web_app.Subscription.query.one()
+
+
+def test_entries_since_stops_at_the_mark():
+    entries = [video('c'), video('b'), video('a')]
+    assert [e['id'] for e in entries_since(entries, 'a')] == ['c', 'b']
+    assert entries_since(entries, 'c') == []
+    assert len(entries_since(entries, None)) == 3
+    # mark scrolled out of the listing (or was deleted): take everything fetched
+    assert len(entries_since(entries, 'gone')) == 3
+
+
+def test_next_poll_time_jitters_and_backs_off():
+    now = datetime(2024, 1, 1)
+    times = {next_poll_time(now, 3600, jitter=0.1) for _ in range(20)}
+    assert len(times) > 1
+    assert all(timedelta(minutes=54) <= t - now <= timedelta(minutes=66) for t in times)
+
+    assert next_poll_time(now, 3600, jitter=0, failures=2) - now == timedelta(hours=4)
+    assert next_poll_time(now, 3600, jitter=0, failures=20) - now == timedelta(days=1)
+
+
+def test_rate_limiter_allows_a_burst_then_waits():
+    limiter = RateLimiter(3, period=60)
+    assert all(limiter.acquire() for _ in range(3))
+
+    stop = threading.Event()
+    stop.set()
+    # the bucket is empty, so this would have to wait
+    assert limiter.acquire(stop) is False
+
+
+def test_subscribe_validates_the_url(web_app, client, monkeypatch):
+    fake_channel(web_app, monkeypatch, [])
+    client.post('/subscriptions', data={'source_url': 'https://www.youtube.com/watch?v=abc'})
+    client.post('/subscriptions', data={'source_url': 'not a url'})
+    assert client.get('/subscriptions').get_json()['subscriptions'] == []
+
+    client.post('/subscriptions', data={'source_url': CHANNEL, 'poll_minutes': '1'})
+    client.post('/subscriptions', data={'source_url': CHANNEL})
+    subscriptions = client.get('/subscriptions').get_json()['subscriptions']
+    assert len(subscriptions) == 1
+    # clamped to the minimum interval
+    assert subscriptions[0]['poll_interval'] == web_app.app.config['SUBSCRIPTION_MIN_POLL_MINUTES'] * 60
+    assert b'someChannel' in client.get('/dashboard').data
+
+
+def test_polls_queue_only_new_uploads(web_app, client, monkeypatch):
+    uploads = ['v5', 'v4', 'v3', 'v2', 'v1']
+    calls = fake_channel(web_app, monkeypatch, uploads)
+    client.post('/subscriptions', data={'source_url': CHANNEL})
+
+    # first poll: the latest few only, oldest queued first
+    assert poll(web_app) == 1
+    assert queued_videos(web_app) == ['v3', 'v4', 'v5']
+    assert calls == [(CHANNEL, web_app.app.config['SUBSCRIPTION_POLL_WINDOW'])]
+    first = subscription(web_app)
+    assert first.last_seen_video_id == 'v5'
+    assert first.next_poll_at > datetime.utcnow() + timedelta(minutes=50)
+
+    # not due yet
+    assert poll(web_app) == 0
+
+    uploads[:0] = ['v7', 'v6']
+    assert poll(web_app, now=first.next_poll_at) == 1
+    assert queued_videos(web_app) == ['v3', 'v4', 'v5', 'v6', 'v7']
+    assert subscription(web_app).last_seen_video_id == 'v7'
+
+    with web_app.app.app_context():
+        jobs = web_app.DownloadJob.query.all()
+        assert {job.subscription_id for job in jobs} == {first.id}
+
+
+def test_poll_skips_videos_the_user_already_has(web_app, client, monkeypatch):
+    fake_channel(web_app, monkeypatch, ['dQw4w9WgXcQ', 'v1'])
+    # same video, different URL form
+    client.post('/add_video', data={'video_url': 'https://youtu.be/dQw4w9WgXcQ'})
+    client.post('/subscriptions', data={'source_url': CHANNEL})
+
+    poll(web_app)
+    assert len(queued_videos(web_app)) == 2
+
+
+def test_playlists_are_read_in_full_and_reversed(web_app, client, monkeypatch):
+    playlist = 'https://www.youtube.com/playlist?list=PLtest'
+    calls = fake_channel(web_app, monkeypatch, ['p1', 'p2', 'p3', 'p4'])
+    client.post('/subscriptions', data={'source_url': playlist})
+
+    poll(web_app)
+    assert calls == [(playlist, None)]
+    # the end of the playlist is the newest
+    assert queued_videos(web_app) == ['p2', 'p3', 'p4']
+    assert subscription(web_app).last_seen_video_id == 'p4'
+
+
+def test_failed_polls_back_off(web_app, client, monkeypatch):
+    fake_channel(web_app, monkeypatch, RuntimeError('HTTP Error 429: Too Many Requests'))
+    client.post('/subscriptions', data={'source_url': CHANNEL})
+
+    assert poll(web_app) == 1
+    failed = subscription(web_app)
+    assert failed.failures == 1
+    assert '429' in failed.last_error
+    assert failed.last_seen_video_id is None
+    assert queued_videos(web_app) == []
+
+    poll(web_app, now=failed.next_poll_at)
+    again = subscription(web_app)
+    assert again.failures == 2
+    # roughly two intervals instead of one
+    assert again.next_poll_at - again.last_polled_at > timedelta(seconds=again.poll_interval * 1.5)
+    assert b'Check failed' in client.get('/dashboard').data
+
+
+def test_unsubscribe(web_app, client, monkeypatch):
+    fake_channel(web_app, monkeypatch, ['v1'])
+    client.post('/subscriptions', data={'source_url': CHANNEL})
+    poll(web_app)
+    subscription_id = subscription(web_app).id
+
+    other = web_app.app.test_client()
+    other.post('/register', data={'username': 'other', 'email': 'other@example.com', 'password': 'pw'})
+    other.post('/login', data={'username': 'other', 'password': 'pw'})
+    other.post(f"/subscriptions/{subscription_id}/delete")
+    assert len(client.get('/subscriptions').get_json()['subscriptions']) == 1
+
+    client.post(f"/subscriptions/{subscription_id}/delete")
+    assert client.get('/subscriptions').get_json()['subscriptions'] == []
+    # the queued download is kept
+    assert queued_videos(web_app) == ['v1']
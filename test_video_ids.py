@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+"""
+Tests for canonical video keys and single-flight download deduplication
+"""
+
+import threading
+import time
+
+import pytest
+
+from yt2podcast import YT2Podcast, SingleFlight, video_key_from_url, legacy_video_hash
+
+
+@pytest.mark.parametrize('url', [
+    'https://www.youtube.com/watch?v=tze4CtWRmiU',
+    'https://www.youtube.com/watch?v=tze4CtWRmiU&ab_channel=awsomcool',
+    'https://youtube.com/watch?feature=share&v=tze4CtWRmiU',
+    'https://m.youtube.com/watch?v=tze4CtWRmiU',
+    'https://youtu.be/tze4CtWRmiU?si=abc',
+    'https://www.youtube.com/shorts/tze4CtWRmiU',
+    'https://www.youtube.com/embed/tze4CtWRmiU',
+    'https://music.youtube.com/watch?v=tze4CtWRmiU&list=RDAMVM',
+])
+def test_youtube_urls_share_one_key(url):
+    assert video_key_from_url(url) == 'tze4CtWRmiU'
+
+
+def test_other_sites_use_the_extractor_id():
+    assert video_key_from_url('https://vimeo.com/76979871') == 'vimeo-76979871'
+
+
+def test_unknown_urls_fall_back_to_the_old_hash():
+    url = 'https://example.com/some/page'
+    assert video_key_from_url(url) == legacy_video_hash(url)
+
+
+def test_single_flight_shares_one_run():
+    flight = SingleFlight()
+    calls = []
+    started = threading.Event()
+
+    def slow(value):
+        calls.append(value)
+        started.set()
+        time.sleep(0.2)
+        return value * 2
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(flight.do('key', slow, 21))) for _ in range(5)]
+    threads[0].start()
+    started.wait()
+    for thread in threads[1:]:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert calls == [21]
+    assert results == [42] * 5
+    # once it's finished the next call runs again
+    assert flight.do('key', slow, 1) == 2
+
+
+def test_single_flight_shares_errors():
+    flight = SingleFlight()
+    with pytest.raises(ValueError):
+        flight.do('key', lambda: (_ for _ in ()).throw(ValueError('nope')))
+
+
+def test_download_video_finds_episodes_stored_under_old_hash(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    url = 'https://www.youtube.com/watch?v=tze4CtWRmiU&ab_channel=awsomcool'
+    podcast = YT2Podcast()
+    podcast.metadata[legacy_video_hash(url)] = {'title': 'Community College is Depressing'}
+
+    assert podcast.download_video(url)['title'] == 'Community College is Depressing'
@@ -5,6 +5,7 @@ pretty straightforward, just give it a URL and it does the rest
 
 Usage:
     python yt2podcast.py "https://youtube.com/watch?v=someID"
+    python yt2podcast.py --workers 4 "https://youtube.com/@someChannel/videos"
 """
 
 import argparse
@@ -12,193 +13,321 @@ import os
 import sys
 import json
 import hashlib
+import importlib
+import random
+import re
+import socket
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
 from datetime import datetime, timezone
 from pathlib import Path
-from urllib.parse import urljoin, urlparse
-import yt_dlp
-from feedgen.feed import FeedGenerator
-import xml.etree.ElementTree as ET
+from urllib.parse import urlparse, parse_qs
+
+from atomic_file import atomic_write
+from metadata_store import open_metadata_store, migrate_json_to_sqlite
+from feed_writer import FeedWriter, render_item, feed_history_links, compressed_siblings, write_compressed_siblings
+from metrics import MetricsRegistry
+from retention import lru_victims
+from info_cache import InfoCache
+from publisher import SiteFile, StaticPublisher
+
+
+class _LazyModule:
+    """a module that's only imported the first time something is looked up on it
+    
+    yt-dlp and its extractor registry take a while to import and a lot of
+    memory, and a web worker serving feeds and audio never downloads
+    anything, so only the code that actually runs yt-dlp loads it
+    """
+    
+    def __init__(self, name):
+        self._name = name
+        self._module = None
+    
+    @property
+    def loaded(self):
+        return self._module is not None or self._name in sys.modules
+    
+    def __getattr__(self, attr):
+        if self._module is None:
+            self._module = importlib.import_module(self._name)
+        return getattr(self._module, attr)
+
+
+yt_dlp = _LazyModule('yt_dlp')
+
+
+# mp3 re-encodes for compatibility, remux keeps the original codec for speed
+AUDIO_MODES = ('mp3', 'remux')
+
+AUDIO_MIME_TYPES = {
+    '.mp3': 'audio/mpeg',
+    '.m4a': 'audio/x-m4a',
+    '.aac': 'audio/aac',
+    '.opus': 'audio/ogg',
+    '.ogg': 'audio/ogg',
+}
+
+
+def audio_mime_type(filename):
+    """enclosure type for an audio file, based on its extension"""
+    return AUDIO_MIME_TYPES.get(Path(filename).suffix.lower(), 'audio/mpeg')
 
 
 class YT2Podcast:
-    def __init__(self, base_url="https://rohvvn.github.io/yt2podcast"):
+    def __init__(self, base_url="https://rohvvn.github.io/yt2podcast", metadata_file="episodes_metadata.json",
+                 audio_mode='mp3', max_items=None, metrics=None, retries=3, retry_backoff=2.0,
+                 max_filesize=None, info_cache=None):
+        if audio_mode not in AUDIO_MODES:
+            raise ValueError(f"audio_mode must be one of {', '.join(AUDIO_MODES)}")
         self.base_url = base_url.rstrip('/')
+        self.audio_mode = audio_mode
+        # newest episodes kept in rss.xml, None means all of them
+        self.max_items = max_items
+        # download settings, handed to the DownloadEngine (see there)
+        self.retries = retries
+        self.retry_backoff = retry_backoff
+        self.max_filesize = max_filesize
+        self.info_cache = info_cache
         self.episodes_dir = Path("episodes")
         self.rss_file = Path("rss.xml")
-        self.metadata_file = Path("episodes_metadata.json")
+        # .json for the classic file, .db/.sqlite for the SQLite store
+        self.metadata_file = Path(metadata_file)
+        self.rss_items_file = Path("rss_items.json")
         
         # make sure episodes folder exists
         self.episodes_dir.mkdir(exist_ok=True)
         
         # load up existing metadata if any
         self.metadata = self._load_metadata()
+        
+        # batch downloads run on several threads at once
+        self._metadata_lock = threading.Lock()
+        self._in_flight = SingleFlight()
+        # video hash -> DownloadFailed for the last failed download of each video
+        self.last_errors = {}
+        self._engine = None
+        
+        # download/feed timings and counts, pass a shared MetricsRegistry to
+        # collect them across several instances
+        self.metrics = PipelineMetrics(metrics if metrics is not None else MetricsRegistry())
     
     def _load_metadata(self):
-        """load the metadata file if it exists"""
-        if self.metadata_file.exists():
-            try:
-                with open(self.metadata_file, 'r', encoding='utf-8') as f:
-                    return json.load(f)
-            except (json.JSONDecodeError, FileNotFoundError):
-                return {}
-        return {}
+        """open the metadata store, it acts like a dict of video hash -> episode"""
+        return open_metadata_store(self.metadata_file)
     
     def _save_metadata(self):
-        """save metadata back to file"""
-        with open(self.metadata_file, 'w', encoding='utf-8') as f:
-            json.dump(self.metadata, f, indent=2, ensure_ascii=False)
+        """save metadata back to disk (a no-op for SQLite, rows are written as they come in)"""
+        self.metadata.flush()
     
     def _get_video_hash(self, url):
-        """make a hash from the URL to track episodes"""
-        return hashlib.md5(url.encode()).hexdigest()[:8]
-    
-    def _sanitize_filename(self, title):
-        """clean up the title so it works as a filename"""
-        import re
-        # get rid of bad characters
-        sanitized = re.sub(r'[<>:"/\\|?*]', '_', title)
-        # keep it reasonable length
-        if len(sanitized) > 100:
-            sanitized = sanitized[:100]
-        return sanitized.strip()
-    
-    def download_video(self, url):
-        """download the video and convert to mp3"""
-        video_hash = self._get_video_hash(url)
+        """key to track episodes by, the same for every URL of a video"""
+        return video_key_from_url(url)
+    
+    def _find_existing(self, url, video_hash):
+        """metadata for a video we already have, also under its old URL hash"""
+        for key in (video_hash, legacy_video_hash(url)):
+            if key in self.metadata:
+                return self.metadata[key]
+        return None
+    
+    def download_video(self, url, save=True):
+        """download the video and convert to mp3
         
+        pass save=False when downloading a batch, the caller then saves the
+        metadata once at the end instead of after every video
+        """
+        video_hash = self._get_video_hash(url)
+        # two URLs for the same video at once only download it one time
+        return self._in_flight.do(video_hash, self._download_video, url, video_hash, save)
+    
+    def _download_video(self, url, video_hash, save):
         # see if we already have this one
-        if video_hash in self.metadata:
-            print(f"Video already downloaded: {self.metadata[video_hash]['title']}")
-            return self.metadata[video_hash]
+        existing = self._find_existing(url, video_hash)
+        if existing:
+            print(f"Video already downloaded: {existing['title']}")
+            self.metrics.downloads.inc(result='cached')
+            return existing
         
         print(f"Downloading video from: {url}")
-        
-        # setup yt-dlp options with fallback formats
-        ydl_opts = {
-            'format': 'bestaudio[ext=m4a]/bestaudio[ext=webm]/bestaudio/best',
-            'postprocessors': [{
-                'key': 'FFmpegExtractAudio',
-                'preferredcodec': 'mp3',
-                'preferredquality': '192',
-            }],
-            'outtmpl': str(self.episodes_dir / '%(title)s.%(ext)s'),
-            'quiet': False,
-            'no_warnings': False,
-            'ignoreerrors': True,
-            'no_check_certificate': True,
-            'extractor_retries': 3,
-        }
-        
         try:
-            with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-                # grab video info first
-                info = ydl.extract_info(url, download=False)
-                title = info.get('title', 'Unknown Title')
-                description = info.get('description', '')
-                duration = info.get('duration', 0)
-                upload_date = info.get('upload_date', '')
-                uploader = info.get('uploader', 'Unknown')
-                
-                # actually download it
-                ydl.download([url])
-                
-                # figure out what the file got named
-                sanitized_title = self._sanitize_filename(title)
-                mp3_filename = f"{sanitized_title}.mp3"
-                mp3_path = self.episodes_dir / mp3_filename
-                
-                # sometimes the filename is different, so find the actual file
-                if not mp3_path.exists():
-                    mp3_files = list(self.episodes_dir.glob("*.mp3"))
-                    if mp3_files:
-                        # just grab the newest one
-                        mp3_path = max(mp3_files, key=lambda x: x.stat().st_mtime)
-                        mp3_filename = mp3_path.name
-                
-                if not mp3_path.exists():
-                    raise FileNotFoundError("Downloaded MP3 file not found")
-                
-                # save all the episode info
-                episode_data = {
-                    'title': title,
-                    'description': description[:500] + '...' if len(description) > 500 else description,
-                    'duration': duration,
-                    'upload_date': upload_date,
-                    'uploader': uploader,
-                    'filename': mp3_filename,
-                    'file_size': mp3_path.stat().st_size,
-                    'download_date': datetime.now(timezone.utc).isoformat(),
-                    'video_url': url,
-                    'audio_url': f"{self.base_url}/episodes/{mp3_filename}",
-                }
-                
-                # stash it away
-                self.metadata[video_hash] = episode_data
-                self._save_metadata()
-                
-                print(f"Successfully downloaded: {title}")
-                print(f"File saved as: {mp3_filename}")
-                
-                return episode_data
-                
-        except Exception as e:
-            print(f"Error downloading video: {e}")
+            result = self.engine.fetch(url, video_hash)
+        except DownloadFailed as error:
+            self.last_errors[video_hash] = error
             return None
+        
+        # stash it away
+        episode_data = result.episode_data(self.base_url)
+        with self._metadata_lock:
+            self.metadata[video_hash] = episode_data
+            if save:
+                self._save_metadata()
+        self.last_errors.pop(video_hash, None)
+        
+        print(f"Successfully downloaded: {result.title}")
+        print(f"File saved as: {result.filename}")
+        print("Timings: " + ', '.join(f"{phase} {seconds:.1f}s" for phase, seconds in result.timings.items()))
+        
+        # timings are for the caller, they don't belong in the metadata file
+        return dict(episode_data, timings=result.timings)
     
-    def generate_rss_feed(self):
-        """make the RSS feed for podcast apps"""
-        fg = FeedGenerator()
-        fg.load_extension('podcast')
-        
-        # basic podcast info
-        fg.title('My YouTube Podcast')
-        fg.description('A podcast feed generated from YouTube videos')
-        fg.link(href=f"{self.base_url}/rss.xml", rel='self')
-        fg.language('en')
-        fg.author(name='YT2Podcast', email='warriorsplash1@gmail.com')
-        fg.subtitle('YouTube videos as podcast episodes')
-        
-        # add podcast-specific metadata for directories
-        fg.logo(f"{self.base_url}/logo.png")  # Optional: add a logo image
-        fg.category({'term': 'Technology', 'scheme': 'https://itunes.apple.com/us/genre/podcasts-technology/id1310'})
-        # fg.podcast.itunes_explicit(False)  # Commented out due to validation issues
-        fg.contact('warriorsplash1@gmail.com')  # Contact email for podcast directories
-        
-        # add each episode to the feed
-        for video_hash, episode_data in self.metadata.items():
-            fe = fg.add_entry()
-            fe.title(episode_data['title'])
-            fe.description(episode_data['description'])
-            fe.link(href=episode_data['audio_url'])
-            
-            # figure out when this was published
-            if episode_data['upload_date']:
-                try:
-                    # youtube uses YYYYMMDD format
-                    upload_date = datetime.strptime(episode_data['upload_date'], '%Y%m%d')
-                    upload_date = upload_date.replace(tzinfo=timezone.utc)
-                    fe.published(upload_date)
-                except ValueError:
-                    # fallback to when we downloaded it
-                    download_date = datetime.fromisoformat(episode_data['download_date'])
-                    fe.published(download_date)
-            else:
-                download_date = datetime.fromisoformat(episode_data['download_date'])
-                fe.published(download_date)
-            
-            # podcast-specific metadata for directories
-            fe.podcast.itunes_author(episode_data['uploader'])
-            fe.podcast.itunes_duration(self._format_duration(episode_data['duration']))
-            # fe.podcast.itunes_explicit('false')  # Commented out due to validation issues
-            fe.podcast.itunes_summary(episode_data['description'])
-            
-            # this is the actual audio file link
-            fe.enclosure(episode_data['audio_url'], str(episode_data['file_size']), 'audio/mpeg')
+    @property
+    def engine(self):
+        """the DownloadEngine writing into episodes_dir (a new one if episodes_dir was changed)"""
+        if self._engine is None or self._engine.output_dir != Path(self.episodes_dir):
+            self._engine = DownloadEngine(
+                self.episodes_dir, store=self.metadata, audio_mode=self.audio_mode,
+                retries=self.retries, retry_backoff=self.retry_backoff, max_filesize=self.max_filesize,
+                info_cache=self.info_cache, metrics=self.metrics.registry,
+            )
+        return self._engine
+    
+    def generate_rss_feed(self, incremental=True):
+        """make the RSS feed for podcast apps
+        
+        incremental mode keeps every item's XML in rss_items.json, so adding
+        one episode only renders that one item and streams the rest straight
+        into the file. incremental=False renders every item from scratch.
         
-        # write it all out
-        fg.rss_file(str(self.rss_file))
+        with max_items set, rss.xml only gets the newest max_items episodes
+        and older ones go into RFC 5005 archive pages (rss-archive-1.xml is
+        the oldest) that only get rewritten when their episodes change
+        """
+        with self.metrics.feed_render_seconds.time(source='cli'):
+            self._write_feed_files(incremental)
         print(f"RSS feed generated: {self.rss_file}")
     
+    def _write_feed_files(self, incremental):
+        # one read of the store, the SQLite one would otherwise query per key
+        episodes = dict(self.metadata.items())
+        head_hashes, archive_pages = self._split_feed_pages(list(episodes))
+        
+        items = self._load_rss_items() if incremental else {}
+        # drop items that were deleted, render the ones we haven't seen
+        items = {video_hash: items.get(video_hash) or self._render_item(episode_data)
+                 for video_hash, episode_data in episodes.items()}
+        
+        history = b''
+        if archive_pages:
+            history = feed_history_links(prev_archive=self._archive_url(len(archive_pages)))
+        writer = self._feed_writer(extra=history)
+        # newest episode first
+        writer.write(self.rss_file, (items[video_hash] for video_hash in reversed(head_hashes)))
+        # rss.xml.gz/.br for the web server in front of the static host
+        write_compressed_siblings(self.rss_file)
+        
+        self._write_archive_pages(archive_pages, episodes, items)
+        self._save_rss_items(items)
+    
+    def _split_feed_pages(self, video_hashes):
+        """(head hashes, [archive page hashes, oldest page first])"""
+        if not self.max_items or len(video_hashes) <= self.max_items:
+            return video_hashes, []
+        archived = video_hashes[:-self.max_items]
+        pages = [archived[i:i + self.max_items] for i in range(0, len(archived), self.max_items)]
+        return video_hashes[-self.max_items:], pages
+    
+    def _archive_file(self, page):
+        return self.rss_file.with_name(f"{self.rss_file.stem}-archive-{page}{self.rss_file.suffix}")
+    
+    def _archive_url(self, page):
+        return f"{self.base_url}/{self._archive_file(page).name}"
+    
+    def _write_archive_pages(self, archive_pages, episodes, items):
+        """write archive pages whose contents changed, remove ones no longer needed"""
+        for page, video_hashes in enumerate(archive_pages, start=1):
+            history = feed_history_links(
+                current=f"{self.base_url}/{self.rss_file.name}",
+                prev_archive=self._archive_url(page - 1) if page > 1 else None,
+                next_archive=self._archive_url(page + 1) if page < len(archive_pages) else None,
+                archive=True,
+            )
+            # archive pages shouldn't change every time they're rebuilt
+            newest = max(self._published_date(episodes[h]) for h in video_hashes)
+            writer = self._feed_writer(self_url=self._archive_url(page), build_date=newest, extra=history)
+            data = writer.render(items[h] for h in reversed(video_hashes))
+            
+            # archive pages are cached forever by clients, leave them alone
+            # unless something in them actually changed
+            path = self._archive_file(page)
+            if not path.exists() or path.read_bytes() != data:
+                atomic_write(path, data)
+                write_compressed_siblings(path, data)
+            elif not any(sibling.exists() for sibling in compressed_siblings(path)):
+                # written before feeds got compressed copies
+                write_compressed_siblings(path, data)
+        
+        page = len(archive_pages) + 1
+        while self._archive_file(page).exists():
+            self._archive_file(page).unlink()
+            for sibling in compressed_siblings(self._archive_file(page)):
+                sibling.unlink(missing_ok=True)
+            page += 1
+    
+    def _feed_writer(self, self_url=None, build_date=None, extra=b''):
+        """the podcast's channel info, ready to stream episodes into"""
+        return FeedWriter(
+            title='My YouTube Podcast',
+            description='YouTube videos as podcast episodes',
+            self_url=self_url or f"{self.base_url}/rss.xml",
+            language='en',
+            # category for podcast directories
+            category='Technology',
+            category_domain='https://itunes.apple.com/us/genre/podcasts-technology/id1310',
+            logo=f"{self.base_url}/logo.png",
+            # contact email for podcast directories
+            owner_name='YT2Podcast',
+            owner_email='warriorsplash1@gmail.com',
+            build_date=build_date,
+            extra=extra,
+        )
+    
+    def _published_date(self, episode_data):
+        """figure out when this was published"""
+        if episode_data['upload_date']:
+            try:
+                # youtube uses YYYYMMDD format
+                upload_date = datetime.strptime(episode_data['upload_date'], '%Y%m%d')
+                return upload_date.replace(tzinfo=timezone.utc)
+            except ValueError:
+                pass
+        # fallback to when we downloaded it
+        return datetime.fromisoformat(episode_data['download_date'])
+    
+    def _render_item(self, episode_data):
+        """render one episode's <item>"""
+        return render_item(
+            title=episode_data['title'],
+            link=episode_data['audio_url'],
+            description=episode_data['description'],
+            enclosure_url=episode_data['audio_url'],
+            length=episode_data['file_size'],
+            mime_type=self._mime_type(episode_data),
+            published=self._published_date(episode_data),
+            author=episode_data['uploader'],
+            duration=self._format_duration(episode_data['duration']),
+            summary=episode_data['description'],
+        )
+    
+    def _mime_type(self, episode_data):
+        # older episodes were all mp3 and don't have a mime_type
+        return episode_data.get('mime_type') or audio_mime_type(episode_data['filename'])
+    
+    def _load_rss_items(self):
+        """pre-rendered <item> fragments from the last run, keyed by video hash"""
+        if self.rss_items_file.exists():
+            try:
+                with open(self.rss_items_file, 'r', encoding='utf-8') as f:
+                    return json.load(f)
+            except (json.JSONDecodeError, FileNotFoundError):
+                return {}
+        return {}
+    
+    def _save_rss_items(self, items):
+        atomic_write(self.rss_items_file, json.dumps(items, ensure_ascii=False).encode('utf-8'))
+    
     def _format_duration(self, seconds):
         """turn seconds into HH:MM:SS format"""
         if not seconds:
@@ -232,6 +361,838 @@ class YT2Podcast:
         print(f"RSS Feed: {self.base_url}/rss.xml")
         
         return True
+    
+    def recover_incomplete(self, resume=True, min_age=600):
+        """sort out downloads a crash or a network outage left behind
+        
+        every download is recorded in the metadata store while it runs, so
+        records still there at startup belong to runs that never finished.
+        with resume they're downloaded again (yt-dlp continues the .part
+        file), otherwise the record is just dropped. then partial files no
+        episode uses get deleted, see sweep_partial_files().
+        returns (resumed episode data list, removed file list)
+        """
+        resumed = []
+        for video_hash, record in self.metadata.pending().items():
+            if video_hash in self.metadata:
+                # finished, the process died before it could tidy up
+                self.metadata.clear_pending(video_hash)
+            elif _owner_running(record):
+                # another run is working on it right now
+                continue
+            elif resume:
+                print(f"Resuming interrupted download: {record['video_url']}")
+                episode_data = self.download_video(record['video_url'], save=False)
+                if episode_data:
+                    resumed.append(episode_data)
+            else:
+                print(f"Dropping interrupted download: {record['video_url']}")
+                self.metadata.clear_pending(video_hash)
+        
+        if resumed:
+            self._save_metadata()
+            self.generate_rss_feed()
+        
+        return resumed, self.sweep_partial_files(min_age=min_age)
+    
+    def sweep_partial_files(self, min_age=600):
+        """delete leftover .part/.ytdl/fragment/.temp files yt-dlp left behind
+        
+        only files that no episode points at and that haven't been touched
+        for min_age seconds, anything newer could belong to a download
+        that's still going
+        """
+        in_use = {episode_data.get('filename') for episode_data in self.metadata.values()}
+        cutoff = time.time() - min_age
+        removed = []
+        for path in self.episodes_dir.iterdir():
+            if not path.is_file() or path.name in in_use or not _is_partial_file(path):
+                continue
+            if path.stat().st_mtime > cutoff:
+                continue
+            path.unlink(missing_ok=True)
+            removed.append(path)
+            print(f"Removed partial download: {path.name}")
+        return removed
+    
+    def prune(self, keep_newest=0, max_bytes=0):
+        """delete the oldest episodes to stay within keep_newest / max_bytes
+        
+        a static feed can't download anything again when it's played, so
+        unlike the web app this removes the whole episode, audio and feed
+        entry. returns the video hashes removed
+        """
+        episodes = dict(self.metadata.items())
+        # the store keeps download order, oldest first
+        order = list(episodes)
+        victims = order[:-keep_newest] if keep_newest and len(order) > keep_newest else []
+        
+        dropped = set(victims)
+        remaining = [video_hash for video_hash in order if video_hash not in dropped]
+        sizes = {video_hash: episodes[video_hash].get('file_size') or 0 for video_hash in remaining}
+        victims += lru_victims(
+            [(video_hash, sizes[video_hash], position) for position, video_hash in enumerate(remaining)],
+            sum(sizes.values()), max_bytes,
+        )
+        
+        for video_hash in victims:
+            filename = episodes[video_hash].get('filename')
+            if filename:
+                (self.episodes_dir / filename).unlink(missing_ok=True)
+            del self.metadata[video_hash]
+            print(f"Removed old episode: {episodes[video_hash].get('title', video_hash)}")
+        
+        if victims:
+            self._save_metadata()
+            self.generate_rss_feed()
+        return victims
+    
+    def site_files(self):
+        """everything the static host serves, laid out like base_url
+    
+        rss.xml, its archive pages (with their .gz/.br copies), logo.png if
+        there is one and the audio of every episode in the metadata
+        """
+        if not self.rss_file.exists():
+            self.generate_rss_feed()
+        feeds = [self.rss_file]
+        while self._archive_file(len(feeds)).exists():
+            feeds.append(self._archive_file(len(feeds)))
+        for feed in feeds:
+            yield SiteFile(feed.name, feed)
+            for sibling in compressed_siblings(feed):
+                if sibling.exists():
+                    yield SiteFile(sibling.name, sibling)
+        logo = self.rss_file.with_name('logo.png')
+        if logo.exists():
+            yield SiteFile(logo.name, logo)
+    
+        for episode_data in self.metadata.values():
+            audio_file = self.episodes_dir / episode_data['filename']
+            if audio_file.exists():
+                yield SiteFile(f"{self.episodes_dir.name}/{audio_file.name}", audio_file)
+            else:
+                print(f"Missing audio for {episode_data['title']}, not published")
+    
+    def publish(self, output_dir):
+        """copy the feed and audio into output_dir, only what changed since the last publish
+    
+        returns a PublishResult, deleted lists files to remove from the host
+        """
+        result = StaticPublisher(output_dir).publish(self.site_files())
+        print(f"Published to {output_dir}: {len(result.changed)} changed, "
+              f"{result.unchanged} unchanged, {len(result.deleted)} deleted")
+        return result
+    
+    def expand_urls(self, urls):
+        """turn playlist/channel URLs into the video URLs they contain
+        
+        uses flat extraction so we only fetch the listing, not every video page
+        """
+        expanded = []
+        for url in urls:
+            if not self._is_collection_url(url):
+                expanded.append(url)
+                continue
+            
+            print(f"Expanding playlist: {url}")
+            entries = [entry['url'] for entry in list_collection(url)]
+            print(f"Found {len(entries)} videos")
+            expanded.extend(entries)
+        
+        # drop duplicates but keep the order
+        return list(dict.fromkeys(expanded))
+    
+    def _is_collection_url(self, url):
+        """cheap check for playlist/channel URLs, no network needed"""
+        return is_collection_url(url)
+    
+    def process_batch(self, urls, workers=4, use_processes=False):
+        """download a bunch of videos in parallel, then write the feed once
+        
+        returns a list of (url, episode_data, error) tuples, one per video
+        """
+        urls = self.expand_urls(urls)
+        print(f"Processing {len(urls)} videos with {workers} workers")
+        
+        results = []
+        if use_processes:
+            # each process gets its own YT2Podcast, we merge what they send back
+            # (the info cache is SQLite, each process opens its own connection)
+            info_cache_file = str(self.info_cache.path) if self.info_cache is not None else None
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                futures = [
+                    pool.submit(_download_in_subprocess, self.base_url, str(self.episodes_dir),
+                                str(self.metadata_file), self.audio_mode, url, self.retries, info_cache_file,
+                                retry_backoff=self.retry_backoff, max_filesize=self.max_filesize)
+                    for url in urls
+                ]
+                for url, future in zip(urls, futures):
+                    try:
+                        video_hash, episode_data = future.result()
+                        if episode_data:
+                            # the worker process counted it in its own registry, and
+                            # like download_video, timings stay out of the metadata file
+                            timings = episode_data.get('timings')
+                            if timings is not None:
+                                self.metrics.record_download(timings)
+                            self.metadata[video_hash] = {
+                                key: value for key, value in episode_data.items() if key != 'timings'}
+                        else:
+                            self.metrics.record_failure('unknown')
+                        results.append((url, episode_data, None if episode_data else 'download failed'))
+                    except Exception as e:
+                        results.append((url, None, str(e)))
+        else:
+            with ThreadPoolExecutor(max_workers=workers) as pool:
+                futures = [pool.submit(self.download_video, url, save=False) for url in urls]
+                for url, future in zip(urls, futures):
+                    try:
+                        episode_data = future.result()
+                        results.append((url, episode_data, None if episode_data else 'download failed'))
+                    except Exception as e:
+                        results.append((url, None, str(e)))
+        
+        # only touch the metadata file and the feed once for the whole batch
+        if any(episode_data for _, episode_data, _ in results):
+            self._save_metadata()
+            self.generate_rss_feed()
+        
+        self._print_batch_summary(results)
+        return results
+    
+    def _print_batch_summary(self, results):
+        succeeded = [r for r in results if r[1]]
+        failed = [r for r in results if not r[1]]
+        
+        print(f"\nBatch finished: {len(succeeded)} succeeded, {len(failed)} failed")
+        for url, episode_data, _ in succeeded:
+            print(f"  OK    {episode_data['title']} ({url})")
+        for url, _, error in failed:
+            print(f"  FAIL  {url}: {error}")
+
+
+class DownloadResult(namedtuple('DownloadResult', [
+        'path', 'video_url', 'video_id', 'title', 'file_size',
+        'description', 'duration', 'upload_date', 'uploader', 'timings'],
+        defaults=('', 0, '', 'Unknown', None))):
+    """a finished download: the audio file in the engine's output folder and what we know about it"""
+    
+    __slots__ = ()
+    
+    @property
+    def filename(self):
+        return self.path.name
+    
+    @property
+    def mime_type(self):
+        return audio_mime_type(self.path.name)
+    
+    def episode_data(self, base_url):
+        """the metadata the CLI keeps for an episode, audio_url points under base_url/episodes/"""
+        description = self.description or ''
+        return {
+            'title': self.title,
+            'description': description[:500] + '...' if len(description) > 500 else description,
+            'duration': self.duration,
+            'upload_date': self.upload_date,
+            'uploader': self.uploader,
+            'filename': self.filename,
+            'file_size': self.file_size,
+            'download_date': datetime.now(timezone.utc).isoformat(),
+            'video_url': self.video_url,
+            'audio_url': f"{base_url.rstrip('/')}/episodes/{self.filename}",
+            'video_id': self.video_id,
+            'mime_type': self.mime_type,
+        }
+
+
+class DownloadEngine:
+    """downloads and converts videos into output_dir, nothing else
+    
+    no metadata file, no feed and no paths relative to the working
+    directory, so the web app can run one per job on as many threads and
+    processes as it likes. store is optional and only used to leave a
+    note about running downloads (mark_pending/clear_pending, any metadata
+    store does) for crash recovery. fetch() returns a DownloadResult or
+    raises DownloadFailed
+    
+        engine = DownloadEngine(tmp_dir, audio_mode='remux', retries=5)
+        result = engine.fetch(url)
+        print(result.path, result.title, result.timings)
+    """
+    
+    def __init__(self, output_dir, store=None, audio_mode='mp3', retries=3, retry_backoff=2.0,
+                 max_filesize=None, info_cache=None, metrics=None):
+        if audio_mode not in AUDIO_MODES:
+            raise ValueError(f"audio_mode must be one of {', '.join(AUDIO_MODES)}")
+        self.output_dir = Path(output_dir)
+        self.store = store
+        self.audio_mode = audio_mode
+        # transient failures get retried this many times, waiting
+        # retry_backoff seconds and doubling each time
+        self.retries = retries
+        self.retry_backoff = retry_backoff
+        # bytes, yt-dlp skips anything bigger
+        self.max_filesize = max_filesize
+        # InfoCache of extractor results, so retries and repeat downloads
+        # skip yt-dlp's extract step. None extracts every time
+        self.info_cache = info_cache
+        self.metrics = PipelineMetrics(metrics if metrics is not None else MetricsRegistry())
+        # two threads asking for the same video share one download
+        self._in_flight = SingleFlight()
+    
+    def fetch(self, url, video_key=None):
+        """download and convert one video, returns a DownloadResult"""
+        video_key = video_key or video_key_from_url(url)
+        return self._in_flight.do(video_key, self._fetch, url, video_key)
+    
+    def _fetch(self, url, video_key):
+        self.output_dir.mkdir(parents=True, exist_ok=True)
+        if self.store is not None:
+            # on disk before yt-dlp starts, so a crash leaves a note for recover_incomplete()
+            self.store.mark_pending(video_key, {
+                'video_url': url,
+                'audio_mode': self.audio_mode,
+                'started': datetime.now(timezone.utc).isoformat(),
+                'pid': os.getpid(),
+                'host': socket.gethostname(),
+            })
+        
+        try:
+            info, timer = self._fetch_with_retries(url, video_key)
+            if self.max_filesize and (info.get('filesize') or info.get('filesize_approx') or 0) > self.max_filesize:
+                # yt-dlp skipped the download, don't go looking for the file
+                raise PermanentDownloadError(f"Video is bigger than the {self.max_filesize} byte limit",
+                                             reason='too_large')
+            
+            # yt-dlp tells us exactly where the converted file ended up
+            audio_path = self._downloaded_path(info)
+            result = DownloadResult(
+                path=audio_path,
+                video_url=url,
+                video_id=canonical_video_id(info.get('extractor_key'), info.get('id')),
+                title=info.get('title', 'Unknown Title'),
+                file_size=audio_path.stat().st_size,
+                description=info.get('description') or '',
+                duration=info.get('duration', 0),
+                upload_date=info.get('upload_date', ''),
+                uploader=info.get('uploader', 'Unknown'),
+                timings=timer.timings(),
+            )
+        except Exception as e:
+            error = e if isinstance(e, DownloadFailed) else classify_error(e)
+            print(f"Error downloading video: {error}")
+            self.metrics.record_failure(error.reason)
+            if not error.transient and self.store is not None:
+                # no point trying this one again later
+                self.store.clear_pending(video_key)
+            raise error from e
+        
+        if self.store is not None:
+            self.store.clear_pending(video_key)
+        self.metrics.record_download(result.timings)
+        return result
+    
+    def _fetch_with_retries(self, url, video_key=None):
+        """one yt-dlp run (extract, download, convert), retried on transient errors
+        
+        network trouble, throttling and 5xx responses are retried with
+        exponential backoff and the .part file is picked up where it left
+        off. permanent failures (private, removed, ...) are raised straight
+        away. returns (info, phase timer of the attempt that worked)
+        
+        with an info cache the extract step is skipped when we have a
+        fresh result for the video. if its stream URLs turn out to be
+        expired it's thrown away and extracted again right away
+        """
+        attempt = 0
+        while True:
+            attempt += 1
+            ydl_opts = self._ydl_options()
+            timer = _PhaseTimer()
+            ydl_opts['progress_hooks'] = [timer.progress_hook]
+            ydl_opts['postprocessor_hooks'] = [timer.postprocessor_hook]
+            cached = self._cached_info(video_key)
+            
+            try:
+                with self.metrics.in_flight.track(), yt_dlp.YoutubeDL(ydl_opts) as ydl:
+                    info = self._extract_and_download(ydl, url, video_key, cached)
+                if not info:
+                    raise RuntimeError("yt-dlp returned no video info")
+                return info, timer
+            except Exception as e:
+                error = classify_error(e, attempts=attempt)
+                if self.info_cache is not None and (error.reason in EXPIRED_URL_REASONS or not error.transient):
+                    self.info_cache.invalidate(video_key)
+                    if cached is not None and error.reason in EXPIRED_URL_REASONS:
+                        # our fault, not the server's: extract fresh without using up a retry
+                        self.metrics.info_cache.inc(result='expired')
+                        print(f"Cached info for {url} has expired stream URLs, extracting again")
+                        attempt -= 1
+                        continue
+                if not error.transient or attempt > self.retries:
+                    raise error from e
+                delay = self._retry_delay(attempt)
+                self.metrics.retries.inc(reason=error.reason)
+                print(f"Download failed ({error.reason}), retry {attempt} of {self.retries} in {delay:.1f}s: {e}")
+                time.sleep(delay)
+    
+    def _cached_info(self, video_key):
+        if self.info_cache is None:
+            return None
+        info = self.info_cache.get(video_key)
+        self.metrics.info_cache.inc(result='hit' if info is not None else 'miss')
+        return info
+    
+    def _extract_and_download(self, ydl, url, video_key, cached=None):
+        """run yt-dlp, from the cached extractor result if there is one"""
+        if self.info_cache is None:
+            # one pass: extract, download and convert
+            return ydl.extract_info(url, download=True)
+        
+        info = cached
+        if info is None:
+            # extract only (no format selection, that depends on the audio
+            # mode) and keep the raw result for next time
+            info = ydl.extract_info(url, download=False, process=False)
+            if info and info.get('_type', 'video') == 'video':
+                self.info_cache.put(video_key, info)
+        if not info:
+            return info
+        # same as yt-dlp's --load-info-json: pick formats, download, convert
+        return ydl.process_ie_result(info, download=True)
+    
+    def _retry_delay(self, attempt):
+        """exponential backoff with jitter, so parallel workers don't retry in lockstep"""
+        delay = min(MAX_RETRY_DELAY, self.retry_backoff * 2 ** (attempt - 1))
+        return delay * random.uniform(0.5, 1.0)
+    
+    def _downloaded_path(self, info):
+        """final file path from the info dict, after postprocessing"""
+        for download in info.get('requested_downloads') or [info]:
+            filepath = download.get('filepath')
+            if filepath and Path(filepath).exists():
+                return Path(filepath)
+        raise FileNotFoundError("Downloaded audio file not found")
+    
+    def _ydl_options(self):
+        """yt-dlp settings for the current audio mode
+        
+        mp3   - re-encode everything to 192k MP3, plays everywhere
+        remux - keep youtube's AAC/Opus stream and only swap the container,
+                no decode/encode so it's a lot cheaper on CPU
+        """
+        if self.audio_mode == 'remux':
+            # prefer AAC, it's what Apple Podcasts and most apps understand
+            audio_format = 'bestaudio[ext=m4a]/bestaudio[acodec=opus]/bestaudio'
+            postprocessor = {
+                'key': 'FFmpegExtractAudio',
+                'preferredcodec': 'best',  # same codec in -> stream copy
+            }
+        else:
+            audio_format = 'bestaudio[ext=m4a]/bestaudio[ext=webm]/bestaudio/best'
+            postprocessor = {
+                'key': 'FFmpegExtractAudio',
+                'preferredcodec': 'mp3',
+                'preferredquality': '192',
+            }
+        
+        # setup yt-dlp options with fallback formats
+        return {
+            'format': audio_format,
+            'postprocessors': [postprocessor],
+            'outtmpl': str(self.output_dir / '%(title)s.%(ext)s'),
+            'quiet': False,
+            'no_warnings': False,
+            'no_check_certificate': True,
+            'extractor_retries': 3,
+            # keep .part files and continue them instead of starting over,
+            # and let yt-dlp retry dropped connections/fragments itself
+            # before a whole attempt fails
+            'continuedl': True,
+            'retries': 10,
+            'fragment_retries': 10,
+            'skip_unavailable_fragments': False,
+            'retry_sleep_functions': {'http': _ytdlp_retry_sleep, 'fragment': _ytdlp_retry_sleep},
+            'max_filesize': self.max_filesize,
+        }
+
+
+def is_collection_url(url):
+    """cheap check for playlist/channel URLs, no network needed"""
+    parsed = urlparse(url)
+    if 'list=' in parsed.query and '/watch' not in parsed.path:
+        return True
+    return parsed.path.startswith(('/playlist', '/channel/', '/c/', '/user/', '/@'))
+
+
+def list_collection(url, limit=None):
+    """the videos in a playlist/channel, in the order yt-dlp lists them
+    
+    flat extraction, so it's one listing request per page of videos instead
+    of one per video. limit stops after that many (channels list their
+    newest uploads first). returns dicts with url, id and title
+    """
+    ydl_opts = {
+        'extract_flat': 'in_playlist',
+        'quiet': True,
+        'no_warnings': True,
+    }
+    if limit:
+        ydl_opts['playlistend'] = limit
+    with yt_dlp.YoutubeDL(ydl_opts) as ydl:
+        info = ydl.extract_info(url, download=False)
+    
+    entries = []
+    for entry in _flat_entries(info):
+        entries.append({
+            'url': entry.get('webpage_url') or entry['url'],
+            'id': entry.get('id'),
+            'title': entry.get('title'),
+        })
+        if limit and len(entries) >= limit:
+            break
+    return entries
+
+
+def _flat_entries(info):
+    """walk a flat playlist result (channels nest their tabs as playlists)"""
+    for entry in (info or {}).get('entries') or []:
+        if not entry:
+            continue
+        if entry.get('_type') == 'playlist' or entry.get('entries'):
+            yield from _flat_entries(entry)
+        elif entry.get('url') or entry.get('webpage_url'):
+            yield entry
+
+
+class PipelineMetrics:
+    """the numbers YT2Podcast records, registered on a MetricsRegistry
+    
+    phase times come from the same yt-dlp hooks as the Timings line
+    """
+    
+    def __init__(self, registry):
+        self.registry = registry
+        self.extract_seconds = registry.histogram(
+            'yt2podcast_extract_seconds', 'Time yt-dlp spent extracting video info')
+        self.download_seconds = registry.histogram(
+            'yt2podcast_download_seconds', 'Time spent fetching the audio stream')
+        self.postprocess_seconds = registry.histogram(
+            'yt2podcast_postprocess_seconds', 'Time FFmpeg spent converting/remuxing')
+        self.feed_render_seconds = registry.histogram(
+            'yt2podcast_feed_render_seconds', 'Time spent rendering a feed', ['source'])
+        self.downloads = registry.counter(
+            'yt2podcast_downloads_total', 'Download attempts by result', ['result'])
+        self.failures = registry.counter(
+            'yt2podcast_download_failures_total', 'Failed downloads by reason', ['reason'])
+        self.in_flight = registry.gauge(
+            'yt2podcast_downloads_in_flight', 'Downloads running right now')
+        self.retries = registry.counter(
+            'yt2podcast_download_retries_total', 'Download attempts retried after a transient failure', ['reason'])
+        self.info_cache = registry.counter(
+            'yt2podcast_info_cache_total', 'Info cache lookups (hit/miss) and entries dropped as expired', ['result'])
+    
+    def record_download(self, timings):
+        self.downloads.inc(result='ok')
+        self.extract_seconds.observe(timings['extract'])
+        self.download_seconds.observe(timings['fetch'])
+        self.postprocess_seconds.observe(timings['postprocess'])
+    
+    def record_failure(self, reason):
+        self.downloads.inc(result='failed')
+        self.failures.inc(reason=reason)
+
+
+# yt-dlp error messages -> failure reason label, first match wins
+_FAILURE_REASONS = (
+    ('private video', 'private'),
+    ('unsupported url', 'unsupported'),
+    ('is not a valid url', 'unsupported'),
+    ('requested format is not available', 'no_format'),
+    # before 'unavailable', a 503 says "Service Unavailable"
+    ('http error 429', 'rate_limited'),
+    ('http error 403', 'forbidden'),
+    ('http error 410', 'expired_url'),
+    ('http error 5', 'server_error'),
+    ('confirm your age', 'age_restricted'),
+    ('age-restricted', 'age_restricted'),
+    ('sign in', 'login_required'),
+    ('unavailable', 'unavailable'),
+    ('removed', 'unavailable'),
+    ('copyright', 'unavailable'),
+    ('ffmpeg', 'postprocess'),
+    ('postprocess', 'postprocess'),
+    ('timed out', 'network'),
+    ('connection', 'network'),
+    ('temporary failure', 'network'),
+    ('did not get any data', 'network'),
+    ('bytes, expected', 'network'),
+)
+
+# reasons worth another go: the network, throttling, an expired stream URL
+# (403) or a flaky server. Anything else will fail the same way again
+TRANSIENT_REASONS = frozenset({'network', 'rate_limited', 'forbidden', 'expired_url', 'server_error',
+                               'download_error'})
+
+# what an expired signed stream URL looks like, cached info gets thrown away
+EXPIRED_URL_REASONS = frozenset({'forbidden', 'expired_url'})
+
+# longest wait between our own retries, in seconds
+MAX_RETRY_DELAY = 60
+
+
+def failure_reason(error):
+    """short label for why a download failed, for metrics"""
+    if isinstance(error, DownloadFailed):
+        return error.reason
+    if isinstance(error, FileNotFoundError):
+        return 'missing_output'
+    if isinstance(error, (ConnectionError, TimeoutError, socket.timeout)):
+        return 'network'
+    message = str(error).lower()
+    for needle, reason in _FAILURE_REASONS:
+        if needle in message:
+            return reason
+    # if yt-dlp was never imported this can't be one of its errors
+    if yt_dlp.loaded and isinstance(error, yt_dlp.utils.DownloadError):
+        return 'download_error'
+    if 'no video info' in message:
+        return 'no_info'
+    return 'other'
+
+
+class DownloadFailed(Exception):
+    """a download that didn't work, with why and whether retrying could help"""
+    
+    transient = False
+    
+    def __init__(self, message, reason='other', attempts=1):
+        super().__init__(message)
+        self.reason = reason
+        self.attempts = attempts
+
+
+class TransientDownloadError(DownloadFailed):
+    """might work next time (network, throttling, server trouble)"""
+    transient = True
+
+
+class PermanentDownloadError(DownloadFailed):
+    """will fail the same way every time (private, removed, no audio)"""
+
+
+def classify_error(error, attempts=1):
+    """wrap any exception from a download in the matching DownloadFailed type"""
+    reason = failure_reason(error)
+    cls = TransientDownloadError if reason in TRANSIENT_REASONS else PermanentDownloadError
+    return cls(str(error), reason=reason, attempts=attempts)
+
+
+def _ytdlp_retry_sleep(n):
+    """yt-dlp's own wait before its nth retry of a request or fragment"""
+    return min(MAX_RETRY_DELAY, 2 ** n)
+
+
+class _PhaseTimer:
+    """times the extract / fetch / postprocess phases of one yt-dlp run
+    
+    hooked into yt-dlp's progress and postprocessor hooks, since everything
+    happens inside a single extract_info call
+    """
+    
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.marks = {}
+    
+    def progress_hook(self, status):
+        now = time.perf_counter()
+        self.marks.setdefault('fetch_start', now)
+        if status.get('status') == 'finished':
+            self.marks['fetch_end'] = now
+    
+    def postprocessor_hook(self, status):
+        now = time.perf_counter()
+        if status.get('status') == 'started':
+            self.marks.setdefault('postprocess_start', now)
+        elif status.get('status') == 'finished':
+            self.marks['postprocess_end'] = now
+    
+    def timings(self):
+        """seconds spent in each phase"""
+        end = time.perf_counter()
+        fetch_start = self.marks.get('fetch_start', end)
+        fetch_end = self.marks.get('fetch_end', self.marks.get('postprocess_start', end))
+        postprocess_start = self.marks.get('postprocess_start', fetch_end)
+        postprocess_end = self.marks.get('postprocess_end', postprocess_start)
+        return {
+            'extract': fetch_start - self.started,
+            'fetch': max(0.0, fetch_end - fetch_start),
+            'postprocess': max(0.0, postprocess_end - postprocess_start),
+            'total': end - self.started,
+        }
+
+
+class SingleFlight:
+    """make concurrent calls for the same key share one run
+    
+    the first caller does the work, anyone asking for the same key while
+    it's running waits and gets the same result (or exception)
+    """
+    
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+    
+    def do(self, key, fn, *args, **kwargs):
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _FlightCall()
+        
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+        
+        try:
+            call.result = fn(*args, **kwargs)
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+
+class _FlightCall:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+# watch?v=, youtu.be/, shorts/, embed/, live/ and friends
+_YOUTUBE_HOSTS = ('youtube.com', 'www.youtube.com', 'm.youtube.com', 'music.youtube.com',
+                  'youtube-nocookie.com', 'www.youtube-nocookie.com')
+_YOUTUBE_PATH_RE = re.compile(r'^/(?:shorts|embed|live|v|e)/([0-9A-Za-z_-]{11})(?:[/?#]|$)')
+_YOUTUBE_ID_RE = re.compile(r'^[0-9A-Za-z_-]{11}$')
+
+
+def video_key_from_url(url):
+    """canonical video ID for a URL, without touching the network
+    
+    youtube URLs are parsed directly, other sites go through yt-dlp's
+    extractor patterns. If nothing recognises the URL we fall back to the
+    old hash of the URL itself.
+    """
+    parsed = urlparse(url)
+    host = (parsed.hostname or '').lower()
+    
+    if host in _YOUTUBE_HOSTS:
+        video_id = parse_qs(parsed.query).get('v', [''])[0]
+        if parsed.path in ('/watch', '/watch/') and _YOUTUBE_ID_RE.match(video_id):
+            return video_id
+        match = _YOUTUBE_PATH_RE.match(parsed.path)
+        if match:
+            return match.group(1)
+    elif host == 'youtu.be':
+        video_id = parsed.path.strip('/').split('/')[0]
+        if _YOUTUBE_ID_RE.match(video_id):
+            return video_id
+    
+    extractor_key, video_id = _match_extractor(url)
+    return canonical_video_id(extractor_key, video_id) or legacy_video_hash(url)
+
+
+def legacy_video_hash(url):
+    """how episodes used to be keyed, md5 of the URL"""
+    return hashlib.md5(url.encode()).hexdigest()[:8]
+
+
+_extractor_classes = None
+
+
+def _match_extractor(url):
+    """ask yt-dlp's extractors (regex only, no requests) who owns this URL"""
+    global _extractor_classes
+    if _extractor_classes is None:
+        _extractor_classes = [ie for ie in yt_dlp.extractor.gen_extractor_classes() if ie.ie_key() != 'Generic']
+    
+    for ie in _extractor_classes:
+        if ie.suitable(url):
+            return ie.ie_key(), ie.get_temp_id(url)
+    return None, None
+
+
+def canonical_video_id(extractor_key, video_id):
+    """stable key for a video no matter which URL it was added from
+    
+    youtube ids are used as-is, other sites get their extractor as a prefix
+    """
+    if not video_id:
+        return None
+    if not extractor_key or extractor_key == 'Youtube':
+        return str(video_id)
+    return f"{extractor_key.lower()}-{video_id}"
+
+
+# only yt-dlp's own temp files. .webm/.m4a/.opus and friends can be finished
+# episodes (remux mode), maybe listed in another metadata file, so they stay
+_PARTIAL_SUFFIXES = ('.part', '.ytdl')
+_PARTIAL_NAME_RE = re.compile(r'\.part-Frag\d+$|\.temp\.\w+$|\.f\d+\.\w+$')
+
+# a record from a process that's gone this long is abandoned even if its pid
+# got reused by something else
+_PENDING_MAX_AGE = 24 * 3600
+
+
+def _is_partial_file(path):
+    return path.suffix.lower() in _PARTIAL_SUFFIXES or bool(_PARTIAL_NAME_RE.search(path.name))
+
+
+def _owner_running(record):
+    """is the process that started this pending download still alive?"""
+    if record.get('host') != socket.gethostname() or record.get('pid') in (None, os.getpid()):
+        return False
+    try:
+        started = datetime.fromisoformat(record['started'])
+    except (KeyError, ValueError):
+        return False
+    if (datetime.now(timezone.utc) - started).total_seconds() > _PENDING_MAX_AGE:
+        return False
+    if os.name == 'nt':
+        # no cheap way to ask windows, assume the worst and leave it alone
+        return True
+    try:
+        os.kill(record['pid'], 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def _download_in_subprocess(base_url, episodes_dir, metadata_file, audio_mode, url, retries=3,
+                            info_cache_file=None, retry_backoff=2.0, max_filesize=None):
+    """process pool entry point, has to live at module level so it pickles"""
+    info_cache = InfoCache(info_cache_file) if info_cache_file else None
+    yt2podcast = YT2Podcast(base_url=base_url, metadata_file=metadata_file, audio_mode=audio_mode,
+                            retries=retries, retry_backoff=retry_backoff, max_filesize=max_filesize,
+                            info_cache=info_cache)
+    yt2podcast.episodes_dir = Path(episodes_dir)
+    return yt2podcast._get_video_hash(url), yt2podcast.download_video(url, save=False)
+
+
+def _read_url_file(path):
+    """one URL per line, blank lines and # comments are skipped"""
+    with open(path, 'r', encoding='utf-8') as f:
+        return [line.strip() for line in f if line.strip() and not line.lstrip().startswith('#')]
 
 
 def main():
@@ -242,12 +1203,124 @@ def main():
 Examples:
   python yt2podcast.py "https://youtube.com/watch?v=someID"
   python yt2podcast.py --base-url "https://mypodcast.com" "https://youtube.com/watch?v=someID"
+  python yt2podcast.py "https://youtube.com/watch?v=one" "https://youtube.com/watch?v=two"
+  python yt2podcast.py --file urls.txt --workers 8
+  python yt2podcast.py "https://youtube.com/playlist?list=someList"
+  python yt2podcast.py --migrate-to episodes.db
+  python yt2podcast.py --metadata episodes.db "https://youtube.com/watch?v=someID"
+  python yt2podcast.py --metrics-json metrics.json --file urls.txt
+  python yt2podcast.py --info-cache info_cache.db --file urls.txt
+  python yt2podcast.py --publish site "https://youtube.com/watch?v=someID"
+  python yt2podcast.py --publish site
         """
     )
     
     parser.add_argument(
-        'url',
-        help='youtube video URL to download'
+        'urls',
+        nargs='*',
+        metavar='url',
+        help='youtube video, playlist or channel URLs to download'
+    )
+    
+    parser.add_argument(
+        '-f', '--file',
+        help='file with one URL per line'
+    )
+    
+    parser.add_argument(
+        '--workers',
+        type=int,
+        default=4,
+        help='how many videos to download at once (default: 4)'
+    )
+    
+    parser.add_argument(
+        '--processes',
+        action='store_true',
+        help='use a process pool instead of threads for the downloads'
+    )
+    
+    parser.add_argument(
+        '--metadata',
+        default='episodes_metadata.json',
+        help='where episode metadata lives, a .json file or a .db/.sqlite database (default: episodes_metadata.json)'
+    )
+    
+    parser.add_argument(
+        '--audio-mode',
+        choices=AUDIO_MODES,
+        default='mp3',
+        help='mp3 re-encodes for maximum compatibility, remux keeps the original AAC/Opus audio without transcoding (default: mp3)'
+    )
+    
+    parser.add_argument(
+        '--max-items',
+        type=int,
+        help='only put the newest N episodes in rss.xml, older ones go into rss-archive-N.xml pages'
+    )
+    
+    parser.add_argument(
+        '--retries',
+        type=int,
+        default=3,
+        help='how many times to retry a download that failed for a temporary reason like a dropped connection (default: 3)'
+    )
+    
+    parser.add_argument(
+        '--info-cache',
+        metavar='PATH',
+        help="keep yt-dlp's video info in this SQLite file, so retries and re-runs skip the extract step"
+    )
+    
+    parser.add_argument(
+        '--info-cache-ttl',
+        type=int,
+        default=6 * 3600,
+        help='seconds a cached video info stays usable, stream URLs that expire sooner win (default: 21600)'
+    )
+    
+    parser.add_argument(
+        '--no-resume',
+        action='store_true',
+        help="don't resume downloads an earlier run left unfinished, just clean up after them"
+    )
+    
+    parser.add_argument(
+        '--keep-newest',
+        type=int,
+        default=0,
+        help='delete all but the newest N episodes (audio and feed entry) when done'
+    )
+    
+    parser.add_argument(
+        '--max-disk-mb',
+        type=int,
+        default=0,
+        help='delete the oldest episodes until the audio files fit in this many MB'
+    )
+    
+    parser.add_argument(
+        '--metrics-json',
+        metavar='PATH',
+        help='write download/feed timings and counters as JSON when done (- for stdout)'
+    )
+    
+    parser.add_argument(
+        '--publish',
+        metavar='DIR',
+        help='copy rss.xml and episodes/ into DIR for a static host when done, only files that changed since the last publish'
+    )
+    
+    parser.add_argument(
+        '--deletions',
+        metavar='PATH',
+        help='with --publish, write the paths that should be removed from the host to this file, one per line'
+    )
+    
+    parser.add_argument(
+        '--migrate-to',
+        metavar='SQLITE_PATH',
+        help='copy the JSON metadata file into an SQLite database and exit'
     )
     
     parser.add_argument(
@@ -258,16 +1331,46 @@ Examples:
     
     args = parser.parse_args()
     
-    # make sure it's actually a URL
-    if not args.url.startswith(('http://', 'https://')):
-        print("Error: Please provide a valid URL starting with http:// or https://")
-        sys.exit(1)
+    if args.migrate_to:
+        count = migrate_json_to_sqlite(args.metadata, args.migrate_to)
+        print(f"Copied {count} episodes from {args.metadata} to {args.migrate_to}")
+        print(f"Use it with: --metadata {args.migrate_to}")
+        return
+    
+    urls = list(args.urls)
+    if args.file:
+        urls.extend(_read_url_file(args.file))
+    if not urls and not args.publish:
+        parser.error('give at least one URL, --file or --publish')
+    
+    # make sure they're actually URLs
+    for url in urls:
+        if not url.startswith(('http://', 'https://')):
+            print(f"Error: Please provide a valid URL starting with http:// or https:// (got {url})")
+            sys.exit(1)
     
     # do the thing
-    yt2podcast = YT2Podcast(base_url=args.base_url)
+    info_cache = InfoCache(args.info_cache, ttl=args.info_cache_ttl) if args.info_cache else None
+    yt2podcast = YT2Podcast(base_url=args.base_url, metadata_file=args.metadata, audio_mode=args.audio_mode,
+                            max_items=args.max_items, retries=args.retries, info_cache=info_cache)
     
     try:
-        success = yt2podcast.process_video(args.url)
+        # pick up (or clean up) whatever a crashed run left behind
+        yt2podcast.recover_incomplete(resume=not args.no_resume)
+        
+        if not urls:
+            success = True
+        elif len(urls) == 1 and not yt2podcast._is_collection_url(urls[0]):
+            success = yt2podcast.process_video(urls[0])
+        else:
+            results = yt2podcast.process_batch(urls, workers=args.workers, use_processes=args.processes)
+            success = results and all(episode_data for _, episode_data, _ in results)
+        if args.keep_newest or args.max_disk_mb:
+            yt2podcast.prune(keep_newest=args.keep_newest, max_bytes=args.max_disk_mb * 1024 * 1024)
+        if args.publish:
+            result = yt2podcast.publish(args.publish)
+            if args.deletions:
+                Path(args.deletions).write_text(''.join(f"{path}\n" for path in result.deleted), encoding='utf-8')
         if not success:
             sys.exit(1)
     except KeyboardInterrupt:
@@ -276,6 +1379,17 @@ Examples:
     except Exception as e:
         print(f"Error: {e}")
         sys.exit(1)
+    finally:
+        if args.metrics_json:
+            _write_metrics_json(yt2podcast.metrics.registry, args.metrics_json)
+
+
+def _write_metrics_json(registry, path):
+    data = json.dumps(registry.to_dict(), indent=2)
+    if path == '-':
+        print(data)
+    else:
+        Path(path).write_text(data + '\n', encoding='utf-8')
 
 
 if __name__ == '__main__':